@@ -3,20 +3,25 @@ import json
 import os
 import io
 import csv
+import hashlib
+import uuid
+import zlib
 from collections import defaultdict
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Request
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func
 
 from backend.database.database import get_db
 from backend.database.models import (
-    User, LaneStats, VehicleLog, AmbulanceEvent,
-    AccidentReport, DispatchLog, AuditLog, SystemSetting
+    User, LaneStats, LaneRegion, VehicleLog, AmbulanceEvent,
+    AccidentReport, DispatchLog, AuditLog, SystemSetting, Intersection, Camera,
+    LaneStatsRollup, LaneHourProfile, VehicleTotal
 )
-from backend.config import settings
+from backend.config import settings, load_system_settings, save_system_settings
 
 router = APIRouter()
 
@@ -56,6 +61,15 @@ def verify_token(token: str):
     except JWTError:
         return None
 
+def _token_user_id(request: Request) -> int:
+    """Id of the user in the request's `Authorization: Bearer` token; 401 without a valid one."""
+    auth = request.headers.get("Authorization", "")
+    payload = verify_token(auth[7:]) if auth.startswith("Bearer ") else None
+    try:
+        return int(payload["sub"])
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
 
 @router.post("/auth/login")
 async def login(request: Request, db: Session = Depends(get_db)):
@@ -104,59 +118,113 @@ async def login(request: Request, db: Session = Depends(get_db)):
 # ========================
 # VIDEO STREAMING
 # ========================
-def gen_frames(lane_id: int):
+async def gen_frames(lane_id: int):
     from backend.main import video_processor
-    idle_count = 0
-    while video_processor.running:
-        frame = video_processor.get_frame(lane_id)
-        if frame:
-            idle_count = 0
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        else:
-            idle_count += 1
-            if idle_count > 300:
-                break
-            time.sleep(0.1)
+    # Each JPEG is encoded once by the pipeline and fanned out to every viewer
+    async for frame in video_processor.frame_hub.subscribe(lane_id, lambda: video_processor.running):
+        # The JPEG is shared by all viewers; send it as its own chunk rather than concatenating
+        yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+        yield frame
+        yield b'\r\n'
 
 @router.get("/video_feed/{lane_id}")
-def video_feed(lane_id: int):
+async def video_feed(lane_id: int):
     from backend.main import video_processor
     if not video_processor or not video_processor.running:
         raise HTTPException(status_code=404, detail="Video stream offline")
+    if settings.STREAM_MODE == "none":
+        raise HTTPException(status_code=404, detail="Video streaming disabled on this node")
     return StreamingResponse(gen_frames(lane_id), media_type="multipart/x-mixed-replace; boundary=frame")
 
 @router.get("/video_snapshot/{lane_id}")
-def video_snapshot(lane_id: int):
+async def video_snapshot(lane_id: int):
     from backend.main import video_processor
-    if lane_id < 0 or lane_id > 3:
+    if lane_id < 0 or lane_id >= video_processor.num_lanes:
         raise HTTPException(status_code=400, detail="Invalid lane")
-    frame = video_processor.get_frame(lane_id)
+    if settings.STREAM_MODE == "none":
+        raise HTTPException(status_code=404, detail="Video streaming disabled on this node")
+    hub = video_processor.frame_hub
+    seq, frame = hub.latest(lane_id)
+    if not hub.wants_frame(lane_id):
+        # Lane is not being encoded right now, so the cached frame is stale
+        hub.request_snapshot(lane_id)
+        _, new_frame = await hub.next_frame(lane_id, seq, timeout=1.0)
+        if new_frame:
+            frame = new_frame
     if frame:
         return Response(content=frame, media_type="image/jpeg")
     raise HTTPException(status_code=404, detail="Not Ready")
 
+async def gen_detections(lane_id: int):
+    from backend.main import video_processor
+    async for meta in video_processor.metadata_hub.subscribe(lane_id, lambda: video_processor.running):
+        yield b'data: ' + meta + b'\n\n'
+
+@router.get("/detections/{lane_id}")
+async def detections_feed(lane_id: int):
+    """Server-sent events with per-frame detection metadata (boxes, class, confidence, track and ambulance flags)."""
+    from backend.main import video_processor
+    if not video_processor or not video_processor.running:
+        raise HTTPException(status_code=404, detail="Video stream offline")
+    return StreamingResponse(gen_detections(lane_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 
 # ========================
 # DASHBOARD STATUS
 # ========================
 @router.get("/status")
 def get_status():
-    from backend.main import signal_controller, video_processor
-    status = signal_controller.get_status()
-    lane_data = video_processor.lane_data
+    """Signal and lane data of the default intersection (see /intersections/{id}/status for others)."""
+    from backend.main import registry, video_processor
+    status = registry.controller().get_status()
+    lane_data = video_processor.get_intersection_lanes(registry.default_id)
     return {"signal_status": status, "lane_data": lane_data}
 
+@router.get("/capture_stats")
+def capture_stats():
+    from backend.main import video_processor
+    return {"lanes": video_processor.get_capture_stats()}
+
+@router.get("/telemetry_stats")
+def telemetry_stats():
+    """Write-behind stats writer: queued/dropped samples, rows written, failed flushes."""
+    from backend.main import video_processor
+    return video_processor.get_telemetry_stats()
+
+@router.get("/ocr_stats")
+def ocr_stats():
+    from backend.main import video_processor
+    return video_processor.get_ocr_stats()
+
+@router.get("/profiler")
+def profiler_stats():
+    """Per-lane, per-stage latency percentiles and effective FPS (lane "pipeline": whole-tick stages)."""
+    from backend.main import video_processor
+    return video_processor.profiler.snapshot()
+
+@router.post("/profiler")
+async def profiler_control(request: Request):
+    """body: {"enabled": bool, "reset": bool}"""
+    from backend.main import video_processor
+    body = await request.json()
+    profiler = video_processor.profiler
+    if body.get("reset"):
+        profiler.reset()
+    if "enabled" in body:
+        profiler.set_enabled(body["enabled"])
+    return {"enabled": profiler.enabled}
+
 
 # ========================
 # CITY MAP DATA
 # ========================
 @router.get("/city_map_data")
 def city_map_data(db: Session = Depends(get_db)):
-    from backend.main import signal_controller, video_processor
+    from backend.main import registry, video_processor
 
-    status = signal_controller.get_status()
-    lane_data = video_processor.lane_data
+    status = registry.controller().get_status()
+    lane_data = video_processor.get_intersection_lanes(registry.default_id)
 
     reports = db.query(AccidentReport).order_by(AccidentReport.timestamp.desc()).limit(20).all()
     reports_data = [{
@@ -177,11 +245,12 @@ def city_map_data(db: Session = Depends(get_db)):
         "timestamp": d.timestamp.strftime("%H:%M:%S")
     } for d in dispatches]
 
-    total_vehicles = sum(lane_data.get(i, {}).get("count", 0) for i in range(4))
+    total_vehicles = sum(lane.get("count", 0) for lane in video_processor.lane_data.values())
     active_incidents = db.query(AccidentReport).filter(AccidentReport.status != "Resolved").count()
 
     return {
         "signal_status": status, "lane_data": lane_data,
+        "intersections": _intersections_data(registry, video_processor),
         "reports": reports_data, "dispatches": dispatch_data,
         "summary": {
             "total_vehicles": total_vehicles,
@@ -196,20 +265,24 @@ def city_map_data(db: Session = Depends(get_db)):
 # ========================
 @router.get("/stats")
 def get_stats(db: Session = Depends(get_db)):
-    trend_stats = db.query(LaneStats).order_by(LaneStats.timestamp.desc()).limit(50).all()
-    trend_data = [{"time": s.timestamp.strftime("%H:%M:%S"), "count": s.vehicle_count, "lane": s.lane_id} for s in trend_stats]
+    """Read from the rollup tables only (see backend/utils/rollups.py), so cost does not grow with history."""
+    trend_stats = db.query(LaneStatsRollup).filter(LaneStatsRollup.resolution == "minute") \
+        .order_by(LaneStatsRollup.bucket.desc()).limit(50).all()
+    trend_data = [{"time": s.bucket.strftime("%H:%M:%S"), "count": round(s.count_sum / max(s.samples, 1)), "lane": s.lane_id}
+                  for s in trend_stats]
     trend_data.reverse()
 
-    dist_query = db.query(VehicleLog.vehicle_type, func.sum(VehicleLog.count)).group_by(VehicleLog.vehicle_type).all()
+    dist_query = db.query(VehicleTotal.vehicle_type, func.sum(VehicleTotal.count)).group_by(VehicleTotal.vehicle_type).all()
     dist_data = {t: int(c) for t, c in dist_query}
 
-    peak_query = db.query(extract("hour", LaneStats.timestamp).label("h"), func.sum(LaneStats.vehicle_count)).group_by("h").all()
+    peak_query = db.query(LaneHourProfile.hour, func.sum(LaneHourProfile.count_sum)).group_by(LaneHourProfile.hour).all()
     peak_data = {i: 0 for i in range(24)}
     for h, count in peak_query:
         peak_data[int(h)] = int(count)
 
-    lane_query = db.query(LaneStats.lane_id, func.avg(LaneStats.vehicle_count)).group_by(LaneStats.lane_id).all()
-    lane_perf = {int(l): round(float(c), 1) for l, c in lane_query}
+    lane_query = db.query(LaneHourProfile.lane_id, func.sum(LaneHourProfile.count_sum), func.sum(LaneHourProfile.samples)) \
+        .group_by(LaneHourProfile.lane_id).all()
+    lane_perf = {int(l): round(float(c) / n, 1) for l, c, n in lane_query if n}
 
     ambulance_events = db.query(DispatchLog).count()
 
@@ -226,14 +299,16 @@ def get_stats(db: Session = Depends(get_db)):
 @router.get("/reports_data")
 def reports_data(
     page: int = 1, per_page: int = 20,
-    lane: int = None, density: str = None, date: str = None,
+    lane: int = None, intersection_id: int = None, density: str = None, date: str = None,
     db: Session = Depends(get_db)
 ):
     per_page = min(per_page, 100)
     query = db.query(LaneStats)
 
-    if lane is not None and 1 <= lane <= 4:
+    if lane is not None:
         query = query.filter(LaneStats.lane_id == lane)
+    if intersection_id is not None:
+        query = query.filter(LaneStats.intersection_id == intersection_id)
     if density and density in ("Low", "Medium", "High"):
         query = query.filter(LaneStats.density == density)
     if date:
@@ -248,7 +323,7 @@ def reports_data(
     results = query.offset((page - 1) * per_page).limit(per_page).all()
 
     records = [{
-        "id": s.id, "lane_id": s.lane_id, "vehicle_count": s.vehicle_count,
+        "id": s.id, "intersection_id": s.intersection_id, "lane_id": s.lane_id, "vehicle_count": s.vehicle_count,
         "density": s.density or ("High" if s.vehicle_count > 20 else ("Medium" if s.vehicle_count > 10 else "Low")),
         "timestamp": s.timestamp.strftime("%Y-%m-%d %H:%M:%S")
     } for s in results]
@@ -265,51 +340,111 @@ def reports_data(
 # ========================
 # EXPORT CSV
 # ========================
-@router.get("/export_stats")
-def export_stats(db: Session = Depends(get_db)):
-    stats = db.query(LaneStats).order_by(LaneStats.timestamp.desc()).all()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["ID", "Lane ID", "Vehicle Count", "Density Label", "Timestamp"])
-    for s in stats:
-        cw.writerow([s.id, s.lane_id, s.vehicle_count, s.density, s.timestamp])
+# table -> (model, CSV header, selected columns, has lane / intersection columns)
+EXPORTS = {
+    "lane_stats": (LaneStats, ["ID", "Intersection ID", "Lane ID", "Vehicle Count", "Density Label", "Timestamp"],
+                   (LaneStats.id, LaneStats.intersection_id, LaneStats.lane_id, LaneStats.vehicle_count,
+                    LaneStats.density, LaneStats.timestamp), True),
+    "vehicle_logs": (VehicleLog, ["ID", "Intersection ID", "Lane ID", "Vehicle Type", "Count", "Timestamp"],
+                     (VehicleLog.id, VehicleLog.intersection_id, VehicleLog.lane_id, VehicleLog.vehicle_type,
+                      VehicleLog.count, VehicleLog.timestamp), True),
+    "audit_logs": (AuditLog, ["ID", "Action", "Details", "User", "IP Address", "Timestamp"],
+                   (AuditLog.id, AuditLog.action, AuditLog.details, User.username, AuditLog.ip_address,
+                    AuditLog.timestamp), False),
+}
+EXPORT_BATCH_ROWS = 2000     # Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def _export_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+
+def _export_rows(table, start, end, lane, intersection_id, compress):
+    """
+    CSV bytes of one table, newest first, in ~64 KB chunks. Rows come from a
+    server-side cursor (yield_per) as plain tuples, so memory use does not
+    depend on how many rows match.
+    """
+    from sqlalchemy import select
+    from backend.database.database import SessionLocal
+
+    model, header, columns, _ = EXPORTS[table]
+    query = select(*columns)
+    if model is AuditLog:
+        query = query.outerjoin(User, AuditLog.user_id == User.id)
+    if start:
+        query = query.where(model.timestamp >= start)
+    if end:
+        query = query.where(model.timestamp < end)
+    if lane is not None:
+        query = query.where(model.lane_id == lane)
+    if intersection_id is not None:
+        query = query.where(model.intersection_id == intersection_id)
+    query = query.order_by(model.timestamp.desc(), model.id.desc()).execution_options(yield_per=EXPORT_BATCH_ROWS)
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # gzip container
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+
+    def take():
+        data = buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+        return compressor.compress(data) if compressor else data
+
+    db = SessionLocal()
+    try:
+        for rows in db.execute(query).partitions():
+            writer.writerows(rows)
+            if buf.tell() >= EXPORT_CHUNK_BYTES:
+                chunk = take()
+                if chunk:
+                    yield chunk
+        chunk = take()
+        if compressor:
+            chunk += compressor.flush()
+        yield chunk
+    finally:
+        db.close()
+
+def _export_response(table, filename, start, end, lane, intersection_id, gzip):
+    rows = _export_rows(table, _export_time(start), _export_time(end), lane, intersection_id, gzip)
+    if gzip:
+        filename += ".gz"
+    return StreamingResponse(rows, media_type="application/gzip" if gzip else "text/csv",
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@router.get("/export/{table}")
+def export_table(table: str, start: str = None, end: str = None, lane: int = None,
+                 intersection_id: int = None, gzip: bool = False):
+    """
+    Stream lane_stats, vehicle_logs or audit_logs as CSV (optionally gzipped).
+    start / end: ISO datetimes (end exclusive); lane / intersection_id: not for audit_logs.
+    """
+    if table not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown table; one of {', '.join(EXPORTS)}")
+    if not EXPORTS[table][3] and (lane is not None or intersection_id is not None):
+        raise HTTPException(status_code=400, detail=f"{table} has no lane or intersection")
+    return _export_response(table, f"{table}.csv", start, end, lane, intersection_id, gzip)
 
-    return Response(
-        content=si.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=traffic_stats.csv"}
-    )
+@router.get("/export_stats")
+def export_stats(start: str = None, end: str = None, lane: int = None,
+                 intersection_id: int = None, gzip: bool = False):
+    """lane_stats export (see /export/{table})."""
+    return _export_response("lane_stats", "traffic_stats.csv", start, end, lane, intersection_id, gzip)
 
 
 # ========================
 # SETTINGS
 # ========================
-SETTINGS_FILE = os.path.join(settings.BASE_DIR, "system_settings.json")
-
-def _load_settings():
-    defaults = {
-        "yolo_model": "yolov8s", "confidence_threshold": 45,
-        "ambulance_confidence": 65, "low_density_green": 15,
-        "medium_density_green": 30, "high_density_green": 45,
-        "dark_mode": True, "voice_alerts": True,
-        "auto_dispatch": True, "data_retention": "30_days"
-    }
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, "r") as f:
-                saved = json.load(f)
-            defaults.update(saved)
-        except (json.JSONDecodeError, IOError):
-            pass
-    return defaults
-
-def _save_settings(data):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-
 @router.get("/settings")
 def get_settings():
-    return _load_settings()
+    return load_system_settings()
 
 @router.post("/settings")
 async def save_settings(request: Request, db: Session = Depends(get_db)):
@@ -317,7 +452,7 @@ async def save_settings(request: Request, db: Session = Depends(get_db)):
     if not body:
         raise HTTPException(status_code=400, detail="No data provided")
 
-    current = _load_settings()
+    current = load_system_settings()
     allowed_keys = {
         "yolo_model", "confidence_threshold", "ambulance_confidence",
         "low_density_green", "medium_density_green", "high_density_green",
@@ -327,7 +462,11 @@ async def save_settings(request: Request, db: Session = Depends(get_db)):
         if key in body:
             current[key] = body[key]
 
-    _save_settings(current)
+    retention_changed = current.get("data_retention") != load_system_settings().get("data_retention")
+    save_system_settings(current)
+    if retention_changed:
+        from backend.main import retention
+        retention.wake()
     return {"success": True, "settings": current}
 
 
@@ -336,18 +475,20 @@ async def save_settings(request: Request, db: Session = Depends(get_db)):
 # ========================
 @router.get("/generate_pdf")
 def generate_pdf(db: Session = Depends(get_db)):
-    stats = db.query(LaneStats).order_by(LaneStats.timestamp.desc()).limit(100).all()
+    stats = db.query(LaneStatsRollup).filter(LaneStatsRollup.resolution == "hour") \
+        .order_by(LaneStatsRollup.bucket.desc(), LaneStatsRollup.lane_id).limit(50).all()
     dispatches_count = db.query(DispatchLog).count()
     incidents = db.query(AccidentReport).order_by(AccidentReport.timestamp.desc()).limit(20).all()
     incidents_count = db.query(AccidentReport).count()
 
-    total_vehicles = sum(s.vehicle_count for s in stats)
+    total_vehicles = int(db.query(func.sum(VehicleTotal.count)).scalar() or 0)
     now = datetime.now()
 
     rows_html = ""
-    for s in stats[:50]:
-        density = s.density or ("High" if s.vehicle_count > 20 else ("Medium" if s.vehicle_count > 10 else "Low"))
-        rows_html += f"<tr><td>#{s.id}</td><td>Lane {s.lane_id}</td><td>{s.vehicle_count}</td><td>{density}</td><td>{s.timestamp.strftime('%Y-%m-%d %H:%M')}</td></tr>\n"
+    for s in stats:
+        avg = s.count_sum / max(s.samples, 1)
+        density = "High" if avg > 20 else ("Medium" if avg > 10 else "Low")
+        rows_html += f"<tr><td>{s.bucket.strftime('%Y-%m-%d %H:00')}</td><td>Lane {s.lane_id}</td><td>{avg:.1f}</td><td>{s.count_max}</td><td>{density}</td></tr>\n"
 
     inc_rows = ""
     for inc in incidents:
@@ -363,8 +504,8 @@ def generate_pdf(db: Session = Depends(get_db)):
         <h1>Traffic Vision AI — Analytics Report</h1>
         <p>Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}</p>
         <p>Total Vehicles: {total_vehicles} | Dispatches: {dispatches_count} | Incidents: {incidents_count}</p>
-        <h2>Recent Traffic Records</h2>
-        <table><tr><th>ID</th><th>Lane</th><th>Vehicles</th><th>Density</th><th>Timestamp</th></tr>{rows_html}</table>
+        <h2>Recent Hourly Traffic</h2>
+        <table><tr><th>Hour</th><th>Lane</th><th>Avg Vehicles</th><th>Peak</th><th>Density</th></tr>{rows_html}</table>
         <h2>Recent Incidents</h2>
         <table><tr><th>ID</th><th>Location</th><th>Status</th><th>Reported</th></tr>{inc_rows}</table>
     </body></html>"""
@@ -378,13 +519,34 @@ def generate_pdf(db: Session = Depends(get_db)):
 # ========================
 # SETUP STREAMS (Camera Config)
 # ========================
+async def _save_upload(file_obj, safe_name):
+    """
+    Store an uploaded video under a content-hash prefix, so a different video
+    uploaded under the same name is a new source (and never overwrites a file
+    a lane may still be decoding), while re-uploading the same one is a no-op.
+    """
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(settings.UPLOAD_FOLDER, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file_obj.read(1 << 20):
+                digest.update(chunk)
+                f.write(chunk)
+        path = os.path.join(settings.UPLOAD_FOLDER, f"{digest.hexdigest()[:16]}_{safe_name}")
+        if not os.path.exists(path):
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
 @router.post("/setup_streams")
 async def setup_streams(
     cam_1: str = Form(""), cam_2: str = Form(""), cam_3: str = Form(""), cam_4: str = Form(""),
     video_1: UploadFile = File(None), video_2: UploadFile = File(None),
     video_3: UploadFile = File(None), video_4: UploadFile = File(None),
 ):
-    from backend.main import video_processor
+    from backend.main import registry, video_processor
     from werkzeug.utils import secure_filename
 
     os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
@@ -407,33 +569,248 @@ async def setup_streams(
             if ext not in settings.ALLOWED_VIDEO_EXTENSIONS:
                 final_sources.append(None)
                 continue
-            path = os.path.join(settings.UPLOAD_FOLDER, safe_name)
-            content = await file_obj.read()
-            with open(path, "wb") as f:
-                f.write(content)
-            final_sources.append(path)
+            final_sources.append(await _save_upload(file_obj, safe_name))
         else:
             final_sources.append(None)
 
     while len(final_sources) < 4:
         final_sources.append(None)
 
-    video_processor.start_streams(final_sources)
+    # These four cameras belong to the default intersection; others keep theirs.
+    # Only lanes whose source changed are restarted. Both calls block on the
+    # DB / capture threads, so they run off the event loop serving the streams.
+    await run_in_threadpool(registry.set_cameras, registry.default_id, final_sources)
+    await run_in_threadpool(video_processor.update_sources, registry.sources, registry.lane_map)
     return {"success": True, "sources": [str(s) for s in final_sources]}
 
+@router.get("/lane_regions")
+def get_lane_regions(intersection_id: int = None, db: Session = Depends(get_db)):
+    """Per-lane region-of-interest polygons, [[x, y], ...] in 0-1 frame coordinates."""
+    from backend.main import registry
+    iid = registry.default_id if intersection_id is None else intersection_id
+    regions = db.query(LaneRegion).filter(LaneRegion.intersection_id == iid).all()
+    return {r.lane_id: json.loads(r.polygon) for r in regions}
+
+@router.post("/lane_regions/{lane_id}")
+def set_lane_region(lane_id: int, body: dict = Body(...), intersection_id: int = None, db: Session = Depends(get_db)):
+    from backend.main import registry, video_processor
+    iid = registry.default_id if intersection_id is None else intersection_id
+    info = registry.intersections.get(iid)
+    if not info:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    if lane_id < 0 or lane_id >= info["num_lanes"]:
+        raise HTTPException(status_code=400, detail=f"Invalid lane_id (0-{info['num_lanes'] - 1})")
+    polygon = body.get("polygon") or []
+    try:
+        polygon = [[float(x), float(y)] for x, y in polygon]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="polygon must be a list of [x, y] points")
+    if polygon and (len(polygon) < 3 or any(not (0 <= v <= 1) for p in polygon for v in p)):
+        raise HTTPException(status_code=400, detail="polygon needs at least 3 points with coordinates in 0-1")
+
+    region = db.query(LaneRegion).filter(LaneRegion.intersection_id == iid, LaneRegion.lane_id == lane_id).first()
+    if polygon:
+        if region:
+            region.polygon = json.dumps(polygon)
+        else:
+            db.add(LaneRegion(intersection_id=iid, lane_id=lane_id, polygon=json.dumps(polygon)))
+    elif region:
+        db.delete(region)
+    db.add(AuditLog(action="lane_region_update",
+                    details=f"Intersection {iid} lane {lane_id} region {'set' if polygon else 'cleared'}"))
+    db.commit()
+
+    if (iid, lane_id) in video_processor.lane_map:
+        video_processor.set_lane_region(video_processor.lane_map.index((iid, lane_id)), polygon)
+    return {"success": True, "polygon": polygon}
+
+
+# ========================
+# INTERSECTIONS (Camera registry)
+# ========================
+def _intersections_data(registry, video_processor):
+    data = []
+    for iid, info in registry.intersections.items():
+        controller = registry.controller(iid)
+        data.append(dict(
+            info,
+            cameras=[{"lane": lane, "slot": registry.slot(iid, lane),
+                      "source": None if source is None else str(source)}
+                     for lane, source in enumerate(registry.sources[s] for s in registry.slots(iid))],
+            signal_status=controller.get_status() if controller else None,
+            lane_data=video_processor.get_intersection_lanes(iid),
+        ))
+    return data
+
+def _apply_registry():
+    from backend.main import registry, video_processor
+    if video_processor.running:
+        video_processor.update_sources(registry.sources, registry.lane_map)
+
+@router.get("/intersections")
+def list_intersections():
+    """Every intersection with its cameras (slot = lane id for /video_feed, /detections), signals and lane data."""
+    from backend.main import registry, video_processor
+    return _intersections_data(registry, video_processor)
+
+# The handlers below only touch the DB and the pipeline, so they are plain
+# `def`: FastAPI runs them in its threadpool, off the event loop serving the streams.
+@router.post("/intersections")
+def create_intersection(body: dict = Body(...), db: Session = Depends(get_db)):
+    from backend.main import registry
+    name = (body.get("name") or "").strip()
+    num_lanes = int(body.get("num_lanes", 4))
+    if not name:
+        raise HTTPException(status_code=400, detail="name is required")
+    if not 1 <= num_lanes <= 16:
+        raise HTTPException(status_code=400, detail="num_lanes must be 1-16")
+
+    intersection = Intersection(name=name, num_lanes=num_lanes,
+                                latitude=body.get("latitude"), longitude=body.get("longitude"))
+    db.add(intersection)
+    db.flush()
+    for lane, source in enumerate((body.get("cameras") or [])[:num_lanes]):
+        db.add(Camera(intersection_id=intersection.id, lane_index=lane, source=str(source).strip() or None))
+    db.add(AuditLog(action="intersection_create", details=f"Intersection {intersection.id} ({name}), {num_lanes} lanes"))
+    db.commit()
+
+    registry.load()
+    _apply_registry()
+    return {"success": True, "id": intersection.id}
+
+@router.delete("/intersections/{intersection_id}")
+def delete_intersection(intersection_id: int, db: Session = Depends(get_db)):
+    from backend.main import registry
+    intersection = db.query(Intersection).get(intersection_id)
+    if not intersection:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    if db.query(Intersection).count() == 1:
+        raise HTTPException(status_code=400, detail="Cannot delete the last intersection")
+    db.query(LaneRegion).filter(LaneRegion.intersection_id == intersection_id).delete()
+    db.delete(intersection)
+    db.add(AuditLog(action="intersection_delete", details=f"Intersection {intersection_id} deleted"))
+    db.commit()
+
+    registry.load()
+    _apply_registry()
+    return {"success": True}
+
+@router.post("/intersections/{intersection_id}/cameras")
+def set_intersection_cameras(intersection_id: int, body: dict = Body(...), db: Session = Depends(get_db)):
+    """body: {"sources": [url | device index | uploaded path | null, ...]} one per lane; starts the pipeline."""
+    from backend.main import registry, video_processor
+    info = registry.intersections.get(intersection_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    sources = list(body.get("sources") or [])[:info["num_lanes"]]
+    sources += [None] * (info["num_lanes"] - len(sources))
+
+    registry.set_cameras(intersection_id, sources)
+    db.add(AuditLog(action="camera_update", details=f"Intersection {intersection_id} cameras updated"))
+    db.commit()
+
+    changed = video_processor.update_sources(registry.sources, registry.lane_map)
+    return {"success": True, "sources": [None if s is None else str(s) for s in sources], "changed_slots": changed}
+
+@router.post("/intersections/{intersection_id}/cameras/{lane_id}")
+def set_intersection_camera(intersection_id: int, lane_id: int, body: dict = Body(...), db: Session = Depends(get_db)):
+    """body: {"source": ...}; attach, replace or (null) detach one camera without interrupting the other lanes."""
+    from backend.main import registry, video_processor
+    info = registry.intersections.get(intersection_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    if lane_id < 0 or lane_id >= info["num_lanes"]:
+        raise HTTPException(status_code=400, detail=f"Invalid lane_id (0-{info['num_lanes'] - 1})")
+    source = body.get("source")
+
+    registry.set_cameras(intersection_id, {lane_id: source})
+    db.add(AuditLog(action="camera_update", details=f"Intersection {intersection_id} lane {lane_id} camera updated"))
+    db.commit()
+
+    changed = video_processor.update_sources(registry.sources, registry.lane_map)
+    return {"success": True, "changed": bool(changed), "slot": registry.slot(intersection_id, lane_id)}
+
+@router.get("/intersections/{intersection_id}/status")
+def intersection_status(intersection_id: int):
+    from backend.main import registry, video_processor
+    controller = registry.controller(intersection_id)
+    if not controller:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    return {"signal_status": controller.get_status(),
+            "lane_data": video_processor.get_intersection_lanes(intersection_id)}
+
+
+# ========================
+# DETECTION LOG (replay / recount)
+# ========================
+def _log_time(value):
+    """ISO datetime or epoch seconds -> epoch seconds."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+
+def _detection_log_reader():
+    from backend.utils.detection_log import DetectionLogReader
+    path = os.path.join(settings.DETECTION_LOG_DIR, "live")
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        raise HTTPException(status_code=404, detail="No detection log recorded (see DETECTION_LOG_ENABLED)")
+    return DetectionLogReader(path)
+
+@router.get("/detection_log/counts")
+def detection_log_counts(start: str = None, end: str = None, lane: int = None):
+    """Per-lane vehicle counts recomputed from the logged detections, without re-running YOLO."""
+    reader = _detection_log_reader()
+    lanes = None if lane is None else [lane]
+    counts = reader.recompute_counts(_log_time(start), _log_time(end), lanes)
+    return {"frames_logged": len(reader), "lanes": counts}
+
+async def gen_replay(reader, rows, speed):
+    import asyncio
+    ts = reader.columns["ts"]
+    prev = None
+    for row in rows.tolist():
+        if prev is not None and speed > 0:
+            # Original pacing; long gaps (pipeline stopped) are cut short
+            await asyncio.sleep(min((ts[row] - ts[prev]) / speed, 2.0))
+        prev = row
+        yield b'data: ' + reader.metadata(row) + b'\n\n'
+
+@router.get("/detection_log/replay")
+async def detection_log_replay(start: str = None, end: str = None, lane: int = None, speed: float = 1.0):
+    """
+    Logged detections of a time range as server-sent events, in the same format
+    as /detections/{lane_id} (plus "replay": true). speed=0 sends as fast as possible.
+    """
+    reader = _detection_log_reader()
+    rows = reader.rows(_log_time(start), _log_time(end), None if lane is None else [lane])
+    return StreamingResponse(gen_replay(reader, rows, speed), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 
 # ========================
 # SIGNAL OVERRIDE
 # ========================
 @router.post("/override")
 async def override_signal(request: Request, db: Session = Depends(get_db)):
-    from backend.main import signal_controller
+    """Override at the default intersection, or at body["intersection_id"]."""
+    from backend.main import registry
     body = await request.json()
     lane_id = int(body.get("lane_id", -1))
-    if lane_id < 0 or lane_id > 3:
-        raise HTTPException(status_code=400, detail="Invalid lane_id (0-3)")
-    success = signal_controller.force_switch(lane_id)
-    audit = AuditLog(action="signal_override", details=f"Manual override to Lane {lane_id}")
+    iid = int(body.get("intersection_id") or registry.default_id)
+    controller = registry.controller(iid)
+    if not controller:
+        raise HTTPException(status_code=404, detail="Unknown intersection")
+    if lane_id < 0 or lane_id >= controller.num_lanes:
+        raise HTTPException(status_code=400, detail=f"Invalid lane_id (0-{controller.num_lanes - 1})")
+    success = controller.force_switch(lane_id)
+    audit = AuditLog(action="signal_override", details=f"Manual override to Lane {lane_id} (intersection {iid})")
     db.add(audit)
     db.commit()
     return {"success": success}
@@ -517,16 +894,30 @@ async def update_dispatch_status(dispatch_id: int, request: Request, db: Session
 # DATA PURGE
 # ========================
 @router.post("/purge_data")
-def purge_data(db: Session = Depends(get_db)):
-    lane_count = db.query(LaneStats).count()
-    vehicle_count = db.query(VehicleLog).count()
-    db.query(LaneStats).delete()
-    db.query(VehicleLog).delete()
-    db.commit()
-    audit = AuditLog(action="data_purge", details=f"Purged {lane_count} lane stats, {vehicle_count} vehicle logs")
-    db.add(audit)
-    db.commit()
-    return {"success": True, "purged": {"lane_stats": lane_count, "vehicle_logs": vehicle_count}}
+def purge_data(request: Request, before: str = None):
+    """
+    Start a background purge of lane stats, vehicle logs and their rollups,
+    all of it or only rows older than `before` (ISO date). Poll GET /purge_data.
+    The signed-in user is recorded on the purge's audit entry.
+    """
+    from backend.main import retention
+    user_id = _token_user_id(request)
+    cutoff = None
+    if before:
+        try:
+            cutoff = datetime.fromisoformat(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="before must be an ISO date")
+    job = retention.start_purge(cutoff, user_id=user_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail="A purge or retention pass is already running")
+    return {"success": True, "job": retention.status()["job"]}
+
+@router.get("/purge_data")
+def purge_status():
+    """Progress of the current or last purge / retention pass."""
+    from backend.main import retention
+    return retention.status()
 
 
 # ========================
@@ -557,12 +948,15 @@ def get_predictions(db: Session = Depends(get_db)):
     now = datetime.now()
     predictions = []
 
+    # All-history average per hour of day, from the hour-of-day profile
+    profile = {int(h): (int(c), int(n)) for h, c, n in db.query(
+        LaneHourProfile.hour, func.sum(LaneHourProfile.count_sum), func.sum(LaneHourProfile.samples)
+    ).group_by(LaneHourProfile.hour).all()}
+
     for offset in range(1, 7):
         target_hour = (now.hour + offset) % 24
-        avg_result = db.query(func.avg(LaneStats.vehicle_count)).filter(
-            extract("hour", LaneStats.timestamp) == target_hour
-        ).scalar()
-        avg_count = round(float(avg_result or 0), 1)
+        count_sum, samples = profile.get(target_hour, (0, 0))
+        avg_count = round(count_sum / samples, 1) if samples else 0.0
 
         if avg_count > 25:
             level, color = "High", "#ef4444"
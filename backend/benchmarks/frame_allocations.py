@@ -0,0 +1,142 @@
+"""
+Bytes allocated per frame on the processing hot path, with fresh arrays per
+call ("allocating", how the loop used to work) versus the reused per-lane
+buffers it uses now ("preallocated").
+
+    python -m backend.benchmarks.frame_allocations
+    python -m backend.benchmarks.frame_allocations --video sample.mp4 --frames 300
+
+Allocations are measured with tracemalloc (NumPy and OpenCV output arrays
+are traced) as the peak growth of each stage; timings come from a second,
+untraced pass. No model weights are needed.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from backend.benchmarks.synthetic import SyntheticScene, write_video
+from backend.cv.buffers import ScratchBuffers
+from backend.cv.emergency_lights import light_counts
+
+FRAME_SIZE = (480, 270)   # Working size, as in VideoProcessor
+STAGES = ("decode", "resize", "lights", "encode")
+
+
+def boxes_for(count=6):
+    """Fixed vehicle boxes in working-frame pixels for the beacon check."""
+    return [(40 + 60 * k, 40 + 35 * k, 140 + 60 * k, 110 + 35 * k) for k in range(count)]
+
+
+class HotPath:
+    """One lane's per-frame work: decode, resize, beacon check, JPEG encode."""
+    def __init__(self, video, preallocated):
+        self.cap = cv2.VideoCapture(video)
+        self.preallocated = preallocated
+        self.raw = None
+        self.frame = np.empty((FRAME_SIZE[1], FRAME_SIZE[0], 3), np.uint8) if preallocated else None
+        self.buffers = ScratchBuffers() if preallocated else None
+        self.boxes = boxes_for()
+
+    def stage(self, name, state):
+        if name == "decode":
+            ret, raw = self.cap.read(self.raw) if self.preallocated else self.cap.read()
+            if not ret:
+                return False
+            self.raw = raw if self.preallocated else None
+            state['raw'] = raw
+        elif name == "resize":
+            state['frame'] = cv2.resize(state['raw'], FRAME_SIZE, dst=self.frame)
+        elif name == "lights":
+            state['lights'] = light_counts(state['frame'], self.boxes, self.buffers)
+        elif name == "encode":
+            _, buffer = cv2.imencode('.jpg', state['frame'], [int(cv2.IMWRITE_JPEG_QUALITY), 60])
+            state['jpeg'] = buffer.tobytes()   # What FrameHub publishes
+        return True
+
+    def release(self):
+        self.cap.release()
+
+
+def measure_allocations(video, preallocated, frames):
+    path = HotPath(video, preallocated)
+    per_stage = {name: [] for name in STAGES}
+    tracemalloc.start()
+    try:
+        for _ in range(frames):
+            state = {}   # Everything a tick produces lives until the tick ends
+            for name in STAGES:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                if not path.stage(name, state):
+                    break
+                per_stage[name].append(tracemalloc.get_traced_memory()[1] - before)
+            else:
+                continue
+            break
+    finally:
+        tracemalloc.stop()
+        path.release()
+    # The first frame fills the buffers; report steady state
+    return {name: float(np.mean(v[1:])) if len(v) > 1 else 0.0 for name, v in per_stage.items()}
+
+
+def measure_time(video, preallocated, frames):
+    path = HotPath(video, preallocated)
+    per_stage = {name: 0.0 for name in STAGES}
+    done = 0
+    try:
+        for _ in range(frames):
+            state = {}
+            for name in STAGES:
+                start = time.perf_counter()
+                if not path.stage(name, state):
+                    break
+                per_stage[name] += time.perf_counter() - start
+            else:
+                done += 1
+                continue
+            break
+    finally:
+        path.release()
+    return {name: total * 1000 / max(done, 1) for name, total in per_stage.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocations of the processing hot path")
+    parser.add_argument("--video", help="Source video (default: a generated 1280x720 clip)")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    video = args.video
+    tmp_dir = None
+    if not video:
+        tmp_dir = tempfile.TemporaryDirectory()
+        video = os.path.join(tmp_dir.name, "synthetic.avi")
+        write_video(video, SyntheticScene(), args.frames)
+
+    results = {}
+    for mode, preallocated in (("allocating", False), ("preallocated", True)):
+        results[mode] = (measure_allocations(video, preallocated, args.frames),
+                         measure_time(video, preallocated, args.frames))
+
+    print(f"{'stage':10} {'alloc KiB/frame':>16} {'prealloc KiB/frame':>19} {'alloc ms':>9} {'prealloc ms':>12}")
+    for name in STAGES + ("total",):
+        cols = []
+        for mode in ("allocating", "preallocated"):
+            alloc, timing = results[mode]
+            cols.append((sum(alloc.values()) if name == "total" else alloc[name],
+                         sum(timing.values()) if name == "total" else timing[name]))
+        print(f"{name:10} {cols[0][0] / 1024:>16.1f} {cols[1][0] / 1024:>19.1f} "
+              f"{cols[0][1]:>9.2f} {cols[1][1]:>12.2f}")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
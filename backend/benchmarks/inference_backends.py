@@ -0,0 +1,101 @@
+"""
+Per-frame latency of the vehicle model across inference backends.
+
+    python -m backend.benchmarks.inference_backends --models yolov8n.pt yolov8n.onnx yolov8n-int8.onnx yolov8n_openvino_model
+    python -m backend.benchmarks.inference_backends --export-onnx weights/yolov8n.pt
+    python -m backend.benchmarks.inference_backends --quantize weights/yolov8n.onnx --video sample.mp4
+
+Model names are resolved exactly like the `yolo_model` setting.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from backend.config import settings
+from backend.cv.inference_backends import quantize_onnx_int8, resolve_backend
+
+FRAME_SHAPE = (270, 480, 3)
+
+
+def load_frames(video_path, count):
+    """Frames from a video (resized like the pipeline does), or deterministic noise."""
+    frames = []
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, (FRAME_SHAPE[1], FRAME_SHAPE[0])))
+        cap.release()
+    rng = np.random.default_rng(0)
+    while len(frames) < count:
+        frames.append(rng.integers(0, 255, FRAME_SHAPE, dtype=np.uint8))
+    return frames
+
+
+def bench_backend(model_name, frames, batch_size):
+    backend_cls, path = resolve_backend(model_name, settings.MODEL_VEHICLE_PATH, os.path.dirname(settings.MODEL_VEHICLE_PATH))
+
+    start = time.perf_counter()
+    backend = backend_cls(path)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    backend.warmup(FRAME_SHAPE)
+    warmup_s = time.perf_counter() - start
+
+    per_frame = []
+    for i in range(0, len(frames), batch_size):
+        batch = frames[i:i + batch_size]
+        start = time.perf_counter()
+        backend.predict(batch)
+        per_frame.append((time.perf_counter() - start) * 1000 / len(batch))
+
+    per_frame = np.array(per_frame)
+    return {
+        "model": model_name, "backend": backend_cls.name,
+        "load_s": load_s, "warmup_s": warmup_s,
+        "mean_ms": per_frame.mean(), "p50_ms": np.percentile(per_frame, 50),
+        "p95_ms": np.percentile(per_frame, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vehicle-model inference backends on CPU")
+    parser.add_argument("--models", nargs="*", default=[], help="yolo_model values to compare")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--batch", type=int, nargs="*", default=[1, 4], help="Batch sizes (4 = one frame per lane)")
+    parser.add_argument("--video", help="Use frames from this video instead of noise")
+    parser.add_argument("--export-onnx", metavar="PT", help="Export a .pt model to ONNX with dynamic batch and exit")
+    parser.add_argument("--quantize", metavar="ONNX", help="Write an INT8 copy (<name>-int8.onnx) of an ONNX model and exit")
+    args = parser.parse_args()
+
+    if args.export_onnx:
+        from ultralytics import YOLO
+        print(YOLO(args.export_onnx).export(format="onnx", dynamic=True, simplify=True))
+        return
+
+    if args.quantize:
+        dst = args.quantize[:-len(".onnx")] + "-int8.onnx"
+        print(quantize_onnx_int8(args.quantize, dst, load_frames(args.video, 32)))
+        return
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{'model':32} {'backend':12} {'batch':>5} {'load s':>7} {'warm s':>7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for model_name in args.models:
+        for batch_size in args.batch:
+            try:
+                r = bench_backend(model_name, frames, batch_size)
+            except Exception as e:
+                print(f"{model_name:32} failed: {e}")
+                break
+            print(f"{r['model']:32} {r['backend']:12} {batch_size:>5} {r['load_s']:>7.2f} {r['warmup_s']:>7.2f} "
+                  f"{r['mean_ms']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+End-to-end throughput of VideoProcessor and of AmbulanceDetector.check_boxes
+on deterministic synthetic traffic (see synthetic.py), for 1..N lanes.
+
+    python -m backend.benchmarks.pipeline --lanes 1 2 4 8
+    python -m backend.benchmarks.pipeline --detector stub --stub-ms 25 --viewers --json bench.json
+    python -m backend.benchmarks.pipeline --detector yolo --lanes 4        # real weights
+    python -m backend.benchmarks.pipeline --lanes 4 --min-fps 25           # exit 1 below 25 fps/lane
+
+The default stub detector sleeps a fixed time per batch and finds the
+synthetic vehicles by thresholding, so everything after detection (tracking,
+beacon timing, drawing, encoding) does real work without any model files.
+Stats go to a throwaway SQLite database, never to DATABASE_URL, and OCR
+stays off unless --ocr is given (EasyOCR downloads its model on first use).
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from backend.benchmarks.synthetic import BACKGROUND, SyntheticScene, write_video
+
+SOURCE_FPS = 30
+
+
+class StubDetector:
+    """
+    Stands in for VehicleDetector: fixed latency per batch (plus per frame),
+    detections from thresholding the synthetic scene's plain background.
+    """
+    def __init__(self, batch_ms=20.0, frame_ms=2.0, min_area=900):
+        self.batch_ms = batch_ms
+        self.frame_ms = frame_ms
+        self.min_area = min_area
+
+    def warmup(self, frame_shape=None):
+        pass
+
+    def detect(self, frame, exclude_boxes=None, draw=True):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, exclude_boxes=None, draw=False):
+        from backend.cv.vehicle_detector import DETECTION_DTYPE, count_detections
+
+        start = time.perf_counter()
+        results = []
+        for frame in frames:
+            diff = cv2.absdiff(frame, np.full_like(frame, BACKGROUND)).max(axis=2)
+            _, stats_mask = cv2.threshold(diff, 40, 255, cv2.THRESH_BINARY)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(stats_mask)
+            stats = stats[1:n]
+            stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area]
+            detections = np.zeros(len(stats), DETECTION_DTYPE)
+            x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+            detections['box'] = np.stack([x, y, x + stats[:, cv2.CC_STAT_WIDTH],
+                                          y + stats[:, cv2.CC_STAT_HEIGHT]], axis=1) if len(stats) else detections['box']
+            detections['conf'] = 0.9
+            # Large blobs are buses, the rest cars
+            detections['cls'] = np.where(stats[:, cv2.CC_STAT_AREA] > 6000, 5, 2)
+            results.append((frame, count_detections(detections), len(detections), detections))
+
+        wait = (self.batch_ms + self.frame_ms * len(frames)) / 1000 - (time.perf_counter() - start)
+        if wait > 0:
+            time.sleep(wait)
+        return results
+
+
+def rss_mib():
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_sources(tmp_dir, lanes, seconds):
+    frames = int(seconds * SOURCE_FPS) + SOURCE_FPS
+    return [write_video(os.path.join(tmp_dir, f"lane{i}.avi"), SyntheticScene(seed=i, fps=SOURCE_FPS), frames)
+            for i in range(lanes)]
+
+
+def bench_pipeline(config, detector, sources, warmup, seconds, viewers):
+    from backend.config import load_system_settings
+    from backend.utils.video_processor import VideoProcessor
+
+    vp = VideoProcessor(config)
+    if detector is not None:
+        # Matching model_name keeps load_models() from replacing the stub
+        vp.vehicle_detector = vp.ambulance_detector.vehicle_detector = detector
+        vp.model_name = load_system_settings().get("yolo_model")
+    vp.profiler.set_enabled(True)
+
+    rss_before = rss_mib()
+    vp.start_streams(list(sources))
+    if viewers:
+        # Pretend every lane is watched so boxes are drawn and JPEGs encoded
+        with vp.frame_hub.lock:
+            for i in range(len(sources)):
+                vp.frame_hub.subscribers[i] = 1
+    time.sleep(warmup)
+    vp.profiler.reset()
+    time.sleep(seconds)
+    snapshot = vp.profiler.snapshot()
+    rss_after = rss_mib()
+    vp.stop()
+
+    lanes = {k: v for k, v in snapshot["lanes"].items() if k != "pipeline"}
+    fps = [lanes.get(i, {}).get("fps", 0.0) for i in range(len(sources))]
+    stages = {}
+    for lane in lanes.values():
+        for stage, summary in lane["stages"].items():
+            stages.setdefault(stage, []).append(summary["p95_ms"])
+    pipeline = snapshot["lanes"].get("pipeline", {}).get("stages", {})
+    return {
+        "lanes": len(sources),
+        "fps_per_lane": round(float(np.mean(fps)), 2),
+        "min_lane_fps": round(float(min(fps)), 2),
+        "total_fps": round(float(sum(fps)), 2),
+        "tick": pipeline.get("tick", {}),
+        "detect_batch": pipeline.get("detect_batch", {}),
+        "stage_p95_ms": {stage: round(max(v), 3) for stage, v in stages.items()},
+        "rss_mib": round(rss_after, 1),
+        "rss_growth_mib": round(rss_after - rss_before, 1),
+    }
+
+
+def bench_check_boxes(frames, ocr=False):
+    """AmbulanceDetector.sample_lights + check_boxes on working-size synthetic frames."""
+    from backend.config import settings
+    from backend.cv.ambulance_detector import AmbulanceDetector
+    from backend.utils.profiler import LatencyHistogram
+
+    detector = AmbulanceDetector(settings.MODEL_AMBULANCE_PATH, ocr_enabled=ocr)
+    scene = SyntheticScene(seed=0, ambulances=2)
+    sx, sy = 480 / scene.size[0], 270 / scene.size[1]
+    hist = LatencyHistogram()
+    found = 0
+    start_all = time.perf_counter()
+    for i in range(frames):
+        frame = cv2.resize(scene.frame(i), (480, 270))
+        boxes = [(int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)) for x1, y1, x2, y2, _ in scene.boxes(i)]
+        tracks = [{'coords': box, 'track_id': k} for k, box in enumerate(boxes)]
+        now = i / SOURCE_FPS
+
+        start = time.perf_counter()
+        detector.sample_lights(0, frame, tracks, now)
+        has_ambulance, _, _ = detector.check_boxes(frame, boxes, keys=[(0, k) for k in range(len(boxes))], lane=0)
+        hist.record(time.perf_counter() - start)
+        found += has_ambulance
+    elapsed = time.perf_counter() - start_all
+    return dict(hist.summary(), frames=frames, calls_per_s=round(frames / elapsed, 1),
+                ambulance_frames=found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the processing pipeline on synthetic traffic")
+    parser.add_argument("--lanes", type=int, nargs="*", default=[1, 2, 4], help="Lane counts to run")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Measured seconds per lane count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--detector", choices=("stub", "yolo"), default="stub")
+    parser.add_argument("--stub-ms", type=float, default=20.0, help="Stub latency per batch")
+    parser.add_argument("--stub-frame-ms", type=float, default=2.0, help="Stub latency per frame in a batch")
+    parser.add_argument("--workers", type=int, default=0, help="INFERENCE_WORKERS (yolo detector only)")
+    parser.add_argument("--viewers", action="store_true", help="Draw and encode every lane as if watched")
+    parser.add_argument("--ocr", action="store_true", help="Enable OCR verification (loads EasyOCR)")
+    parser.add_argument("--check-boxes-frames", type=int, default=600, help="0 skips the check_boxes benchmark")
+    parser.add_argument("--json", help="Write results here")
+    parser.add_argument("--min-fps", type=float, help="Exit 1 if any run's slowest lane is below this")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    # Never write benchmark stats into the real database
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp_dir.name, "bench.db")
+    os.environ["DETECTION_LOG_DIR"] = os.path.join(tmp_dir.name, "detection_logs")
+    from backend.config import settings
+    from backend.database.database import engine
+    from backend.database.models import Base
+    Base.metadata.create_all(bind=engine)
+
+    use_stub = args.detector == "stub"
+    config = settings.model_copy(update={
+        "INFERENCE_WORKERS": 0 if use_stub else args.workers,
+        "AMBULANCE_OCR_ENABLED": args.ocr,
+        "DETECTION_LOG_ENABLED": False,
+        "DETECTION_CACHE_ENABLED": False,
+        "STREAM_MODE": "annotated",
+    })
+    detector = StubDetector(args.stub_ms, args.stub_frame_ms) if use_stub else None
+
+    results = {"detector": args.detector, "pipeline": [], "check_boxes": None}
+    sources = make_sources(tmp_dir.name, max(args.lanes), args.warmup + args.seconds)
+    print(f"{'lanes':>5} {'fps/lane':>9} {'min fps':>8} {'total fps':>10} {'tick p50':>9} {'tick p95':>9} "
+          f"{'tick p99':>9} {'detect p95':>11} {'RSS MiB':>8}")
+    for n in args.lanes:
+        r = bench_pipeline(config, detector, sources[:n], args.warmup, args.seconds, args.viewers)
+        results["pipeline"].append(r)
+        print(f"{n:>5} {r['fps_per_lane']:>9.2f} {r['min_lane_fps']:>8.2f} {r['total_fps']:>10.2f} "
+              f"{r['tick'].get('p50_ms', 0):>9.2f} {r['tick'].get('p95_ms', 0):>9.2f} {r['tick'].get('p99_ms', 0):>9.2f} "
+              f"{r['detect_batch'].get('p95_ms', 0):>11.2f} {r['rss_mib']:>8.1f}")
+    if results["pipeline"]:
+        print("stage p95 ms (slowest lane, last run): " + ", ".join(
+            f"{k} {v:.2f}" for k, v in results["pipeline"][-1]["stage_p95_ms"].items()))
+
+    if args.check_boxes_frames:
+        r = results["check_boxes"] = bench_check_boxes(args.check_boxes_frames, args.ocr)
+        print(f"check_boxes: {r['calls_per_s']} frames/s, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, "
+              f"p99 {r['p99_ms']} ms, ambulance on {r['ambulance_frames']}/{r['frames']} frames")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    tmp_dir.cleanup()
+
+    if args.min_fps is not None and any(r["min_lane_fps"] < args.min_fps for r in results["pipeline"]):
+        print(f"FAIL: a lane ran below {args.min_fps} fps")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Deterministic synthetic traffic for benchmarks: vehicles (solid rectangles)
+moving along lanes, some carrying red/blue beacons that flash at ~2 Hz and a
+white "AMBULANCE" plate. The same seed always renders the same frames, and
+the ground-truth boxes of every frame are known.
+"""
+import cv2
+import numpy as np
+
+BACKGROUND = 60   # Road grey; anything far from it is a vehicle (see StubDetector)
+
+
+class SyntheticScene:
+    def __init__(self, seed=0, size=(1280, 720), vehicles=8, ambulances=1, fps=30):
+        self.size = size
+        self.fps = fps
+        w, h = size
+        rng = np.random.default_rng(seed)
+        self.vehicles = []
+        for k in range(vehicles):
+            vw, vh = int(rng.integers(160, 360)), int(rng.integers(110, 190))
+            self.vehicles.append({
+                'x0': float(rng.uniform(-vw, w)),
+                'y': int(rng.uniform(0.1, 0.9) * (h - vh)),
+                'w': vw, 'h': vh,
+                'speed': float(rng.uniform(2, 9)) * (1 if k % 2 else -1),   # px per frame
+                'color': tuple(int(c) for c in rng.integers(120, 255, 3)),
+                'ambulance': k < ambulances,
+                'phase': int(rng.integers(0, 16)),
+            })
+
+    def _placed(self, index):
+        """(vehicle, box) of every vehicle visible in a frame; vehicles wrap around the frame."""
+        w, _ = self.size
+        out = []
+        for v in self.vehicles:
+            x = int((v['x0'] + v['speed'] * index) % (w + v['w'])) - v['w']
+            x1, x2 = max(x, 0), min(x + v['w'], w)
+            if x2 - x1 > 20:
+                out.append((v, (x1, v['y'], x2, v['y'] + v['h'])))
+        return out
+
+    def boxes(self, index):
+        """Ground-truth (x1, y1, x2, y2, is_ambulance) of every vehicle visible in a frame."""
+        return [box + (v['ambulance'],) for v, box in self._placed(index)]
+
+    def frame(self, index):
+        w, h = self.size
+        frame = np.full((h, w, 3), BACKGROUND, np.uint8)
+        for y in range(h // 6, h, h // 6):
+            cv2.line(frame, (0, y), (w, y), (BACKGROUND + 20,) * 3, 2)
+        for v, (x1, y1, x2, y2) in self._placed(index):
+            color = (235, 235, 235) if v['ambulance'] else v['color']
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+            if v['ambulance']:
+                # Beacons alternate red / blue every 8 frames (~1.9 Hz at 30 fps)
+                bar_h = max(6, (y2 - y1) // 8)
+                red_on = ((index + v['phase']) // 8) % 2 == 0
+                mid = (x1 + x2) // 2
+                cv2.rectangle(frame, (x1 + 4, y1 + 2), (mid - 2, y1 + bar_h), (0, 0, 255) if red_on else color, -1)
+                cv2.rectangle(frame, (mid + 2, y1 + 2), (x2 - 4, y1 + bar_h), color if red_on else (255, 0, 0), -1)
+                cv2.putText(frame, "AMBULANCE", (x1 + 8, (y1 + y2) // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.8, (0, 0, 200), 2)
+        return frame
+
+
+def write_video(path, scene, count):
+    """Render `count` frames to an MJPG .avi (no codecs to download)."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), scene.fps, scene.size)
+    for i in range(count):
+        writer.write(scene.frame(i))
+    writer.release()
+    return path
@@ -1,4 +1,5 @@
 import os
+import json
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -20,5 +21,84 @@ class Settings(BaseSettings):
     DENSITY_LOW: int = 10
     DENSITY_HIGH: int = 30
 
+    # Load detection models at API startup (background) instead of on first stream start
+    PRELOAD_MODELS: bool = False
+    # OCR text verification of ambulance candidates (EasyOCR is only loaded when enabled)
+    AMBULANCE_OCR_ENABLED: bool = True
+    OCR_WORKERS: int = 1
+    OCR_QUEUE_SIZE: int = 32
+    OCR_CACHE_TTL: float = 30.0        # Seconds a verdict is reused for the same vehicle
+    OCR_FRAME_BUDGET_MS: float = 200.0 # OCR work one frame may queue, based on measured latency
+
+    # Inference worker processes (0 = run detection in the processing thread)
+    INFERENCE_WORKERS: int = 0
+    # Worker index per lane, e.g. [0, 0, 1, 1]; lanes not listed are assigned round-robin
+    INFERENCE_LANE_ASSIGNMENT: list[int] = []
+    INFERENCE_RING_SLOTS: int = 4
+
+    # Detection scheduling: total detections/sec for the box, and the longest
+    # a lane may go without a fresh detection
+    DETECTION_BUDGET: float = 30.0
+    DETECTION_MIN_REFRESH: float = 2.0
+
+    # Skip detection on lanes whose scene has not changed since the last run
+    MOTION_GATE_ENABLED: bool = True
+    MOTION_CHANGED_FRACTION: float = 0.005
+
+    # Video served by /video_feed: "annotated" (boxes drawn server-side),
+    # "raw" (clients draw overlays from /detections) or "none" (headless)
+    STREAM_MODE: str = "annotated"
+
+    # Append every detection (boxes, classes, confidences, track ids) to a
+    # memory-mappable columnar log for replay and offline counts
+    DETECTION_LOG_ENABLED: bool = False
+    DETECTION_LOG_DIR: str = os.path.join(BASE_DIR, 'detection_logs')
+    # Re-submitted video files with identical content replay cached detections instead of running YOLO
+    DETECTION_CACHE_ENABLED: bool = True
+    DETECTION_CACHE_MAX_BYTES: int = 2 * 1024 ** 3   # Least recently used entries are evicted beyond this; 0 = no limit
+
+    # lane_stats / vehicle_logs are written behind the frame loop: samples are
+    # averaged per lane over TELEMETRY_WINDOW seconds and bulk-inserted per window
+    TELEMETRY_WINDOW: float = 5.0
+    TELEMETRY_QUEUE_SIZE: int = 10000         # Samples; beyond this they are dropped (and counted)
+    TELEMETRY_MAX_PENDING_ROWS: int = 50000   # Rows kept for retry while the DB is unavailable
+
+    # PostgreSQL only: lane_stats / vehicle_logs partitioned by "day" or "week",
+    # with partitions created this many days ahead
+    PARTITIONING_ENABLED: bool = True
+    PARTITION_INTERVAL: str = "day"
+    PARTITION_PREMAKE_DAYS: int = 3
+    # The data_retention setting is enforced this often; purges delete in chunks of PURGE_CHUNK_ROWS
+    RETENTION_CHECK_INTERVAL: float = 3600.0
+    PURGE_CHUNK_ROWS: int = 5000
+    PURGE_CHUNK_PAUSE: float = 0.05
+
+    # Per-stage latency histograms of the processing loop (toggle at runtime via /api/profiler)
+    PROFILER_ENABLED: bool = False
+
 settings = Settings()
 os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+
+# Runtime settings edited from the dashboard (/api/settings)
+SETTINGS_FILE = os.path.join(settings.BASE_DIR, "system_settings.json")
+
+def load_system_settings():
+    defaults = {
+        "yolo_model": "yolov8s", "confidence_threshold": 45,
+        "ambulance_confidence": 65, "low_density_green": 15,
+        "medium_density_green": 30, "high_density_green": 45,
+        "dark_mode": True, "voice_alerts": True,
+        "auto_dispatch": True, "data_retention": "30_days"
+    }
+    if os.path.exists(SETTINGS_FILE):
+        try:
+            with open(SETTINGS_FILE, "r") as f:
+                saved = json.load(f)
+            defaults.update(saved)
+        except (json.JSONDecodeError, IOError):
+            pass
+    return defaults
+
+def save_system_settings(data):
+    with open(SETTINGS_FILE, "w") as f:
+        json.dump(data, f, indent=2)
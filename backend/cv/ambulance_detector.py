@@ -1,135 +1,160 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
-import easyocr
 import threading
+from backend.cv.buffers import ScratchBuffers
+from backend.cv.emergency_lights import MIN_LIGHT_PIXELS, FlashAnalyzer, light_counts
+from backend.cv.ocr_verifier import OcrVerifier
 
 class AmbulanceDetector:
-    def __init__(self, model_path, confidence=0.6):
-        self.use_heuristic = False
-        try:
-            # We use the heuristic mode primarily now as per user request
-            # But we still need a detector to find the VEHICLES first
-            self.model = YOLO('yolov8n.pt') 
-            self.loaded = True
-        except Exception as e:
-            print(f"Error loading YOLO: {e}")
-            self.loaded = False
-        
+    def __init__(self, model_path, confidence=0.6, vehicle_detector=None, ocr_enabled=True,
+                 ocr_workers=1, ocr_queue_size=32, ocr_cache_ttl=30.0, ocr_frame_budget_ms=200.0):
+        """
+        vehicle_detector: shared VehicleDetector, only needed by the legacy detect().
+        ocr_enabled: EasyOCR is loaded by the first OCR worker, i.e. only once a
+                     candidate actually needs reading, and never if text verification is off.
+        ocr_*: background OCR pool, see OcrVerifier.
+        """
+        self.model_path = model_path
+        self.vehicle_detector = vehicle_detector
         self.confidence = confidence
-        
-        # Initialize OCR Reader
-        # This might download the model on first run
-        print("Initializing EasyOCR... (this might take a moment)")
-        try:
-            self.reader = easyocr.Reader(['en'], gpu=False, verbose=False)
-            self.ocr_ready = True
-            print("EasyOCR Initialized.")
-        except Exception as e:
-            print(f"Failed to load EasyOCR: {e}")
-            self.ocr_ready = False
+
+        self.ocr_enabled = ocr_enabled
+        self.reader = None
+        self.ocr_ready = False
+        self._ocr_lock = threading.Lock()
+        # Text verification runs on background workers; check_boxes only reads cached verdicts
+        self.ocr_verifier = OcrVerifier(self._detect_text, self.load_ocr, ocr_workers,
+                                        ocr_queue_size, ocr_cache_ttl, ocr_frame_budget_ms)
+
+        self.flash_analyzers = {} # lane -> FlashAnalyzer, fed every frame by sample_lights
+        self.light_buffers = ScratchBuffers() # HSV / mask scratch; light checks run on the processing thread only
 
         self.target_keywords = {"AMBULANCE", "ECNALUBMA", "EMS", "PARAMEDIC", "108", "112", "EMERGENCY", "RESCUE"}
 
+    def load_ocr(self):
+        """Initialize the EasyOCR reader (blocking). Safe to call more than once."""
+        if not self.ocr_enabled:
+            return
+        with self._ocr_lock:
+            if self.ocr_ready:
+                return
+            # This might download the model on first run
+            print("Initializing EasyOCR... (this might take a moment)")
+            try:
+                import easyocr
+                self.reader = easyocr.Reader(['en'], gpu=False, verbose=False)
+                self.ocr_ready = True
+                print("EasyOCR Initialized.")
+            except Exception as e:
+                print(f"Failed to load EasyOCR: {e}")
+                self.ocr_enabled = False
+
     def detect(self, frame):
         """
         Detect ambulances using OCR and Light Detection.
-        Legacy method for standalone use.
+        Legacy method for standalone use; same return value as check_boxes.
         """
+        if self.vehicle_detector is None:
+            from backend.cv.vehicle_detector import VehicleDetector
+            self.vehicle_detector = VehicleDetector(self.model_path)
+
         # 1. Detect candidate vehicles (Car, Bus, Truck)
-        results = self.model(frame, stream=True, verbose=False, conf=0.4, classes=[2, 5, 7])
-        
+        prediction = self.vehicle_detector.backend.predict([frame], conf=0.4)[0]
+
         boxes = []
-        for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
+        for xyxy, cls_id in zip(prediction['xyxy'], prediction['cls']):
+            if int(cls_id) in (2, 5, 7):
+                x1, y1, x2, y2 = map(int, xyxy)
                 boxes.append((x1, y1, x2, y2))
-                
+
+        self.ocr_verifier.begin_frame()
         return self.check_boxes(frame, boxes)
 
-    def check_boxes(self, frame, boxes):
+    def sample_lights(self, lane, frame, tracks, now):
         """
-        Efficient check using existing bounding boxes.
-        Returns: has_ambulance, annotated_frame, ambulance_boxes, verified_indices
+        Record beacon intensity for every candidate-sized track in the lane.
+        Called once per frame, detection tick or not, so flashing can be timed.
+        tracks: LaneTracker.get_tracks() output
+        """
+        analyzer = self._flash_analyzer(lane)
+        candidates = [t for t in tracks if self._is_candidate(t['coords'])]
+        keys = [(lane, t['track_id']) for t in candidates]
+        if candidates:
+            red, blue = light_counts(frame, [t['coords'] for t in candidates], self.light_buffers)
+            analyzer.add(keys, red, blue, now)
+        analyzer.prune(set(keys))
+
+    def check_boxes(self, frame, boxes, keys=None, lane=None):
+        """
+        Efficient check using existing bounding boxes. Never draws: the frame
+        is read by sample_lights and may be streamed raw; overlays are drawn
+        from the tracker's ambulance flag (VideoProcessor._draw_boxes).
+        keys: optional stable id per box (e.g. (lane, track_id)) used to cache OCR verdicts;
+              without it the ROI's perceptual hash is used.
+        lane: with keys, decide lights from the flash history gathered by sample_lights
+              instead of a single frame; no history yet (first tick, restart) means not flashing.
+        The OCR budget is per processing tick: call ocr_verifier.begin_frame() once
+        per tick, not per lane.
+        Returns: has_ambulance, ambulance_boxes, verified_indices
         """
         ambulance_boxes = []
         verified_indices = [] # Indices of boxes that are ambulances
         has_ambulance = False
-        annotated_frame = frame # Modify in place or copy if needed outside
+
+        analyzer = self._flash_analyzer(lane) if keys and lane is not None else None
+        lit = None
+        if analyzer is None and boxes:
+            # Single-frame fallback for callers without a lane: one HSV pass for all boxes
+            red, blue = light_counts(frame, boxes, self.light_buffers)
+            lit = np.maximum(red, blue)
         
         for i, (x1, y1, x2, y2) in enumerate(boxes):
             w, h = x2 - x1, y2 - y1
             
-            if w < 60 or h < 60: continue
+            if not self._is_candidate((x1, y1, x2, y2)): continue
 
             roi = frame[y1:y2, x1:x2]
             if roi.size == 0: continue
 
+            key = keys[i] if keys else None
             is_ambulance = False
-            label = ""
             
             # A. LIGHT DETECTION (Fast)
-            if self._detect_emergency_lights(roi):
+            if analyzer is not None:
+                lights = analyzer.is_flashing(key)
+                # Give the beacon a chance to show before paying for OCR
+                ocr_due = analyzer.has_history(key)
+            else:
+                lights = lit[i] > MIN_LIGHT_PIXELS
+                ocr_due = True
+
+            if lights:
                 is_ambulance = True
-                label = "AMBULANCE (LIGHTS)"
             
             # B. TEXT DETECTION (Slow, Optional)
-            # Only run if not already found and OCR is ready
-            # SKIP OCR for speed by default unless very confident candidate or requested
-            # For now, let's keep it but maybe skip if roi is small
-            elif not is_ambulance and self.ocr_ready and w > 120:
-                # Limit OCR calls: only 1 per frame max? No, just rely on size
-                if self._detect_text(roi):
+            # Only run if not already found. OCR itself runs on background
+            # workers; a verdict shows up here on a later tick once it is cached.
+            # Larger vehicles are read first.
+            elif ocr_due and self.ocr_enabled and w > 120:
+                if self.ocr_verifier.lookup(key, roi, priority=w * h):
                     is_ambulance = True
-                    label = "AMBULANCE (TEXT)"
             
             if is_ambulance:
                 has_ambulance = True
                 ambulance_boxes.append((x1, y1, x2, y2))
                 verified_indices.append(i)
-                
-                # Draw
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                cv2.putText(annotated_frame, label, (x1, y1 - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                            
-        return has_ambulance, annotated_frame, ambulance_boxes
-
-    def _detect_emergency_lights(self, roi):
-        """
-        Detect flashing Blue/Red lights.
-        Focuses on the top half of the vehicle.
-        """
-        h, w = roi.shape[:2]
-        # Crop top 40% (Light bars are usually on top)
-        top_roi = roi[0:int(h*0.4), :]
-        
-        hsv = cv2.cvtColor(top_roi, cv2.COLOR_BGR2HSV)
-        
-        # 1. BLUE LIGHTS (High Saturation, High Value)
-        # H: 100-140 (Blue)
-        lower_blue = np.array([100, 180, 180]) # Very filtered
-        upper_blue = np.array([140, 255, 255])
-        mask_blue = cv2.inRange(hsv, lower_blue, upper_blue)
-        
-        # 2. RED LIGHTS (High Brightness Red)
-        # Intense red lights often appear orange/yellowish in center if blown out, 
-        # but the rim is red. simple red mask:
-        lower_red1 = np.array([0, 180, 200])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 180, 200])
-        upper_red2 = np.array([180, 255, 255])
-        mask_red = cv2.inRange(hsv, lower_red1, upper_red1) | cv2.inRange(hsv, lower_red2, upper_red2)
-        
-        blue_count = cv2.countNonZero(mask_blue)
-        red_count = cv2.countNonZero(mask_red)
-        
-        # Threshold: Needs a cluster of pixels (e.g. > 20 pixels)
-        # This avoids noise pixels
-        has_blue = blue_count > 20
-        has_red = red_count > 20
-        
-        return has_blue or has_red
+
+        return has_ambulance, ambulance_boxes, verified_indices
+
+    def _flash_analyzer(self, lane):
+        analyzer = self.flash_analyzers.get(lane)
+        if analyzer is None:
+            analyzer = self.flash_analyzers[lane] = FlashAnalyzer()
+        return analyzer
+
+    def _is_candidate(self, coords):
+        x1, y1, x2, y2 = coords
+        return x2 - x1 >= 60 and y2 - y1 >= 60
 
     def _detect_text(self, roi):
         """
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+class ScratchBuffers:
+    """
+    Named, grow-only scratch arrays for per-frame intermediates.
+    get() hands out a contiguous view of the requested shape over a buffer
+    that is only reallocated when a larger one is needed, so OpenCV calls can
+    write into it via dst= instead of allocating a new image every frame.
+    A view is only valid until the next get() of the same name.
+    """
+    def __init__(self):
+        self.buffers = {}   # name -> flat array
+
+    def get(self, name, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.size < size:
+            buf = self.buffers[name] = np.empty(size, dtype)
+        return buf[:size].reshape(shape)
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
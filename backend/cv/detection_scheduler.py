@@ -0,0 +1,71 @@
+import time
+
+
+class DetectionScheduler:
+    """
+    Shares a box-wide detection budget (detections per second) across lanes.
+    Tokens accrue at `budget` per second. Lanes that have not been refreshed
+    within `min_refresh` seconds always run; the remaining tokens go to the
+    highest-priority lanes, where priority is staleness scaled by urgency
+    (pending ambulance verification, scene change and density).
+    """
+    AMBULANCE_WEIGHT = 3.0
+    CHANGE_WEIGHT = 1.0
+    DENSITY_WEIGHT = 1.0
+
+    def __init__(self, budget, min_refresh, num_lanes, density_high=30):
+        self.budget = budget
+        self.min_refresh = min_refresh
+        self.density_high = density_high
+        self.max_tokens = float(num_lanes)   # Allows one full batch at once
+
+        self.tokens = self.max_tokens
+        self.last_time = None
+        self.last_run = {}
+
+    def select(self, candidates, now=None):
+        """
+        candidates: {lane: {'changed': bool, 'change': float, 'count': int, 'ambulance': bool}}
+                    for every lane with a fresh frame this tick.
+        Returns the list of lanes to run detection on.
+        """
+        now = now if now is not None else time.time()
+        if self.last_time is not None:
+            self.tokens = min(self.max_tokens, self.tokens + self.budget * (now - self.last_time))
+        self.last_time = now
+
+        forced = []
+        scored = []
+        for lane, info in candidates.items():
+            staleness = now - self.last_run.get(lane, 0.0)
+            if staleness >= self.min_refresh:
+                forced.append(lane)
+                continue
+            # Unchanged scenes keep their last results until they go stale
+            if not info.get('changed', True) and not info.get('ambulance'):
+                continue
+
+            # 1% of the thumbnail changing counts as full activity
+            urgency = 1.0 + self.CHANGE_WEIGHT * min(info.get('change', 0.0) * 100, 1.0)
+            urgency += self.DENSITY_WEIGHT * min(info.get('count', 0) / self.density_high, 1.0)
+            if info.get('ambulance'):
+                urgency += self.AMBULANCE_WEIGHT
+            # Multiplying by staleness shares slots in proportion to urgency
+            # instead of letting the busiest lane take every one
+            score = urgency * staleness
+            scored.append((score, lane))
+
+        # Guaranteed refreshes are paid for even if it overdraws the bucket
+        selected = forced
+        self.tokens = max(self.tokens - len(forced), -self.max_tokens)
+
+        scored.sort(reverse=True)
+        for _, lane in scored:
+            if self.tokens < 1:
+                break
+            selected.append(lane)
+            self.tokens -= 1
+
+        for lane in selected:
+            self.last_run[lane] = now
+        return selected
@@ -0,0 +1,121 @@
+import collections
+
+import cv2
+import numpy as np
+
+from backend.cv.buffers import ScratchBuffers
+
+# HSV ranges for beacon colours (high saturation, high value)
+BLUE_RANGE = (np.array([100, 180, 180]), np.array([140, 255, 255]))
+RED_RANGES = (
+    (np.array([0, 180, 200]), np.array([10, 255, 255])),
+    (np.array([170, 180, 200]), np.array([180, 255, 255])),
+)
+LIGHT_BAR_FRACTION = 0.4  # Light bars sit in the top 40% of the vehicle box
+MIN_LIGHT_PIXELS = 20     # A lit beacon is a cluster, not a few noise pixels
+
+
+def color_masks(hsv, buffers=None):
+    """Red and blue beacon masks (0/255) of an HSV image, written into scratch buffers if given."""
+    buffers = buffers or ScratchBuffers()
+    shape = hsv.shape[:2]
+    red, red_high, blue = (buffers.get(name, shape) for name in ('red', 'red_high', 'blue'))
+    cv2.inRange(hsv, *BLUE_RANGE, dst=blue)
+    cv2.inRange(hsv, *RED_RANGES[0], dst=red)
+    cv2.inRange(hsv, *RED_RANGES[1], dst=red_high)
+    cv2.bitwise_or(red, red_high, dst=red)
+    return red, blue
+
+
+def light_counts(frame, boxes, buffers=None):
+    """
+    Beacon-coloured pixel counts in the top strip of each box, for all boxes at once.
+    Only the region spanning those strips is converted to HSV and thresholded,
+    once; each box's count is then four lookups in an integral image instead
+    of a per-ROI conversion.
+    boxes: (N, 4) x1, y1, x2, y2
+    buffers: ScratchBuffers reused across calls for the HSV image, masks and
+             integrals (one per thread); without it everything is allocated.
+    Returns (red, blue) arrays of lit pixel counts.
+    """
+    boxes = np.asarray(boxes, np.int64).reshape(-1, 4)
+    if not len(boxes):
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    h, w = frame.shape[:2]
+    x1 = boxes[:, 0].clip(0, w)
+    x2 = boxes[:, 2].clip(0, w)
+    y1 = boxes[:, 1].clip(0, h)
+    y2 = (boxes[:, 1] + ((boxes[:, 3] - boxes[:, 1]) * LIGHT_BAR_FRACTION).astype(np.int64)).clip(0, h)
+
+    ox, oy = x1.min(), y1.min()
+    region = frame[oy:y2.max(), ox:x2.max()]
+    if region.size == 0:
+        return np.zeros(len(boxes), np.int64), np.zeros(len(boxes), np.int64)
+    buffers = buffers or ScratchBuffers()
+    hsv = cv2.cvtColor(region, cv2.COLOR_BGR2HSV, dst=buffers.get('hsv', region.shape))
+    red, blue = color_masks(hsv, buffers)
+
+    # Masks are 0/255, so integral sums are 255 x the pixel count
+    x1, x2, y1, y2 = x1 - ox, x2 - ox, y1 - oy, y2 - oy
+    sums_shape = (red.shape[0] + 1, red.shape[1] + 1)
+    red_sum = cv2.integral(red, sum=buffers.get('red_sum', sums_shape, np.int32), sdepth=cv2.CV_32S)
+    blue_sum = cv2.integral(blue, sum=buffers.get('blue_sum', sums_shape, np.int32), sdepth=cv2.CV_32S)
+    return (_box_sums(red_sum, x1, y1, x2, y2) // 255,
+            _box_sums(blue_sum, x1, y1, x2, y2) // 255)
+
+
+def _box_sums(integral, x1, y1, x2, y2):
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
+class FlashAnalyzer:
+    """
+    Per-lane ring buffers of red/blue beacon intensity for each tracked
+    candidate. A vehicle counts as an emergency vehicle only if a colour
+    switches on and off at beacon rate; steady red tail or brake lights do not.
+    """
+    def __init__(self, window=2.0, min_hz=1.0, max_hz=6.0, min_duration=1.0, history=90):
+        self.window = window            # Seconds of history analysed
+        self.min_hz = min_hz            # Typical beacons flash 1-4 Hz (60-240 per minute)
+        self.max_hz = max_hz
+        self.min_duration = min_duration
+        self.history = history          # Ring buffer length (samples)
+        self.buffers = {}               # key -> deque of (timestamp, red, blue)
+
+    def add(self, keys, red, blue, now):
+        for key, r, b in zip(keys, red, blue):
+            buf = self.buffers.get(key)
+            if buf is None:
+                buf = self.buffers[key] = collections.deque(maxlen=self.history)
+            buf.append((now, int(r), int(b)))
+
+    def prune(self, active_keys):
+        """Forget candidates that are no longer tracked."""
+        for key in list(self.buffers):
+            if key not in active_keys:
+                del self.buffers[key]
+
+    def has_history(self, key):
+        buf = self.buffers.get(key)
+        return bool(buf) and buf[-1][0] - buf[0][0] >= self.min_duration
+
+    def is_flashing(self, key):
+        buf = self.buffers.get(key)
+        if not buf:
+            return False
+        samples = np.array(buf, np.float64)
+        samples = samples[samples[:, 0] >= samples[-1, 0] - self.window]
+        duration = samples[-1, 0] - samples[0, 0]
+        if duration < self.min_duration:
+            return False
+        # Red/blue bars alternate, single-colour beacons blink: either channel will do
+        return self._blinks(samples[:, 1], duration) or self._blinks(samples[:, 2], duration)
+
+    def _blinks(self, values, duration):
+        peak = values.max()
+        if peak <= MIN_LIGHT_PIXELS or values.min() > 0.5 * peak:
+            return False  # Never lit, or lit steadily
+        on = values > peak / 2
+        transitions = np.count_nonzero(on[1:] != on[:-1])
+        hz = transitions / 2 / duration
+        return self.min_hz <= hz <= self.max_hz
@@ -0,0 +1,216 @@
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+
+def _empty_prediction():
+    return {'xyxy': np.zeros((0, 4), np.float32), 'conf': np.zeros(0, np.float32), 'cls': np.zeros(0, np.int32)}
+
+
+class UltralyticsBackend:
+    """PyTorch inference through ultralytics.YOLO (the original path)."""
+    name = "pytorch"
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def predict(self, frames, conf=0.1):
+        """Returns one {'xyxy', 'conf', 'cls'} dict of NumPy arrays per frame."""
+        results = self.model(list(frames), verbose=False, conf=conf)
+        predictions = []
+        for result in results:
+            boxes = result.boxes
+            predictions.append({
+                'xyxy': boxes.xyxy.cpu().numpy().astype(np.float32),
+                'conf': boxes.conf.cpu().numpy().astype(np.float32),
+                'cls': boxes.cls.cpu().numpy().astype(np.int32),
+            })
+        return predictions
+
+    def warmup(self, frame_shape=(270, 480, 3)):
+        self.predict([np.zeros(frame_shape, np.uint8)])
+
+
+class _ExportedYoloBackend(ABC):
+    """
+    Shared pre/post-processing for YOLOv8 models exported to ONNX / OpenVINO.
+    Output layout is (batch, 4 + num_classes, anchors) with cx, cy, w, h boxes
+    in network input pixels.
+    """
+    IOU_THRESHOLD = 0.45
+    DEFAULT_SIZE = 640
+
+    input_size = (DEFAULT_SIZE, DEFAULT_SIZE)  # (height, width)
+    dynamic_batch = False
+
+    @abstractmethod
+    def _run(self, batch):
+        """Runs the network on a preprocessed NCHW float32 batch; returns its raw output."""
+
+    def _letterbox(self, frame):
+        in_h, in_w = self.input_size
+        h, w = frame.shape[:2]
+        scale = min(in_w / w, in_h / h)
+        new_w, new_h = int(round(w * scale)), int(round(h * scale))
+        pad_x, pad_y = (in_w - new_w) // 2, (in_h - new_h) // 2
+
+        canvas = np.full((in_h, in_w, 3), 114, np.uint8)
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        return canvas, scale, pad_x, pad_y
+
+    def predict(self, frames, conf=0.1):
+        """Returns one {'xyxy', 'conf', 'cls'} dict of NumPy arrays per frame."""
+        if not frames:
+            return []
+        prepared = [self._letterbox(f) for f in frames]
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1]
+        blob = cv2.dnn.blobFromImages([p[0] for p in prepared], 1 / 255.0, swapRB=True)
+
+        if self.dynamic_batch:
+            outputs = self._run(blob)
+        else:
+            outputs = np.concatenate([self._run(blob[i:i + 1]) for i in range(len(frames))])
+
+        return [
+            self._postprocess(out, scale, pad_x, pad_y, frame.shape, conf)
+            for out, (_, scale, pad_x, pad_y), frame in zip(outputs, prepared, frames)
+        ]
+
+    def _postprocess(self, out, scale, pad_x, pad_y, frame_shape, conf):
+        preds = out.T   # (anchors, 4 + num_classes)
+        scores = preds[:, 4:]
+        cls = scores.argmax(axis=1)
+        best = scores[np.arange(len(cls)), cls]
+        keep = best >= conf
+        if not keep.any():
+            return _empty_prediction()
+
+        preds, cls, best = preds[keep], cls[keep], best[keep]
+        xyxy = np.empty((len(preds), 4), np.float32)
+        xyxy[:, 0] = preds[:, 0] - preds[:, 2] / 2
+        xyxy[:, 1] = preds[:, 1] - preds[:, 3] / 2
+        xyxy[:, 2] = preds[:, 0] + preds[:, 2] / 2
+        xyxy[:, 3] = preds[:, 1] + preds[:, 3] / 2
+
+        # Class-aware NMS: shift each class into its own coordinate range
+        offset = cls[:, None].astype(np.float32) * 4096
+        shifted = xyxy + offset
+        rects = np.column_stack([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]])
+        idx = cv2.dnn.NMSBoxes(rects.tolist(), best.tolist(), conf, self.IOU_THRESHOLD)
+        idx = np.array(idx, np.int32).reshape(-1)
+
+        xyxy = xyxy[idx]
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad_x) / scale
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad_y) / scale
+        h, w = frame_shape[:2]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        return {'xyxy': xyxy, 'conf': best[idx].astype(np.float32), 'cls': cls[idx].astype(np.int32)}
+
+    def warmup(self, frame_shape=(270, 480, 3)):
+        self.predict([np.zeros(frame_shape, np.uint8)])
+
+
+class OnnxRuntimeBackend(_ExportedYoloBackend):
+    """CPU inference of an exported (optionally INT8-quantized) ONNX model via ONNX Runtime."""
+    name = "onnxruntime"
+
+    def __init__(self, model_path, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, h, w = model_input.shape
+        self.dynamic_batch = not isinstance(batch, int)
+        if isinstance(h, int) and isinstance(w, int):
+            self.input_size = (h, w)
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(_ExportedYoloBackend):
+    """CPU inference of an OpenVINO IR model (ultralytics `format=openvino` export)."""
+    name = "openvino"
+
+    def __init__(self, model_path):
+        import openvino as ov
+
+        if os.path.isdir(model_path):
+            xml = [f for f in os.listdir(model_path) if f.endswith(".xml")]
+            if not xml:
+                raise FileNotFoundError(f"No .xml model in {model_path}")
+            model_path = os.path.join(model_path, xml[0])
+
+        core = ov.Core()
+        model = core.read_model(model_path)
+        shape = model.input(0).get_partial_shape()
+        self.dynamic_batch = shape[0].is_dynamic
+        if shape[2].is_static and shape[3].is_static:
+            self.input_size = (shape[2].get_length(), shape[3].get_length())
+        self.compiled = core.compile_model(model, "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.output = self.compiled.output(0)
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.output]
+
+
+def resolve_backend(model_name, default_path, weights_dir):
+    """
+    Maps the `yolo_model` setting to (backend class, model path).
+      *.onnx                          -> ONNX Runtime (e.g. yolov8s-int8.onnx)
+      *.xml or *_openvino_model       -> OpenVINO
+      anything else (yolov8s, *.pt)   -> ultralytics / PyTorch on default_path
+    Relative paths are looked up in weights_dir.
+    """
+    name = (model_name or "").strip()
+
+    def _path(p):
+        return p if os.path.isabs(p) else os.path.join(weights_dir, p)
+
+    if name.endswith(".onnx"):
+        return OnnxRuntimeBackend, _path(name)
+    if name.endswith(".xml") or name.rstrip("/").endswith("_openvino_model"):
+        return OpenVinoBackend, _path(name)
+    if name.endswith(".pt"):
+        return UltralyticsBackend, _path(name)
+    return UltralyticsBackend, default_path
+
+
+def create_backend(model_name, default_path, weights_dir):
+    backend_cls, path = resolve_backend(model_name, default_path, weights_dir)
+    return backend_cls(path)
+
+
+def quantize_onnx_int8(src_path, dst_path, calibration_frames):
+    """
+    Static INT8 (QDQ) quantization of an exported YOLO ONNX model.
+    calibration_frames: representative BGR frames, ideally from the deployed cameras.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    helper = OnnxRuntimeBackend(src_path)
+
+    class _FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(calibration_frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            if frame is None:
+                return None
+            canvas = helper._letterbox(frame)[0]
+            return {helper.input_name: cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True)}
+
+    quantize_static(src_path, dst_path, _FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    return dst_path
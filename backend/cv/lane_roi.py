@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+
+class LaneROI:
+    """
+    A lane's region of interest: a polygon in normalised (0-1) frame coordinates.
+    Detection runs on the polygon's bounding crop, taken from the full-resolution
+    source frame and letterboxed to the working size, so vehicles get more
+    pixels and cross traffic outside the crop costs nothing. A vehicle counts
+    only if its ground point (bottom centre) lies inside the polygon.
+    """
+    PAD_VALUE = 114
+
+    def __init__(self, polygon, frame_size=(480, 270)):
+        self.polygon = np.asarray(polygon, np.float32).reshape(-1, 2).clip(0, 1)
+        if len(self.polygon) < 3:
+            raise ValueError("A lane region needs at least 3 points")
+        self.frame_size = frame_size
+        w, h = frame_size
+
+        # Polygon in working-frame pixels, for drawing and the membership mask
+        self.points = np.round(self.polygon * [w - 1, h - 1]).astype(np.int32)
+        self.mask = np.zeros((h, w), np.uint8)
+        cv2.fillPoly(self.mask, [self.points], 1)
+
+        self._geometry = {}   # raw (h, w) -> crop/letterbox parameters
+        self._last = None     # Parameters of the most recent crop
+        self._canvas = None   # Letterboxed crop, reused by every crop()
+
+    def _crop_geometry(self, raw_shape):
+        geom = self._geometry.get(raw_shape)
+        if geom is None:
+            raw_h, raw_w = raw_shape
+            x1, y1 = np.floor(self.polygon.min(axis=0) * [raw_w, raw_h]).astype(int)
+            x2, y2 = np.ceil(self.polygon.max(axis=0) * [raw_w, raw_h]).astype(int)
+            x2, y2 = max(x2, x1 + 1), max(y2, y1 + 1)
+
+            out_w, out_h = self.frame_size
+            scale = min(out_w / (x2 - x1), out_h / (y2 - y1))
+            new_w, new_h = max(1, int(round((x2 - x1) * scale))), max(1, int(round((y2 - y1) * scale)))
+            pad_x, pad_y = (out_w - new_w) // 2, (out_h - new_h) // 2
+            geom = self._geometry[raw_shape] = (x1, y1, x2, y2, scale, new_w, new_h, pad_x, pad_y, raw_w, raw_h)
+        return geom
+
+    def crop(self, raw_frame):
+        """
+        The ROI's bounding crop of a source frame, letterboxed to frame_size.
+        The returned image is overwritten by the next crop(); copy it to keep it.
+        """
+        geom = self._crop_geometry(raw_frame.shape[:2])
+        x1, y1, x2, y2, scale, new_w, new_h, pad_x, pad_y, _, _ = geom
+        out_w, out_h = self.frame_size
+
+        canvas = self._canvas
+        if canvas is None:
+            canvas = self._canvas = np.empty((out_h, out_w, 3), np.uint8)
+        # Refill the bars every time: callers may have drawn on the last crop
+        canvas[:pad_y] = canvas[pad_y + new_h:] = self.PAD_VALUE
+        canvas[:, :pad_x] = canvas[:, pad_x + new_w:] = self.PAD_VALUE
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        cv2.resize(raw_frame[y1:y2, x1:x2], (new_w, new_h), interpolation=interpolation,
+                   dst=canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w])
+        self._last = geom
+        return canvas
+
+    def to_frame(self, detections):
+        """Copy of a detection array with boxes mapped from the last crop to working-frame pixels."""
+        mapped = detections.copy()
+        if self._last is None or not len(detections):
+            return mapped
+        x1, y1, _, _, scale, _, _, pad_x, pad_y, raw_w, raw_h = self._last
+        out_w, out_h = self.frame_size
+
+        boxes = detections['box'].astype(np.float32)
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / scale + x1) * (out_w / raw_w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / scale + y1) * (out_h / raw_h)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, out_w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, out_h)
+        mapped['box'] = boxes.astype(np.int32)
+        return mapped
+
+    def contains(self, detections):
+        """Boolean mask: which detections (working-frame boxes) stand inside the polygon."""
+        if not len(detections):
+            return np.zeros(0, bool)
+        w, h = self.frame_size
+        boxes = detections['box']
+        cx = ((boxes[:, 0] + boxes[:, 2]) // 2).clip(0, w - 1)
+        cy = (boxes[:, 3] - 1).clip(0, h - 1)
+        return self.mask[cy, cx].astype(bool)
+
+    def draw(self, frame):
+        cv2.polylines(frame, [self.points], True, (255, 255, 0), 1)
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap per-lane change detector used to skip YOLO on static scenes.
+    Each frame is shrunk to a tiny blurred grayscale thumbnail and compared
+    against the thumbnail of the last frame that was actually detected on.
+    """
+    def __init__(self, changed_fraction=0.005, pixel_threshold=25, size=(64, 36)):
+        self.changed_fraction = changed_fraction  # Share of thumbnail pixels that must change
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+
+        self.reference = None
+        self.thumb = None
+        # Thumbnails alternate between two buffers (one is always the reference)
+        w, h = size
+        self._small = np.empty((h, w, 3), np.uint8)
+        self._gray = np.empty((h, w), np.uint8)
+        self._diff = np.empty((h, w), np.uint8)
+        self._thumbs = (np.empty((h, w), np.uint8), np.empty((h, w), np.uint8))
+        self.change = 0.0    # Changed share of the last checked frame
+        self.checked = 0
+        self.detected = 0    # Checked frames that were actually sent to the detector
+
+    def _thumbnail(self, frame):
+        out = self._thumbs[0] if self._thumbs[0] is not self.reference else self._thumbs[1]
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return cv2.GaussianBlur(self._gray, (3, 3), 0, dst=out)
+
+    def check(self, frame):
+        """Returns True if the scene changed materially since the last detection."""
+        self.checked += 1
+        self.thumb = self._thumbnail(frame)
+
+        if self.reference is None:
+            self.change = 1.0
+            return True
+
+        diff = cv2.absdiff(self.thumb, self.reference, dst=self._diff)
+        cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=diff)
+        self.change = cv2.countNonZero(diff) / diff.size
+        return self.change >= self.changed_fraction
+
+    def bypass(self):
+        """Gate turned off: count the frame as checked and treat it as changed."""
+        self.checked += 1
+        return True
+
+    def mark_detected(self):
+        """The last checked frame was sent to the detector; compare against it from now on."""
+        self.detected += 1
+        if self.thumb is not None:
+            self.reference = self.thumb
+
+    def skip_ratio(self):
+        """Share of checked frames that got no detection (unchanged, or not picked by the scheduler)."""
+        return round(1 - self.detected / self.checked, 3) if self.checked else 0.0
@@ -0,0 +1,158 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def roi_hash(roi):
+    """64-bit difference hash of an ROI; near-identical crops of the same vehicle share it."""
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class OcrVerifier:
+    """
+    Runs OCR text verification off the frame loop.
+    Candidates go into a bounded priority queue served by a small pool of
+    worker threads; verdicts are cached per key (tracked vehicle, or ROI
+    hash) with a TTL so the same bus is not re-read on every tick. Callers
+    get the cached verdict immediately, or None while it is pending.
+    """
+    CACHE_SIZE = 1024  # Hard cap on cached verdicts; the oldest are evicted first
+
+    def __init__(self, ocr_fn, prepare_fn=None, workers=1, queue_size=32, ttl=30.0, frame_budget_ms=200.0):
+        self.ocr_fn = ocr_fn            # roi -> bool, slow
+        self.prepare_fn = prepare_fn    # Called once per worker before the first job (e.g. model load)
+        self.num_workers = max(1, workers)
+        self.ttl = ttl
+        self.frame_budget_ms = frame_budget_ms
+
+        self.queue = queue.PriorityQueue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # key -> (verdict, expires_at), oldest first
+        self.pending = set()
+        self.generation = 0   # Bumped by forget(); answers queued before are not cached
+        self.epochs = {}      # lane -> same, per lane
+        self.counter = itertools.count()
+        self.threads = []
+        self.frame_slots = 1   # New jobs the current frame may still queue
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.completed = 0
+        self.latency_ms = 0.0   # EWMA of one OCR call
+        self.latency_hook = None  # Optional fn(key, seconds) called after every OCR call
+
+    def _start(self):
+        for _ in range(self.num_workers):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def begin_frame(self):
+        """Reset the per-frame allowance: as many new jobs as fit in the OCR time budget."""
+        with self.lock:
+            if self.latency_ms <= 0:
+                self.frame_slots = 1
+            else:
+                self.frame_slots = max(1, int(self.frame_budget_ms / self.latency_ms))
+
+    def lookup(self, key, roi, priority=0.0):
+        """
+        Returns the cached verdict for key, or None if unknown / pending.
+        On a miss the ROI is queued (copied) if the frame still has budget.
+        Higher priority is served first.
+        """
+        if key is None:
+            key = roi_hash(roi)
+        now = time.time()
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[1] > now:
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            if key in self.pending or self.frame_slots <= 0:
+                return None
+            if not self.threads:
+                self._start()
+            try:
+                self.queue.put_nowait((-priority, next(self.counter), key, self._epoch(key), roi.copy()))
+                self.pending.add(key)
+                self.frame_slots -= 1
+                return None
+            except queue.Full:
+                self.dropped += 1
+                return None
+
+    def forget(self, lane=None):
+        """
+        Drop cached and pending verdicts of one lane's (lane, track_id) keys, or
+        all of them, e.g. after its tracker restarted ids. Answers still being
+        computed for those keys are discarded when they arrive.
+        """
+        with self.lock:
+            if lane is None:
+                self.generation += 1
+                self.cache.clear()
+                self.pending.clear()
+                return
+            self.epochs[lane] = self.epochs.get(lane, 0) + 1
+            self.cache = OrderedDict((k, v) for k, v in self.cache.items() if not (isinstance(k, tuple) and k[0] == lane))
+            self.pending = {k for k in self.pending if not (isinstance(k, tuple) and k[0] == lane)}
+
+    def _epoch(self, key):
+        return self.generation, (self.epochs.get(key[0], 0) if isinstance(key, tuple) else 0)
+
+    def _worker(self):
+        if self.prepare_fn:
+            self.prepare_fn()
+        while True:
+            _, _, key, epoch, roi = self.queue.get()
+            start = time.time()
+            try:
+                verdict = bool(self.ocr_fn(roi))
+            except Exception as e:
+                print(f"OCR worker error: {e}")
+                verdict = False
+            elapsed_ms = (time.time() - start) * 1000
+            if self.latency_hook:
+                self.latency_hook(key, elapsed_ms / 1000)
+
+            with self.lock:
+                self.completed += 1
+                self.latency_ms = elapsed_ms if self.completed == 1 else 0.9 * self.latency_ms + 0.1 * elapsed_ms
+                if epoch != self._epoch(key):
+                    continue  # The vehicle this key meant is gone
+                self.pending.discard(key)
+                now = time.time()
+                self.cache[key] = (verdict, now + self.ttl)
+                self.cache.move_to_end(key)
+                # One TTL for all entries, so insertion order is expiry order
+                while self.cache and next(iter(self.cache.values()))[1] <= now:
+                    self.cache.popitem(last=False)
+                while len(self.cache) > self.CACHE_SIZE:
+                    self.cache.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "queue_depth": self.queue.qsize(),
+                "pending": len(self.pending),
+                "cached": len(self.cache),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "latency_ms": round(self.latency_ms, 1),
+            }
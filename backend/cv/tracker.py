@@ -0,0 +1,189 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N,4) and (M,4) xyxy box arrays."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+def greedy_match(iou, threshold):
+    """
+    Greedy highest-IoU-first assignment.
+    Returns (matches [(row, col)], unmatched_rows, unmatched_cols).
+    """
+    rows, cols = iou.shape
+    matches = []
+    if rows and cols:
+        iou = np.where(iou >= threshold, iou, -1.0)
+        for _ in range(min(rows, cols)):
+            flat = int(np.argmax(iou))
+            r, c = divmod(flat, cols)
+            if iou[r, c] < 0:
+                break
+            matches.append((r, c))
+            iou[r, :] = -1.0
+            iou[:, c] = -1.0
+    matched_rows = {r for r, _ in matches}
+    matched_cols = {c for _, c in matches}
+    return (matches,
+            [r for r in range(rows) if r not in matched_rows],
+            [c for c in range(cols) if c not in matched_cols])
+
+
+class LaneTracker:
+    """
+    Lightweight IoU tracker with constant-velocity box prediction.
+    update() is called with fresh detections, predict() on every frame in
+    between, so boxes keep moving while YOLO is not running. Each vehicle is
+    counted once, when its track is confirmed.
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=2, min_hits=2,
+                 flow_window=60.0, queue_speed=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed      # Detection ticks a track may go unmatched
+        self.min_hits = min_hits          # Matches before a track is confirmed and counted
+        self.flow_window = flow_window    # Seconds of history for vehicles-per-minute
+        self.queue_speed = queue_speed    # px/frame below which a vehicle counts as queued
+
+        self.boxes = np.empty((0, 4), np.float32)      # Current (predicted) boxes
+        self.last_det = np.empty((0, 4), np.float32)   # Box at the last matched detection
+        self.velocity = np.zeros((0, 4), np.float32)   # px per frame
+        self.hits = np.zeros(0, np.int32)
+        self.missed = np.zeros(0, np.int32)
+        self.frames_since_update = np.zeros(0, np.int32)
+        self.counted = np.zeros(0, bool)
+        self.ids = []
+        self.info = []    # Latest detection per track: {'cls', 'conf'} plus flags
+
+        self.next_id = 1
+        self.counted_times = deque()   # Timestamps of newly counted vehicles
+        self.pending_counts = {}       # class id -> unique vehicles not yet logged
+
+    def predict(self):
+        """Advance every track by its velocity (one frame)."""
+        self.boxes += self.velocity
+        self.frames_since_update += 1
+
+    def update(self, detections, now=None):
+        """
+        detections: VehicleDetector structured array with 'box', 'conf', 'cls'.
+        Returns the track id assigned to each detection, in input order.
+        """
+        now = now if now is not None else time.time()
+        det_boxes = detections['box'].astype(np.float32).reshape(-1, 4)
+        det_info = [{'cls': c, 'conf': round(f, 2)}
+                    for c, f in zip(detections['cls'].tolist(), detections['conf'].tolist())]
+        matches, unmatched_tracks, unmatched_dets = greedy_match(
+            iou_matrix(self.boxes, det_boxes), self.iou_threshold)
+
+        det_ids = [0] * len(detections)
+        if matches:
+            t_idx = np.array([t for t, _ in matches])
+            d_idx = np.array([d for _, d in matches])
+            steps = np.maximum(self.frames_since_update[t_idx], 1)[:, None]
+            measured = (det_boxes[d_idx] - self.last_det[t_idx]) / steps
+            # First match sets the velocity, later ones smooth it
+            seen = (self.hits[t_idx] > 1)[:, None]
+            self.velocity[t_idx] = np.where(seen, 0.5 * self.velocity[t_idx] + 0.5 * measured, measured)
+            self.boxes[t_idx] = det_boxes[d_idx]
+            self.last_det[t_idx] = det_boxes[d_idx]
+            self.hits[t_idx] += 1
+            self.missed[t_idx] = 0
+            self.frames_since_update[t_idx] = 0
+            for t, d in matches:
+                self.info[t] = det_info[d]
+                det_ids[d] = self.ids[t]
+
+        if unmatched_tracks:
+            self.missed[unmatched_tracks] += 1
+
+        # Drop tracks that have been lost for too long
+        keep = self.missed <= self.max_missed
+        if not keep.all():
+            self._select(keep)
+
+        # Start new tentative tracks
+        if unmatched_dets:
+            n = len(unmatched_dets)
+            new_boxes = det_boxes[unmatched_dets]
+            self.boxes = np.vstack([self.boxes, new_boxes])
+            self.last_det = np.vstack([self.last_det, new_boxes])
+            self.velocity = np.vstack([self.velocity, np.zeros((n, 4), np.float32)])
+            self.hits = np.concatenate([self.hits, np.ones(n, np.int32)])
+            self.missed = np.concatenate([self.missed, np.zeros(n, np.int32)])
+            self.frames_since_update = np.concatenate([self.frames_since_update, np.zeros(n, np.int32)])
+            self.counted = np.concatenate([self.counted, np.zeros(n, bool)])
+            for d in unmatched_dets:
+                self.ids.append(self.next_id)
+                self.info.append(det_info[d])
+                det_ids[d] = self.next_id
+                self.next_id += 1
+
+        # Count each vehicle once, when its track is confirmed
+        newly_confirmed = np.flatnonzero((self.hits >= self.min_hits) & ~self.counted)
+        for t in newly_confirmed:
+            cls_id = self.info[t]['cls']
+            self.pending_counts[cls_id] = self.pending_counts.get(cls_id, 0) + 1
+            self.counted_times.append(now)
+        self.counted[newly_confirmed] = True
+
+        return det_ids
+
+    def _select(self, mask):
+        self.boxes = self.boxes[mask]
+        self.last_det = self.last_det[mask]
+        self.velocity = self.velocity[mask]
+        self.hits = self.hits[mask]
+        self.missed = self.missed[mask]
+        self.frames_since_update = self.frames_since_update[mask]
+        self.counted = self.counted[mask]
+        idx = np.flatnonzero(mask)
+        self.ids = [self.ids[i] for i in idx]
+        self.info = [self.info[i] for i in idx]
+
+    def set_flag(self, track_ids, key, value=True):
+        """Attach a flag (e.g. 'ambulance') to the current detection info of the given tracks."""
+        track_ids = set(track_ids)
+        for t, tid in enumerate(self.ids):
+            if tid in track_ids:
+                self.info[t] = dict(self.info[t], **{key: value})
+
+    def get_tracks(self):
+        """Current boxes of live (not currently missed) tracks, ready for drawing."""
+        tracks = []
+        for t in np.flatnonzero(self.missed == 0):
+            x1, y1, x2, y2 = (int(v) for v in self.boxes[t])
+            track = dict(self.info[t])
+            track['coords'] = (x1, y1, x2, y2)
+            track['track_id'] = self.ids[t]
+            tracks.append(track)
+        return tracks
+
+    def flow_per_minute(self, now=None):
+        now = now if now is not None else time.time()
+        while self.counted_times and self.counted_times[0] < now - self.flow_window:
+            self.counted_times.popleft()
+        return round(len(self.counted_times) * 60.0 / self.flow_window, 1)
+
+    def queue_length(self):
+        """Confirmed vehicles currently in view that are (nearly) stationary."""
+        centre_speed = np.hypot((self.velocity[:, 0] + self.velocity[:, 2]) / 2,
+                                (self.velocity[:, 1] + self.velocity[:, 3]) / 2)
+        queued = (self.hits >= self.min_hits) & (self.missed == 0) & (centre_speed < self.queue_speed)
+        return int(queued.sum())
+
+    def pop_counts(self):
+        """Unique vehicles per class id counted since the last call."""
+        counts = self.pending_counts
+        self.pending_counts = {}
+        return counts
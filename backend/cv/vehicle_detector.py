@@ -1,74 +1,120 @@
-from ultralytics import YOLO
+import os
 import cv2
+import numpy as np
+from backend.cv.inference_backends import UltralyticsBackend, create_backend
+
+CLASS_NAMES = {1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+
+# One row per detected vehicle; cls is the COCO class id (see CLASS_NAMES)
+DETECTION_DTYPE = np.dtype([('box', np.int32, (4,)), ('conf', np.float32), ('cls', np.int16)])
+
+
+def count_detections(detections):
+    """Vehicles per type name in a detection array."""
+    per_class = np.bincount(detections['cls'], minlength=max(CLASS_NAMES) + 1)
+    return {name: int(per_class[cls_id]) for cls_id, name in CLASS_NAMES.items()}
+
+
+def detection_label(cls_id, conf):
+    return f"{CLASS_NAMES[int(cls_id)]} {int(conf * 100)}%"
+
 
 class VehicleDetector:
-    def __init__(self, model_path, confidence=0.3):
+    def __init__(self, model_path, confidence=0.3, model_name=None):
+        """
+        model_path: default PyTorch weights
+        model_name: the `yolo_model` setting; *.onnx / OpenVINO names select a faster CPU backend
+        """
+        self.model_name = model_name
         try:
-            self.model = YOLO(model_path) 
+            self.backend = create_backend(model_name, model_path, os.path.dirname(model_path))
         except Exception as e:
-            print(f"Warning: Using yolov8n.pt default.")
-            self.model = YOLO('yolov8n.pt')
+            print(f"Warning: Could not load {model_name or model_path} ({e}). Using yolov8n.pt default.")
+            self.backend = UltralyticsBackend('yolov8n.pt')
             
         self.confidence = confidence
         self.target_classes = [1, 2, 3, 5, 7]
-        self.class_names = {
-            1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'
-        }
+        self.class_names = CLASS_NAMES
+
+        # Minimum confidence per class id; -1 marks classes that are ignored.
+        # Bikes/Motorcycles are smaller, so we accept lower confidence;
+        # Cars/Trucks/Buses require more to avoid false positives.
+        self.class_thresholds = np.full(max(self.target_classes) + 1, -1.0, np.float32)
+        self.class_thresholds[[1, 3]] = 0.1
+        self.class_thresholds[[2, 5, 7]] = self.confidence
 
     def detect(self, frame, exclude_boxes=None, draw=True):
-        if exclude_boxes is None:
-            exclude_boxes = []
-            
         # Use a very low base confidence so we don't miss small objects like bikes
-        results = self.model(frame, stream=True, verbose=False, conf=0.1)
-        
-        counts = {name: 0 for name in self.class_names.values()}
-        total_count = 0
-        vehicle_boxes = [] # List of (x1,y1,x2,y2, label, color)
-        
+        prediction = self.backend.predict([frame], conf=0.1)[0]
+        return self._parse_results(frame, prediction, exclude_boxes, draw)
+
+    def detect_batch(self, frames, exclude_boxes=None, draw=False):
+        """
+        Run all frames through the model in a single forward pass.
+        frames: list of same-sized frames (one per lane due for detection)
+        exclude_boxes: optional list (one entry per frame) of boxes to ignore
+        Returns a list with one detect()-style tuple per frame, in input order.
+        """
+        if not frames:
+            return []
+        if exclude_boxes is None:
+            exclude_boxes = [None] * len(frames)
+
+        predictions = self.backend.predict(list(frames), conf=0.1)
+        return [
+            self._parse_results(frame, prediction, excl, draw)
+            for frame, prediction, excl in zip(frames, predictions, exclude_boxes)
+        ]
+
+    def warmup(self, frame_shape=(270, 480, 3)):
+        """Run one dummy inference so the first real frame doesn't pay for lazy initialisation."""
+        self.backend.warmup(frame_shape)
+
+    def _parse_results(self, frame, prediction, exclude_boxes=None, draw=True):
+        """
+        prediction: {'xyxy', 'conf', 'cls'} arrays from the inference backend.
+        Filtering, per-class thresholds and exclusion run as array operations,
+        so a crowded frame costs about the same as a sparse one.
+        Returns (annotated_frame, counts, total_count, detections) where
+        detections is a DETECTION_DTYPE structured array.
+        """
+        cls = prediction['cls'].astype(np.int64)
+        conf = prediction['conf']
+        xyxy = prediction['xyxy']
+
+        # Per-class minimum confidence (-1 = not a vehicle class)
+        in_range = (cls >= 0) & (cls < len(self.class_thresholds))
+        thresholds = np.where(in_range, self.class_thresholds[np.where(in_range, cls, 0)], -1.0)
+        keep = (thresholds >= 0) & (conf >= thresholds)
+
+        boxes = xyxy[keep].astype(np.int32)
+        if exclude_boxes is not None and len(exclude_boxes) and len(boxes):
+            # Drop boxes more than half covered by any exclusion box
+            excl = np.asarray(exclude_boxes, np.int32).reshape(-1, 4)
+            dx = np.minimum(boxes[:, None, 2], excl[None, :, 2]) - np.maximum(boxes[:, None, 0], excl[None, :, 0])
+            dy = np.minimum(boxes[:, None, 3], excl[None, :, 3]) - np.maximum(boxes[:, None, 1], excl[None, :, 1])
+            overlap = np.clip(dx, 0, None).astype(np.int64) * np.clip(dy, 0, None)
+            area = (boxes[:, 2] - boxes[:, 0]).astype(np.int64) * (boxes[:, 3] - boxes[:, 1])
+            covered = (overlap > 0.5 * area[:, None]).any(axis=1)
+            keep[np.flatnonzero(keep)[covered]] = False
+            boxes = boxes[~covered]
+
+        detections = np.empty(len(boxes), DETECTION_DTYPE)
+        detections['box'] = boxes
+        detections['conf'] = conf[keep]
+        detections['cls'] = cls[keep]
+
+        counts = count_detections(detections)
+        total_count = len(detections)
+
         annotated_frame = frame
-        
-        for result in results:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                if cls_id in self.target_classes:
-                    conf = box.conf[0]
-                    
-                    # Apply specific confidence thresholds based on vehicle size
-                    # Bikes/Motorcycles are smaller, so we accept lower confidence
-                    if cls_id in [1, 3] and conf < 0.1: # bicycle, motorcycle
-                        continue
-                    # Cars/Trucks/Buses are larger, require higher confidence to avoid false positives
-                    elif cls_id in [2, 5, 7] and conf < self.confidence:
-                        continue
-                        
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    
-                    # Overlap Check
-                    is_excluded = False
-                    for (ex_x1, ex_y1, ex_x2, ex_y2) in exclude_boxes:
-                        dx = min(x2, ex_x2) - max(x1, ex_x1)
-                        dy = min(y2, ex_y2) - max(y1, ex_y1)
-                        if (dx >= 0) and (dy >= 0):
-                            if (dx * dy) > 0.5 * ((x2-x1)*(y2-y1)):
-                                is_excluded = True
-                                break
-                    if is_excluded: continue
-
-                    name = self.class_names[cls_id]
-                    counts[name] += 1
-                    total_count += 1
-                    
-                    label = f"{name} {int(conf*100)}%"
-                    color = (0, 255, 0)
-                    
-                    # Store box for potential caching
-                    vehicle_boxes.append({'coords': (x1, y1, x2, y2), 'label': label, 'color': color, 'type': name})
-                    
-                    # Draw
-                    if draw:
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                        cv2.putText(annotated_frame, label, (x1, y1 - 10), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                                
-        return annotated_frame, counts, total_count, vehicle_boxes
+        if draw:
+            color = (0, 255, 0)
+            for det in detections:
+                x1, y1, x2, y2 = det['box'].tolist()
+                label = detection_label(det['cls'], det['conf'])
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+                cv2.putText(annotated_frame, label, (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        return annotated_frame, counts, total_count, detections
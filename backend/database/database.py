@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 from backend.config import settings
@@ -12,3 +12,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def add_missing_columns(metadata):
+    """
+    create_all() never alters existing tables; add columns introduced since a
+    database was created (all of them nullable or defaulted) so old installs keep working.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"
+                if default is not None:
+                    ddl += f" DEFAULT {default!r}"
+                conn.execute(text(ddl))
+                print(f"Added column {table.name}.{column.name}")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Float, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -20,25 +20,105 @@ class User(Base):
     reports = relationship("AccidentReport", back_populates="user")
     audit_logs = relationship("AuditLog", back_populates="user")
 
+class Intersection(Base):
+    __tablename__ = 'intersections'
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(150), nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    num_lanes = Column(Integer, default=4)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    cameras = relationship("Camera", back_populates="intersection", cascade="all, delete-orphan")
+
+class Camera(Base):
+    __tablename__ = 'cameras'
+    __table_args__ = (UniqueConstraint('intersection_id', 'lane_index'),)
+    id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, ForeignKey('intersections.id'), nullable=False, index=True)
+    lane_index = Column(Integer, nullable=False)  # 0-based lane at the intersection
+    source = Column(String(500), nullable=True)   # Stream URL, device index or uploaded file path
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    intersection = relationship("Intersection", back_populates="cameras")
+
 class LaneStats(Base):
     __tablename__ = 'lane_stats'
     id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, index=True)
     lane_id = Column(Integer, nullable=False)
     vehicle_count = Column(Integer, default=0)
     density = Column(String(20))
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+class LaneRegion(Base):
+    __tablename__ = 'lane_regions'
+    __table_args__ = (UniqueConstraint('intersection_id', 'lane_id'),)
+    id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, nullable=False)
+    lane_id = Column(Integer, nullable=False)
+    polygon = Column(Text, nullable=False)  # JSON [[x, y], ...] in 0-1 frame coordinates
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class VehicleLog(Base):
     __tablename__ = 'vehicle_logs'
     id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, index=True)
     lane_id = Column(Integer, nullable=False)
     vehicle_type = Column(String(50), nullable=False)
     count = Column(Integer, default=1)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+# Rollups of lane_stats / vehicle_logs, kept in step by the inserting transaction
+# (backend.utils.rollups) so analytics never scan the raw tables
+class LaneStatsRollup(Base):
+    __tablename__ = 'lane_stats_rollups'
+    __table_args__ = (UniqueConstraint('resolution', 'intersection_id', 'lane_id', 'bucket'),
+                      Index('ix_lane_stats_rollups_resolution_bucket', 'resolution', 'bucket'))
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String(10), nullable=False)  # "minute" or "hour"
+    intersection_id = Column(Integer, default=1, nullable=False)
+    lane_id = Column(Integer, nullable=False)
+    bucket = Column(DateTime, nullable=False)        # Start of the minute / hour
+    samples = Column(Integer, default=0)             # lane_stats rows in the bucket
+    count_sum = Column(BigInteger, default=0)
+    count_max = Column(Integer, default=0)
+
+class VehicleRollup(Base):
+    __tablename__ = 'vehicle_rollups'
+    __table_args__ = (UniqueConstraint('resolution', 'intersection_id', 'lane_id', 'bucket', 'vehicle_type'),
+                      Index('ix_vehicle_rollups_resolution_bucket', 'resolution', 'bucket'))
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String(10), nullable=False)
+    intersection_id = Column(Integer, default=1, nullable=False)
+    lane_id = Column(Integer, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    vehicle_type = Column(String(50), nullable=False)
+    count = Column(BigInteger, default=0)
+
+class LaneHourProfile(Base):
+    """All lane_stats by hour of day (0-23): peak hours, lane averages and predictions."""
+    __tablename__ = 'lane_hour_profile'
+    __table_args__ = (UniqueConstraint('intersection_id', 'lane_id', 'hour'),)
+    id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, nullable=False)
+    lane_id = Column(Integer, nullable=False)
+    hour = Column(Integer, nullable=False)
+    samples = Column(BigInteger, default=0)
+    count_sum = Column(BigInteger, default=0)
+
+class VehicleTotal(Base):
+    """All vehicle_logs counts per lane and vehicle type."""
+    __tablename__ = 'vehicle_totals'
+    __table_args__ = (UniqueConstraint('intersection_id', 'lane_id', 'vehicle_type'),)
+    id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, nullable=False)
+    lane_id = Column(Integer, nullable=False)
+    vehicle_type = Column(String(50), nullable=False)
+    count = Column(BigInteger, default=0)
+
 class AmbulanceEvent(Base):
     __tablename__ = 'ambulance_events'
     id = Column(Integer, primary_key=True, index=True)
+    intersection_id = Column(Integer, default=1, index=True)
     lane_id = Column(Integer, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     resolved_at = Column(DateTime, nullable=True)
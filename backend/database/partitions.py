@@ -0,0 +1,217 @@
+"""
+PostgreSQL declarative partitioning of the high-volume tables (lane_stats,
+vehicle_logs): range partitions on timestamp, one per day or week
+(PARTITION_INTERVAL), plus a DEFAULT partition for rows outside them. The
+retention job drops whole expired partitions instead of deleting rows.
+
+    python -m backend.database.partitions            # list partitions
+    python -m backend.database.partitions --convert  # partition tables created before partitioning
+
+Other databases keep plain tables; retention then deletes in chunks.
+"""
+import argparse
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, inspect, text
+
+from backend.config import settings
+from backend.database.models import LaneStats, VehicleLog
+
+PARTITIONED_MODELS = (LaneStats, VehicleLog)
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def enabled(engine, config=settings):
+    return config.PARTITIONING_ENABLED and engine.dialect.name == "postgresql"
+
+
+def period_start(ts, interval="day"):
+    start = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def period_end(start, interval="day"):
+    return start + timedelta(days=7 if interval == "week" else 1)
+
+
+def partitioned_table(table, metadata):
+    """Copy of a model's table partitioned by timestamp; the partition key has to be part of the primary key."""
+    columns = []
+    for column in table.columns:
+        column = column._copy()
+        column.primary_key = False
+        if column.name == "timestamp":
+            column.nullable = False
+        columns.append(column)
+    copy = Table(table.name, metadata, *columns, PrimaryKeyConstraint("id", "timestamp"),
+                 postgresql_partition_by="RANGE (timestamp)")
+    copy.c.id.autoincrement = True
+    return copy
+
+
+def is_partitioned(conn, name):
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+    ), {"name": name}).first() is not None
+
+
+def _bound_value(value):
+    value = value.strip("'")
+    return None if value in ("MINVALUE", "MAXVALUE") else datetime.fromisoformat(value)
+
+
+def list_partitions(conn, name):
+    """[(partition, lower, upper)] of a partitioned table; None bounds are MINVALUE/MAXVALUE, both None for DEFAULT."""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name ORDER BY c.relname"
+    ), {"name": name}).all()
+    partitions = []
+    for child, bound in rows:
+        match = _BOUND.search(bound or "")
+        if match:
+            partitions.append((child, _bound_value(match.group(1)), _bound_value(match.group(2))))
+        else:
+            partitions.append((child, None, None))
+    return partitions
+
+
+def create_tables(engine, config=settings):
+    """
+    Create lane_stats / vehicle_logs partitioned (before metadata.create_all()
+    would create them plain) and make sure partitions exist for the next days.
+    """
+    if not enabled(engine, config):
+        return
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for model in PARTITIONED_MODELS:
+            name = model.__tablename__
+            if name not in existing:
+                partitioned_table(model.__table__, MetaData()).create(conn)
+                conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name}_default PARTITION OF {name} DEFAULT"))
+                print(f"Created partitioned table {name}")
+            elif not is_partitioned(conn, name):
+                print(f"{name} is not partitioned; run python -m backend.database.partitions --convert")
+    now = datetime.utcnow()
+    ensure_partitions(engine, now, now + timedelta(days=config.PARTITION_PREMAKE_DAYS), config)
+
+
+def ensure_partitions(engine, start, end, config=settings):
+    """Create the partitions covering [start, end] that do not exist yet."""
+    if not enabled(engine, config):
+        return
+    interval = config.PARTITION_INTERVAL
+    for model in PARTITIONED_MODELS:
+        name = model.__tablename__
+        with engine.connect() as conn:
+            if not is_partitioned(conn, name):
+                continue
+            ranges = [(lo, hi) for _, lo, hi in list_partitions(conn, name) if lo is not None or hi is not None]
+        lower = period_start(start, interval)
+        while lower <= end:
+            upper = period_end(lower, interval)
+            overlaps = any((lo is None or lo < upper) and (hi is None or hi > lower) for lo, hi in ranges)
+            if not overlaps:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {name}_p{lower:%Y%m%d} PARTITION OF {name} "
+                            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"))
+                except Exception as e:
+                    # Typically rows for this range already sit in the DEFAULT partition
+                    print(f"Partition error ({name} {lower:%Y-%m-%d}): {e}")
+            lower = upper
+
+
+def drop_expired(engine, cutoff, config=settings):
+    """Detach and drop every partition whose whole range is older than cutoff. Returns the dropped names."""
+    if not enabled(engine, config):
+        return []
+    dropped = []
+    for model in PARTITIONED_MODELS:
+        name = model.__tablename__
+        with engine.connect() as conn:
+            if not is_partitioned(conn, name):
+                continue
+            expired = [child for child, _, hi in list_partitions(conn, name) if hi is not None and hi <= cutoff]
+        for child in expired:
+            # One short transaction per partition; writers only touch current partitions
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {name} DETACH PARTITION {child}"))
+                conn.execute(text(f"DROP TABLE {child}"))
+            dropped.append(child)
+    return dropped
+
+
+def convert(engine, model, config=settings):
+    """
+    Turn an existing plain table into a partitioned one without copying rows:
+    the old table is renamed and attached as a partition covering everything
+    up to the end of its last period. Takes a brief exclusive lock.
+    """
+    name = model.__tablename__
+    legacy = f"{name}_legacy"
+    interval = config.PARTITION_INTERVAL
+    inspector = inspect(engine)
+    indexes = [ix["name"] for ix in inspector.get_indexes(name)]
+    pk_name = inspector.get_pk_constraint(name).get("name")
+    with engine.begin() as conn:
+        if is_partitioned(conn, name):
+            print(f"{name} is already partitioned")
+            return
+        conn.execute(text(f"UPDATE {name} SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL"))
+        last, max_id = conn.execute(text(f"SELECT max(timestamp), max(id) FROM {name}")).one()
+        upper = period_end(period_start(last or datetime.utcnow(), interval), interval)
+
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {legacy}"))
+        for index in indexes:
+            conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_legacy"))
+        if pk_name:
+            conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {pk_name} TO {pk_name}_legacy"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {name}_id_seq RENAME TO {legacy}_id_seq"))
+        conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN timestamp SET NOT NULL"))
+
+        partitioned_table(model.__table__, MetaData()).create(conn)
+        conn.execute(text(f"ALTER TABLE {name} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat()}')"))
+        conn.execute(text(f"CREATE TABLE {name}_default PARTITION OF {name} DEFAULT"))
+        if max_id:
+            conn.execute(text(f"SELECT setval('{name}_id_seq', :v)"), {"v": max_id})
+    print(f"Converted {name}: existing rows are partition {legacy} (until {upper:%Y-%m-%d})")
+    now = datetime.utcnow()
+    ensure_partitions(engine, now, now + timedelta(days=config.PARTITION_PREMAKE_DAYS), config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage time partitions of lane_stats and vehicle_logs")
+    parser.add_argument("--convert", action="store_true", help="Partition existing plain tables")
+    args = parser.parse_args()
+
+    from backend.database.database import engine
+    if not enabled(engine):
+        print("Partitioning needs PostgreSQL and PARTITIONING_ENABLED")
+        return
+    if args.convert:
+        existing = set(inspect(engine).get_table_names())
+        for model in PARTITIONED_MODELS:
+            if model.__tablename__ in existing:
+                convert(engine, model)
+        create_tables(engine)
+    with engine.connect() as conn:
+        for model in PARTITIONED_MODELS:
+            name = model.__tablename__
+            if not is_partitioned(conn, name):
+                print(f"{name}: not partitioned")
+                continue
+            for child, lo, hi in list_partitions(conn, name):
+                rows = conn.execute(text(f"SELECT count(*) FROM {child}")).scalar()
+                span = "DEFAULT" if lo is None and hi is None else f"{lo or 'MINVALUE'} .. {hi or 'MAXVALUE'}"
+                print(f"{child:32} {span:45} {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,17 @@ import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.config import settings
-from backend.database.database import engine, SessionLocal
-from backend.database import models
+from backend.database.database import engine, SessionLocal, add_missing_columns
+from backend.database import models, partitions
 from backend.api import router as api_router
-from backend.cv.signal_controller import SignalController
+from backend.utils.intersection_registry import IntersectionRegistry
 from backend.utils.video_processor import VideoProcessor
+from backend.utils.retention import DataRetention
 from passlib.context import CryptContext
 
+partitions.create_tables(engine)  # PostgreSQL: lane_stats / vehicle_logs partitioned by time
 models.Base.metadata.create_all(bind=engine)
+add_missing_columns(models.Base.metadata)
 
 app = FastAPI(title="Traffic Vision AI", version="2.0")
 
@@ -24,8 +27,12 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api")
 
-signal_controller = SignalController(num_lanes=4)
-video_processor = VideoProcessor(settings, signal_controller)
+# Intersections, their cameras and one signal controller each
+registry = IntersectionRegistry()
+registry.load()
+video_processor = VideoProcessor(settings, registry)
+# Enforces data_retention and runs chunked purges in the background
+retention = DataRetention(settings, video_processor.telemetry)
 
 @app.on_event("startup")
 def startup_event():
@@ -48,21 +55,31 @@ def startup_event():
     finally:
         db.close()
 
-    # Start signal controller background thread
+    # Start signal controller background thread (one tick drives every intersection)
     def signal_timer_loop():
         while True:
             time.sleep(1)
             if video_processor:
-                def get_all_counts():
-                    return {i: video_processor.get_lane_count(i) for i in range(4)}
-                signal_controller.update_state(time.time(), get_all_counts, video_processor.traffic_logic)
+                now = time.time()
+                for iid, controller in list(registry.controllers.items()):
+                    def get_lane_counts(iid=iid):
+                        return video_processor.get_intersection_counts(iid)
+                    controller.update_state(now, get_lane_counts, video_processor.traffic_logic)
 
     signal_thread = threading.Thread(target=signal_timer_loop, daemon=True)
     signal_thread.start()
 
+    retention.start()
+
+    # Models otherwise load on first stream start; dashboard-only nodes never load them
+    if settings.PRELOAD_MODELS:
+        warmup_thread = threading.Thread(target=video_processor.load_models, daemon=True)
+        warmup_thread.start()
+
 @app.on_event("shutdown")
 def shutdown_event():
     video_processor.stop()
+    retention.stop()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+
+from backend.cv.ambulance_detector import AmbulanceDetector
+
+BOX = (100, 80, 260, 180)  # Wide enough for OCR
+KEY = (0, 1)
+FPS = 30
+DETECT_EVERY = 10  # Detection ticks run at 3 Hz, light sampling on every frame
+
+
+def vehicle_frame(beacon_on=False):
+    frame = np.full((270, 480, 3), 60, np.uint8)
+    x1, y1, x2, y2 = BOX
+    frame[y1:y2, x1:x2] = (200, 200, 200)
+    if beacon_on:
+        frame[y1 + 5:y1 + 20, x1 + 40:x1 + 80] = (0, 0, 255)
+    return frame
+
+
+def run_frames(detector, count, start, beacon=lambda k: False):
+    """
+    Same order as the processing loop: on detection ticks the ambulance check
+    runs first, then the lights are sampled from the same frame.
+    Returns the last detection tick's verdict and the next timestamp.
+    """
+    result = None
+    for k in range(count):
+        now = start + k / FPS
+        frame = vehicle_frame(beacon(k))
+        if k % DETECT_EVERY == 0:
+            result = detector.check_boxes(frame, [BOX], keys=[KEY], lane=0)
+        detector.sample_lights(0, frame, [{'coords': BOX, 'track_id': KEY[1]}], now)
+    return result, start + count / FPS
+
+
+def set_ocr_verdict(detector, verdict):
+    detector.ocr_verifier.cache[KEY] = (verdict, time.time() + 60)
+
+
+def test_check_boxes_leaves_frame_untouched():
+    detector = AmbulanceDetector(None)
+    set_ocr_verdict(detector, True)
+    detector.sample_lights(0, vehicle_frame(), [{'coords': BOX, 'track_id': KEY[1]}], 0.0)
+    detector.sample_lights(0, vehicle_frame(), [{'coords': BOX, 'track_id': KEY[1]}], 2.0)
+    frame = vehicle_frame()
+    original = frame.copy()
+    has_ambulance, boxes, indices = detector.check_boxes(frame, [BOX], keys=[KEY], lane=0)
+    assert has_ambulance and boxes == [BOX] and indices == [0]
+    assert np.array_equal(frame, original)
+
+
+def test_brief_ocr_positive_does_not_latch_lights():
+    detector = AmbulanceDetector(None)
+    # A vehicle without a beacon gets one OCR positive ...
+    set_ocr_verdict(detector, True)
+    _, now = run_frames(detector, 2 * FPS, 0.0)
+    # ... which OCR later takes back
+    set_ocr_verdict(detector, False)
+    (has_ambulance, _, _), _ = run_frames(detector, 3 * FPS, now)
+    assert not detector.flash_analyzers[0].is_flashing(KEY)
+    assert not has_ambulance
+
+
+def test_flashing_beacon_is_detected():
+    detector = AmbulanceDetector(None, ocr_enabled=False)
+    # 2 Hz beacon: a quarter second on, a quarter second off
+    (has_ambulance, _, _), _ = run_frames(detector, 3 * FPS, 0.0, beacon=lambda k: (k * 4 // FPS) % 2 == 0)
+    assert detector.flash_analyzers[0].is_flashing(KEY)
+    assert has_ambulance
+
+
+def test_steady_light_on_first_tick_is_not_an_ambulance():
+    # The lane's first detection tick runs before any light sample; a lit
+    # tail light must not pass for a beacon just because there is no history
+    detector = AmbulanceDetector(None, ocr_enabled=False)
+    has_ambulance, _, _ = detector.check_boxes(vehicle_frame(beacon_on=True), [BOX], keys=[KEY], lane=0)
+    assert not has_ambulance
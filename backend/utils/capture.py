@@ -0,0 +1,220 @@
+import cv2
+import threading
+import time
+
+NETWORK_PREFIXES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+
+def is_live_source(src):
+    """Camera indices and network URLs are live; anything else is treated as a file."""
+    if isinstance(src, int):
+        return True
+    return isinstance(src, str) and src.lower().startswith(NETWORK_PREFIXES)
+
+
+class CaptureWorker:
+    """
+    Reads one video source on its own thread.
+    Only the newest decoded frame is kept (single slot, drop-oldest), so a
+    stalled or slow camera never blocks the other lanes or the inference loop.
+    Files play in real time by their container timestamps; when the reader
+    falls behind, frames are skipped with grab() instead of being decoded.
+    Frames are decoded into three reused buffers: one may be held by the
+    consumer, one wait in the slot, and the third is free for the next read.
+    """
+    BACKOFF_MIN = 0.5
+    BACKOFF_MAX = 30.0
+    FILE_FPS = 30   # Fallback when a file reports no frame rate
+
+    def __init__(self, lane_id, source):
+        self.lane_id = lane_id
+        self.source = source
+        self.is_live = is_live_source(source)
+        self.cap = None
+
+        self.lock = threading.Lock()
+        self.frame = None
+        self.frame_time = 0.0
+        self.frame_pts = 0.0   # Media time (s) of the newest frame; files only
+        self.seq = 0
+        self.consumed_seq = 0
+        self.consumed_pts = 0.0   # Media time of the frame last returned by read_latest
+        self.frame_read_time = 0.0     # Seconds cap.read() took for the frame in the slot
+        self.consumed_read_time = 0.0  # ... and for the frame last returned by read_latest
+        self.buffers = [None] * 3 # Decode targets, see _free_buffer
+        self.slot_buffer = None   # Buffer index of the frame waiting in the slot
+        self.held_buffer = None   # Buffer index of the frame the consumer took last
+
+        # Counters
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0   # File frames skipped undecoded to stay in real time
+        self.reconnects = 0
+        self.read_ms = 0.0   # EWMA of cap.read() time (decode / network)
+        self.age_ms = 0.0    # Age of the frame handed to the consumer
+
+        self.connected = False
+        self.finished = False
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self._release()
+
+    def read_latest(self):
+        """
+        Returns (frame, seq) for the newest frame not yet consumed,
+        or (None, seq) if nothing new arrived since the last call.
+        """
+        with self.lock:
+            if self.frame is None or self.seq == self.consumed_seq:
+                return None, self.consumed_seq
+            self.consumed_seq = self.seq
+            self.consumed_pts = self.frame_pts
+            self.consumed_read_time = self.frame_read_time
+            # Valid until the next call; the reader never decodes into it meanwhile
+            self.held_buffer = self.slot_buffer
+            self.age_ms = (time.time() - self.frame_time) * 1000
+            frame = self.frame
+            self.frame = None
+            return frame, self.seq
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "source": str(self.source),
+                "live": self.is_live,
+                "connected": self.connected,
+                "finished": self.finished,
+                "frames_read": self.frames_read,
+                "frames_dropped": self.frames_dropped,
+                "frames_skipped": self.frames_skipped,
+                "reconnects": self.reconnects,
+                "media_time": round(self.frame_pts, 3),
+                "read_ms": round(self.read_ms, 2),
+                "age_ms": round(self.age_ms, 2),
+            }
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self._release()
+            return False
+        self.connected = True
+        return True
+
+    def _release(self):
+        if self.cap:
+            self.cap.release()
+        self.cap = None
+        self.connected = False
+
+    def _free_buffer(self):
+        with self.lock:
+            busy = (self.held_buffer, self.slot_buffer if self.frame is not None else None)
+        return next(k for k in range(len(self.buffers)) if k not in busy)
+
+    def _publish(self, frame, read_time, pts=0.0, buffer_index=None):
+        with self.lock:
+            if self.frame is not None:
+                # Previous frame was never picked up by the consumer
+                self.frames_dropped += 1
+            self.frame = frame
+            self.slot_buffer = buffer_index
+            self.frame_time = time.time()
+            self.frame_pts = pts
+            self.frame_read_time = read_time
+            self.seq += 1
+            self.frames_read += 1
+            read_ms = read_time * 1000
+            self.read_ms = read_ms if self.frames_read == 1 else 0.9 * self.read_ms + 0.1 * read_ms
+
+    def _file_fps(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        return fps if 0 < fps <= 240 else self.FILE_FPS
+
+    def _frame_pts(self, index, fps, last_pts):
+        """Presentation time (s) of the frame just grabbed: container timestamp, else index / fps."""
+        pts = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if index > 0 and pts <= last_pts:
+            pts = index / fps   # Container has no usable timestamps
+        return pts
+
+    def _run(self):
+        backoff = self.BACKOFF_MIN
+
+        # File playback clock: frame with media time `pts` is due at
+        # clock_start + (pts - media_start) on the wall clock
+        clock_start = media_start = None
+        index, pts, fps = -1, 0.0, self.FILE_FPS
+
+        while self.running:
+            if self.cap is None:
+                if not self._open():
+                    if not self.is_live:
+                        print(f"Lane {self.lane_id}: Could not open source {self.source}")
+                        self.finished = True
+                        break
+                    print(f"Lane {self.lane_id}: Connect failed, retrying in {backoff:.1f}s")
+                    self._stop_event.wait(backoff)
+                    backoff = min(backoff * 2, self.BACKOFF_MAX)
+                    continue
+                if not self.is_live:
+                    fps = self._file_fps()
+
+            if not self.is_live and clock_start is not None:
+                # Behind schedule by more than a frame: skip up to the media time
+                # due now (fixed up front, so a slow decoder still shows frames)
+                frame_period = 1.0 / fps
+                target = time.time() - clock_start + media_start
+                while pts + 2 * frame_period < target:
+                    if not self.cap.grab():
+                        break
+                    index += 1
+                    pts = self._frame_pts(index, fps, pts)
+                    self.frames_skipped += 1
+
+            start_time = time.time()
+            k = self._free_buffer()
+            # Decodes in place when the buffer matches the stream's frame size
+            ret, frame = self.cap.read(self.buffers[k])
+            read_time = time.time() - start_time
+
+            if not ret:
+                self._release()
+                if not self.is_live:
+                    print(f"Lane {self.lane_id}: Stream ended or disconnected.")
+                    self.finished = True
+                    break
+                self.reconnects += 1
+                print(f"Lane {self.lane_id}: Stream lost, reconnecting in {backoff:.1f}s")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.BACKOFF_MAX)
+                continue
+
+            backoff = self.BACKOFF_MIN
+            self.buffers[k] = frame
+
+            if not self.is_live:
+                index += 1
+                pts = self._frame_pts(index, fps, pts)
+                if clock_start is None:
+                    clock_start, media_start = time.time(), pts
+                # Files decode faster than real time; hold each frame until it is due
+                wait = clock_start + (pts - media_start) - time.time()
+                if wait > 0 and self._stop_event.wait(wait):
+                    break
+
+            self._publish(frame, read_time, pts, k)
@@ -0,0 +1,453 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from backend.cv.vehicle_detector import CLASS_NAMES, DETECTION_DTYPE
+
+# One file per column ("<name>.col", raw little-endian, no header), so a reader
+# can np.memmap any column and slice it without parsing anything.
+FRAME_COLUMNS = {
+    'lane': np.dtype('<i2'),
+    'seq': np.dtype('<i8'),     # Capture sequence number
+    'ts': np.dtype('<f8'),      # Wall-clock time (epoch seconds)
+    'pts': np.dtype('<f8'),     # Media time of the frame (files), else 0
+    'start': np.dtype('<i8'),   # Row of the frame's first detection
+    'count': np.dtype('<i4'),   # Detections in the frame
+}
+DETECTION_COLUMNS = {
+    'box': np.dtype(('<i2', (4,))),   # x1, y1, x2, y2 in working-frame pixels
+    'conf': np.dtype('<f2'),
+    'cls': np.dtype('<i1'),
+    'track': np.dtype('<i4'),         # 0 = unassigned
+    'flags': np.dtype('<u1'),
+}
+FLAG_AMBULANCE = 1
+LOG_VERSION = 1
+
+
+def _column_rows(path, name, dtype):
+    file_path = os.path.join(path, name + '.col')
+    return os.path.getsize(file_path) // dtype.itemsize if os.path.exists(file_path) else 0
+
+
+def _map_column(path, name, dtype, rows):
+    if rows == 0:
+        return np.zeros(0, dtype)
+    return np.memmap(os.path.join(path, name + '.col'), dtype=dtype, mode='r', shape=(rows,))
+
+
+def _consistent_rows(path):
+    """
+    (frames, detections) rows that every column holds completely.
+    Columns are flushed independently, so after a crash the tails may be torn;
+    only frames whose detections all made it to disk count.
+    """
+    frames = min(_column_rows(path, name, dtype) for name, dtype in FRAME_COLUMNS.items())
+    dets = min(_column_rows(path, name, dtype) for name, dtype in DETECTION_COLUMNS.items())
+    if frames:
+        ends = (_map_column(path, 'start', FRAME_COLUMNS['start'], frames)
+                + _map_column(path, 'count', FRAME_COLUMNS['count'], frames))
+        frames = int(np.searchsorted(ends, dets, side='right'))
+        dets = int(ends[frames - 1]) if frames else 0
+    else:
+        dets = 0
+    return frames, dets
+
+
+class DetectionLogWriter:
+    """
+    Append-only columnar log of per-frame detections: lane, frame seq,
+    timestamps, boxes, classes, confidences, track ids and flags.
+    Opening an existing log appends to it (a torn tail from a crash is cut
+    off first); reset=True starts it over.
+    """
+    FLUSH_INTERVAL = 1.0   # Seconds between flushes of the column files
+
+    def __init__(self, path, info=None, reset=False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if reset:
+            for name in list(FRAME_COLUMNS) + list(DETECTION_COLUMNS):
+                file_path = os.path.join(path, name + '.col')
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+        self.frames, self.detections = _consistent_rows(path)
+        self.files = {}
+        for columns, rows in ((FRAME_COLUMNS, self.frames), (DETECTION_COLUMNS, self.detections)):
+            for name, dtype in columns.items():
+                f = open(os.path.join(path, name + '.col'), 'ab')
+                f.truncate(rows * dtype.itemsize)
+                self.files[name] = f
+
+        self.info = dict(info or {})
+        self._write_meta(complete=False)
+        self.last_flush = time.time()
+
+    def _write_meta(self, complete):
+        meta = {
+            'version': LOG_VERSION,
+            'frame_columns': {name: dtype.str for name, dtype in FRAME_COLUMNS.items()},
+            'detection_columns': {name: dtype.base.str for name, dtype in DETECTION_COLUMNS.items()},
+            'complete': complete,
+            'info': self.info,
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def append(self, lane, seq, ts, detections, track_ids=None, flags=None, pts=0.0):
+        """detections: VehicleDetector structured array, in working-frame pixels."""
+        n = len(detections)
+        columns = {
+            'box': detections['box'],
+            'conf': detections['conf'],
+            'cls': detections['cls'],
+            'track': np.zeros(n) if track_ids is None else track_ids,
+            'flags': np.zeros(n) if flags is None else flags,
+        }
+        # Detections before the frame row, so a torn frame never points past them
+        for name, dtype in DETECTION_COLUMNS.items():
+            self.files[name].write(np.asarray(columns[name]).astype(dtype.base).tobytes())
+        row = {'lane': lane, 'seq': seq, 'ts': ts, 'pts': pts, 'start': self.detections, 'count': n}
+        for name, dtype in FRAME_COLUMNS.items():
+            self.files[name].write(np.array(row[name], dtype).tobytes())
+        self.frames += 1
+        self.detections += n
+
+        if ts - self.last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+            self.last_flush = ts
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+
+    def close(self, complete=False):
+        """complete=True marks the log as covering its whole source (see DetectionCache)."""
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self._write_meta(complete)
+
+
+class DetectionLogReader:
+    """
+    Memory-mapped view of a detection log. Only the rows present when it was
+    opened are visible; open a new reader to see later appends.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.frames, self.detections = _consistent_rows(path)
+        self.columns = {}
+        for columns, rows in ((FRAME_COLUMNS, self.frames), (DETECTION_COLUMNS, self.detections)):
+            for name, dtype in columns.items():
+                self.columns[name] = _map_column(path, name, dtype, rows)
+
+    def __len__(self):
+        return self.frames
+
+    @property
+    def complete(self):
+        return bool(self.meta.get('complete'))
+
+    def frame_range(self, start=None, end=None):
+        """Frame rows [lo, hi) with start <= ts < end. Rows are appended in time order."""
+        ts = self.columns['ts']
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+        hi = self.frames if end is None else int(np.searchsorted(ts, end, side='left'))
+        return lo, max(lo, hi)
+
+    def detections_at(self, row):
+        """(VehicleDetector detection array, track ids, flags) of one frame row."""
+        lo = int(self.columns['start'][row])
+        hi = lo + int(self.columns['count'][row])
+        detections = np.zeros(hi - lo, DETECTION_DTYPE)
+        detections['box'] = self.columns['box'][lo:hi]
+        detections['conf'] = self.columns['conf'][lo:hi]
+        detections['cls'] = self.columns['cls'][lo:hi]
+        return detections, np.asarray(self.columns['track'][lo:hi]), np.asarray(self.columns['flags'][lo:hi])
+
+    def rows(self, start=None, end=None, lanes=None):
+        """Frame rows in a time range, optionally only some lanes."""
+        lo, hi = self.frame_range(start, end)
+        rows = np.arange(lo, hi)
+        if lanes is not None:
+            rows = rows[np.isin(self.columns['lane'][lo:hi], list(lanes))]
+        return rows
+
+    def metadata(self, row):
+        """A frame row as the JSON the live /detections stream sends."""
+        detections, tracks, flags = self.detections_at(row)
+        ambulance = (flags & FLAG_AMBULANCE).astype(bool)
+        return json.dumps({
+            'lane': int(self.columns['lane'][row]),
+            'seq': int(self.columns['seq'][row]),
+            'ts': round(float(self.columns['ts'][row]), 3),
+            'size': self.meta['info'].get('frame_size', [480, 270]),
+            'count': len(detections),
+            'ambulance': bool(ambulance.any()),
+            'replay': True,
+            'vehicles': [{
+                'box': box,
+                'type': CLASS_NAMES[cls],
+                'conf': round(conf, 2),
+                'track_id': track or None,
+                'ambulance': amb,
+            } for box, cls, conf, track, amb in zip(
+                detections['box'].tolist(), detections['cls'].tolist(), detections['conf'].tolist(),
+                tracks.tolist(), ambulance.tolist())],
+        }, separators=(',', ':')).encode()
+
+    def recompute_counts(self, start=None, end=None, lanes=None):
+        """
+        Per-lane counts over a time range, straight from the log:
+        frames, mean / max vehicles per frame and unique vehicles per class
+        (tracks seen in at least two frames, like the live tracker's confirmation).
+        """
+        rows = self.rows(start, end, lanes)
+        result = {}
+        frame_lanes = self.columns['lane'][rows]
+        for lane in np.unique(frame_lanes).tolist():
+            lane_rows = rows[frame_lanes == lane]
+            counts = self.columns['count'][lane_rows].astype(np.int64)
+            starts = self.columns['start'][lane_rows]
+
+            # Detection rows of the lane's frames
+            det_idx = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            # A new camera (seq restarting) starts a new tracker, whose ids start over
+            session = np.concatenate([[0], np.cumsum(np.diff(self.columns['seq'][lane_rows]) < 0)])
+            keys = (np.repeat(session, counts) << 32) | self.columns['track'][det_idx].astype(np.int64)
+            tracked = self.columns['track'][det_idx] > 0
+
+            _, first, seen = np.unique(keys[tracked], return_index=True, return_counts=True)
+            confirmed = self.columns['cls'][det_idx][tracked][first[seen >= 2]]
+            per_class = np.bincount(confirmed.astype(np.int64), minlength=max(CLASS_NAMES) + 1)
+            result[lane] = {
+                'frames': len(lane_rows),
+                'mean_count': round(float(counts.mean()), 2),
+                'max_count': int(counts.max()),
+                'vehicles': {name: int(per_class[c]) for c, name in CLASS_NAMES.items() if per_class[c]},
+            }
+        return result
+
+
+class DetectionCache:
+    """
+    Complete detection logs of video files, keyed by a content fingerprint of
+    the file plus everything that changes the detections (model, lane region).
+    When an identical file is submitted again, even under another name, its
+    lane plays the cached detections instead of running inference.
+    Entries are evicted least recently used first (unfinished recordings
+    before that) once the cache grows past max_bytes; entries being read or
+    recorded are never evicted. Eviction runs on a background thread against
+    an in-memory index with a running size total: the tree is scanned once,
+    after that only entries opened or released since the last pass are
+    re-measured.
+    """
+    SAMPLE_BYTES = 1 << 20   # Read from the head and the tail of a file
+    SAMPLE_BLOCKS = 16       # Evenly spaced blocks of BLOCK_BYTES in between
+    BLOCK_BYTES = 64 << 10
+    EVICT_DELAY = 2.0        # Seconds a pass waits, so a burst of opens / closes costs one
+    TRASH_PREFIX = '.evict-'
+
+    def __init__(self, root, max_bytes=0):
+        self.root = root
+        self.max_bytes = max_bytes   # 0 = unlimited
+        self.in_use = Counter()      # Key -> open readers / recorders
+        self._digests = {}   # (path, size, mtime) -> fingerprint
+
+        self.lock = threading.Lock()
+        self.entries = None   # key -> (complete, last_used, size); built by the first pass
+        self.total = 0        # Bytes of all indexed entries
+        self.dirty = set()    # Keys to re-measure on the next pass
+        self._wake = threading.Event()
+        self.thread = None
+
+    def digest(self, path):
+        """
+        sha256 over the size and ~3 MB sampled from the head, tail and evenly
+        spaced blocks of the file: constant time however large the video, and
+        containers keep their index in the head or tail, so re-encoded or
+        edited files differ there.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            size = stat.st_size
+            h = hashlib.sha256(str(size).encode())
+            with open(path, 'rb') as f:
+                if size <= 2 * self.SAMPLE_BYTES + self.SAMPLE_BLOCKS * self.BLOCK_BYTES:
+                    h.update(f.read())
+                else:
+                    h.update(f.read(self.SAMPLE_BYTES))
+                    step = (size - 2 * self.SAMPLE_BYTES) // (self.SAMPLE_BLOCKS + 1)
+                    for i in range(1, self.SAMPLE_BLOCKS + 1):
+                        f.seek(self.SAMPLE_BYTES + i * step)
+                        h.update(f.read(self.BLOCK_BYTES))
+                    f.seek(size - self.SAMPLE_BYTES)
+                    h.update(f.read(self.SAMPLE_BYTES))
+            digest = self._digests[memo_key] = h.hexdigest()
+        return digest
+
+    def key(self, path, fingerprint):
+        """Cache key of a file for a detection configuration (any JSON-serialisable value)."""
+        config = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()[:16]
+        return f"{self.digest(path)}-{config}"
+
+    def lookup(self, key):
+        """Reader over a complete cached log, or None. Call release(key) when done with it."""
+        path = os.path.join(self.root, key)
+        meta = os.path.join(path, 'meta.json')
+        # Claimed before reading, so a concurrent eviction pass leaves it alone
+        with self.lock:
+            self.in_use[key] += 1
+        reader = None
+        try:
+            if os.path.exists(meta):
+                reader = DetectionLogReader(path)
+        except (OSError, ValueError) as e:
+            print(f"Detection cache read error: {e}")
+        if reader is None or not reader.complete:
+            self._unclaim(key)
+            return None
+        os.utime(meta)  # Last use, for eviction after a restart
+        with self.lock:
+            if self.entries is not None and key in self.entries:
+                complete, _, size = self.entries[key]
+                self.entries[key] = (complete, time.time(), size)
+        return reader
+
+    def recorder(self, key, info=None):
+        """
+        Writer for a new cache entry; close(complete=True) once the whole file
+        was played, then release(key).
+        """
+        with self.lock:
+            self.in_use[key] += 1
+        try:
+            writer = DetectionLogWriter(os.path.join(self.root, key), info=info, reset=True)
+        except OSError:
+            self._unclaim(key)
+            raise
+        self._schedule(key)
+        return writer
+
+    def release(self, key):
+        self._unclaim(key)
+        self._schedule(key)
+
+    def _unclaim(self, key):
+        with self.lock:
+            self.in_use[key] -= 1
+            if self.in_use[key] <= 0:
+                del self.in_use[key]
+
+    def _schedule(self, key):
+        """Re-measure key and evict on the background thread; returns immediately."""
+        if not self.max_bytes:
+            return
+        with self.lock:
+            self.dirty.add(key)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.EVICT_DELAY)
+            self._wake.clear()
+            try:
+                self.evict()
+            except OSError as e:
+                print(f"Detection cache eviction error: {e}")
+
+    def _measure(self, key):
+        """(complete, last_used, size) of an entry on disk, or None if it is gone."""
+        path = os.path.join(self.root, key)
+        if not os.path.isdir(path):
+            return None
+        size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                complete = bool(json.load(f).get('complete'))
+            last_used = os.path.getmtime(os.path.join(path, 'meta.json'))
+        except (OSError, ValueError):
+            complete, last_used = False, 0.0  # Torn entry: goes first
+        return complete, last_used, size
+
+    def evict(self):
+        """
+        Delete entries not in use until the cache fits in max_bytes. Runs on
+        the eviction thread; the first pass indexes the whole cache, later
+        ones only re-measure the entries touched since.
+        """
+        if not self.max_bytes or not os.path.isdir(self.root):
+            return
+        with self.lock:
+            keys, self.dirty = self.dirty, set()
+            full = self.entries is None
+        if full:
+            keys = set()
+            for name in os.listdir(self.root):
+                if name.startswith(self.TRASH_PREFIX):
+                    # Left over from a pass that was interrupted
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                else:
+                    keys.add(name)
+        measured = {key: self._measure(key) for key in keys}
+
+        victims = []
+        with self.lock:
+            if full:
+                self.entries, self.total = {}, 0
+            for key, entry in measured.items():
+                old = self.entries.pop(key, None)
+                self.total -= old[2] if old else 0
+                if entry is not None:
+                    self.entries[key] = entry
+                    self.total += entry[2]
+            for key, (complete, last_used, size) in sorted(self.entries.items(), key=lambda item: item[1]):
+                if self.total <= self.max_bytes:
+                    break
+                if self.in_use[key]:
+                    continue
+                # Renamed under the lock, so lookup() / recorder() never see a half-deleted entry
+                trash = os.path.join(self.root, self.TRASH_PREFIX + key)
+                try:
+                    os.rename(os.path.join(self.root, key), trash)
+                except OSError:
+                    continue
+                del self.entries[key]
+                self.total -= size
+                victims.append((key, trash, size))
+
+        for key, trash, size in victims:
+            shutil.rmtree(trash, ignore_errors=True)
+            print(f"Detection cache: evicted {key} ({size / 1e6:.1f} MB)")
+
+
+class CachedLane:
+    """Plays a cached log back against a file's media time, one record per detection tick."""
+    def __init__(self, reader):
+        self.reader = reader
+        self.pts = np.asarray(reader.columns['pts'])
+        self.next_row = 0
+
+    def due(self, pts):
+        """Detections recorded at or before this media time that were not played yet, or None."""
+        row = int(np.searchsorted(self.pts, pts, side='right')) - 1
+        if row < self.next_row:
+            return None
+        self.next_row = row + 1
+        return self.reader.detections_at(row)[0]
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+
+class FrameHub:
+    """
+    Encode-once, fan-out distribution of encoded lane frames.
+    The processing thread publishes each JPEG once with a sequence number;
+    any number of asyncio subscribers await the next version, so viewers
+    never receive the same frame twice and cost no extra encoding.
+    """
+    SNAPSHOT_HOLD = 5.0  # Keep encoding this long after a snapshot request
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = {}        # lane -> (seq, JPEG bytes)
+        self.subscribers = {}   # lane -> active stream count
+        self.snapshot_until = {}
+        self.waiters = {}       # lane -> asyncio.Future resolved on next publish
+        self.loop = None
+
+    # ---- producer side (processing thread) ----
+
+    def wants_frame(self, lane):
+        """False when nobody is watching the lane, so encoding can be skipped."""
+        with self.lock:
+            return self.subscribers.get(lane, 0) > 0 or self.snapshot_until.get(lane, 0) > time.time()
+
+    def publish(self, lane, data):
+        with self.lock:
+            seq = self.frames.get(lane, (0, None))[0] + 1
+            self.frames[lane] = (seq, data)
+            loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake, lane)
+        return seq
+
+    def clear(self):
+        """Drop the stored payloads. Seq counters survive so connected subscribers keep receiving."""
+        with self.lock:
+            self.frames = {lane: (seq, None) for lane, (seq, _) in self.frames.items()}
+
+    # ---- consumer side (event loop) ----
+
+    def _wake(self, lane):
+        fut = self.waiters.pop(lane, None)
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    def latest(self, lane):
+        with self.lock:
+            return self.frames.get(lane, (0, None))
+
+    def request_snapshot(self, lane):
+        with self.lock:
+            self.snapshot_until[lane] = time.time() + self.SNAPSHOT_HOLD
+
+    async def next_frame(self, lane, after_seq, timeout=1.0):
+        """Wait for a frame newer than after_seq. Returns (seq, data), or (after_seq, None) on timeout."""
+        self.loop = asyncio.get_running_loop()
+        seq, data = self.latest(lane)
+        if seq > after_seq and data is not None:
+            return seq, data
+
+        fut = self.waiters.get(lane)
+        if fut is None or fut.done():
+            fut = self.loop.create_future()
+            self.waiters[lane] = fut
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            return after_seq, None
+
+        seq, data = self.latest(lane)
+        if seq > after_seq and data is not None:
+            return seq, data
+        return after_seq, None
+
+    async def subscribe(self, lane, is_active, idle_timeout=30.0):
+        """Async generator of new frames for one viewer."""
+        with self.lock:
+            self.subscribers[lane] = self.subscribers.get(lane, 0) + 1
+        try:
+            last_seq = 0
+            idle = 0.0
+            while is_active():
+                seq, data = await self.next_frame(lane, last_seq)
+                if data is None:
+                    idle += 1.0
+                    if idle > idle_timeout:
+                        break
+                    continue
+                idle = 0.0
+                last_seq = seq
+                yield data
+        finally:
+            with self.lock:
+                self.subscribers[lane] -= 1
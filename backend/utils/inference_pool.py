@@ -0,0 +1,167 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _worker_main(worker_id, model_path, model_name, ring_names, frame_shape, slots, task_queue, result_queue):
+    """
+    Entry point of an inference worker process.
+    Frames are read straight out of the shared-memory rings; only the small
+    (lane, slot, seq) tasks and the detection results cross the queues.
+    """
+    from backend.cv.vehicle_detector import VehicleDetector
+
+    detector = VehicleDetector(model_path, model_name=model_name)
+    detector.warmup(frame_shape)
+    rings = {}
+    for lane, name in ring_names.items():
+        shm = shared_memory.SharedMemory(name=name)
+        rings[lane] = (shm, np.ndarray((slots,) + frame_shape, dtype=np.uint8, buffer=shm.buf))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        try:
+            frames = [rings[lane][1][slot] for lane, slot, _ in task]
+            batch = detector.detect_batch(frames)
+            result_queue.put([
+                (lane, slot, seq, counts, total, vehicle_boxes)
+                for (lane, slot, seq), (_, counts, total, vehicle_boxes) in zip(task, batch)
+            ])
+        except Exception as e:
+            print(f"Inference worker {worker_id} error: {e}")
+            result_queue.put([(lane, slot, seq, None, 0, []) for lane, slot, seq in task])
+
+    for shm, _ in rings.values():
+        shm.close()
+
+
+class InferencePool:
+    """
+    Runs vehicle detection in N worker processes.
+    Each lane owns a preallocated shared-memory ring of frame slots; the
+    processing loop copies a frame into the next slot and only the slot
+    index is sent to the worker that the lane is assigned to.
+    """
+    RESULT_TIMEOUT = 5.0
+
+    def __init__(self, config, num_lanes, frame_shape, model_name=None):
+        self.num_lanes = num_lanes
+        self.model_name = model_name
+        self.frame_shape = tuple(frame_shape)
+        self.num_workers = max(1, config.INFERENCE_WORKERS)
+        self.slots = max(2, config.INFERENCE_RING_SLOTS)
+
+        assignment = list(config.INFERENCE_LANE_ASSIGNMENT)
+        self.lane_worker = [
+            assignment[i] % self.num_workers if i < len(assignment) else i % self.num_workers
+            for i in range(num_lanes)
+        ]
+
+        frame_bytes = int(np.prod(self.frame_shape))
+        self.rings = []
+        for _ in range(num_lanes):
+            shm = shared_memory.SharedMemory(create=True, size=frame_bytes * self.slots)
+            buf = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=shm.buf)
+            self.rings.append((shm, buf))
+
+        self.seq = [0] * num_lanes
+        self.in_flight = {}  # lane -> submit time
+        self.frame_info = {}  # lane -> (frame seq, pts) of the frame in flight
+        self.discarded = {}  # lane -> seq whose result must not be used
+
+        ctx = mp.get_context("spawn")
+        self.result_queue = ctx.Queue()
+        self.task_queues = []
+        self.workers = []
+        for w in range(self.num_workers):
+            ring_names = {lane: self.rings[lane][0].name for lane in range(num_lanes) if self.lane_worker[lane] == w}
+            task_queue = ctx.Queue()
+            proc = ctx.Process(
+                target=_worker_main,
+                args=(w, config.MODEL_VEHICLE_PATH, model_name, ring_names, self.frame_shape, self.slots, task_queue, self.result_queue),
+                daemon=True,
+            )
+            proc.start()
+            self.task_queues.append(task_queue)
+            self.workers.append(proc)
+
+    def submit(self, frames):
+        """
+        frames: {lane: (frame, frame_seq, pts)} for lanes due for detection;
+        frame_seq and pts identify the capture frame and come back with its result.
+        Lanes that still have a request in flight are skipped.
+        """
+        tasks = [[] for _ in range(self.num_workers)]
+        for lane, (frame, frame_seq, pts) in frames.items():
+            if lane in self.in_flight:
+                continue
+            self.seq[lane] += 1
+            slot = self.seq[lane] % self.slots
+            np.copyto(self.rings[lane][1][slot], frame)
+            tasks[self.lane_worker[lane]].append((lane, slot, self.seq[lane]))
+            self.in_flight[lane] = time.time()
+            self.frame_info[lane] = (frame_seq, pts)
+
+        for w, task in enumerate(tasks):
+            if task:
+                self.task_queues[w].put(task)
+
+    def busy(self, lane):
+        """True while the lane waits for an answer; submit() would skip it."""
+        return lane in self.in_flight
+
+    def discard(self, lane):
+        """Drop the answer to the lane's in-flight request (e.g. its camera was replaced)."""
+        if lane in self.in_flight:
+            self.discarded[lane] = self.seq[lane]
+
+    def collect(self):
+        """
+        Non-blocking. Returns {lane: (frame, counts, total, vehicle_boxes, frame_seq, pts)}
+        for every result that arrived since the last call; frame is the ring slot
+        the detection ran on and frame_seq / pts are what submit() was given for it.
+        """
+        detections = {}
+        while True:
+            try:
+                results = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            for lane, slot, seq, counts, total, vehicle_boxes in results:
+                if seq != self.seq[lane]:
+                    continue  # Late answer to a request that already timed out
+                self.in_flight.pop(lane, None)
+                frame_seq, pts = self.frame_info.pop(lane, (None, None))
+                if self.discarded.pop(lane, None) == seq:
+                    continue
+                if counts is not None:
+                    detections[lane] = (self.rings[lane][1][slot], counts, total, vehicle_boxes, frame_seq, pts)
+
+        now = time.time()
+        for lane, submitted in list(self.in_flight.items()):
+            if now - submitted > self.RESULT_TIMEOUT:
+                print(f"Lane {lane}: inference worker timed out")
+                self.in_flight.pop(lane, None)
+                self.frame_info.pop(lane, None)
+                self.discarded.pop(lane, None)
+
+        return detections
+
+    def close(self):
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for proc in self.workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for shm, _ in self.rings:
+            shm.close()
+            shm.unlink()
+        self.rings = []
+        self.workers = []
+        self.task_queues = []
@@ -0,0 +1,105 @@
+import threading
+
+from backend.cv.signal_controller import SignalController
+from backend.database.database import SessionLocal
+from backend.database.models import Camera, Intersection
+
+DEFAULT_INTERSECTION = {"id": 1, "name": "Main Intersection", "num_lanes": 4}
+
+
+def parse_source(value):
+    """Camera source as stored/submitted -> what CaptureWorker expects (device index, URL/path or None)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    return int(value) if value.isdigit() else value
+
+
+class IntersectionRegistry:
+    """
+    Intersections and their cameras, as configured in the database.
+    Every lane of every intersection gets a global slot in the VideoProcessor
+    (slots are assigned in intersection id order, so the default intersection
+    keeps slots 0-3); each intersection has its own SignalController over its
+    own lanes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.intersections = {}   # id -> {'id', 'name', 'latitude', 'longitude', 'num_lanes'}
+        self.controllers = {}     # id -> SignalController
+        self.lane_map = []        # slot -> (intersection_id, lane_index)
+        self.sources = []         # slot -> camera source or None
+
+    def load(self):
+        """(Re)read the registry. Controllers survive a reload unless their lane count changed."""
+        db = SessionLocal()
+        try:
+            if not db.query(Intersection).count():
+                db.add(Intersection(**DEFAULT_INTERSECTION))
+                db.commit()
+            rows = db.query(Intersection).order_by(Intersection.id).all()
+            intersections = {r.id: {
+                "id": r.id, "name": r.name, "latitude": r.latitude,
+                "longitude": r.longitude, "num_lanes": r.num_lanes or 0,
+            } for r in rows}
+            cameras = {(c.intersection_id, c.lane_index): c.source for c in db.query(Camera).all()}
+        finally:
+            db.close()
+
+        lane_map, sources = [], []
+        for iid, info in intersections.items():
+            for lane in range(info["num_lanes"]):
+                lane_map.append((iid, lane))
+                sources.append(parse_source(cameras.get((iid, lane))))
+
+        with self.lock:
+            controllers = {}
+            for iid, info in intersections.items():
+                controller = self.controllers.get(iid)
+                if controller is None or controller.num_lanes != info["num_lanes"]:
+                    controller = SignalController(num_lanes=info["num_lanes"])
+                controllers[iid] = controller
+            self.intersections = intersections
+            self.controllers = controllers
+            self.lane_map = lane_map
+            self.sources = sources
+
+    @property
+    def default_id(self):
+        return next(iter(self.intersections), DEFAULT_INTERSECTION["id"])
+
+    def slot(self, intersection_id, lane_index):
+        """Global lane slot of an intersection's lane, or None."""
+        try:
+            return self.lane_map.index((intersection_id, lane_index))
+        except ValueError:
+            return None
+
+    def slots(self, intersection_id):
+        """Global slots of an intersection's lanes, in lane order."""
+        return [slot for slot, (iid, _) in enumerate(self.lane_map) if iid == intersection_id]
+
+    def controller(self, intersection_id=None):
+        return self.controllers.get(self.default_id if intersection_id is None else intersection_id)
+
+    def set_cameras(self, intersection_id, sources):
+        """
+        Store camera sources for an intersection's lanes (None / "" clears a lane).
+        sources: one per lane, or {lane_index: source} to change only some lanes.
+        """
+        db = SessionLocal()
+        try:
+            existing = {c.lane_index: c for c in db.query(Camera).filter(Camera.intersection_id == intersection_id)}
+            for lane, source in (sources.items() if isinstance(sources, dict) else enumerate(sources)):
+                source = None if source is None else str(source).strip() or None
+                camera = existing.get(lane)
+                if camera:
+                    camera.source = source
+                else:
+                    db.add(Camera(intersection_id=intersection_id, lane_index=lane, source=source))
+            db.commit()
+        finally:
+            db.close()
+        self.load()
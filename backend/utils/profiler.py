@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear (HDR-style) histogram of latencies in microseconds.
+    Values below 2**SUB_BUCKET_BITS us are exact; above that every power of
+    two is split into 2**(SUB_BUCKET_BITS - 1) buckets, so any recorded value
+    is reported within ~3% and memory does not grow with the sample count.
+    """
+    SUB_BUCKET_BITS = 6
+    MAX_US = 1 << 27   # ~134 s; larger values land in the last bucket
+
+    def __init__(self):
+        bits = self.SUB_BUCKET_BITS
+        self.half = 1 << (bits - 1)
+        self.size = self._index(self.MAX_US) + 1
+        self.counts = [0] * self.size
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def _index(self, us):
+        bits = self.SUB_BUCKET_BITS
+        if us < (1 << bits):
+            return us
+        shift = us.bit_length() - bits
+        return (1 << bits) + (shift - 1) * self.half + ((us >> shift) - self.half)
+
+    def _value(self, index):
+        """Midpoint of a bucket, in microseconds."""
+        bits = self.SUB_BUCKET_BITS
+        if index < (1 << bits):
+            return float(index)
+        shift, sub = divmod(index - (1 << bits), self.half)
+        shift += 1
+        return float(((sub + self.half) << shift) + (1 << shift) / 2)
+
+    def record(self, seconds):
+        us = min(max(int(seconds * 1e6), 0), self.MAX_US)
+        self.counts[self._index(us)] += 1
+        self.total += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def percentile(self, p):
+        """Latency (us) at percentile p (0-100)."""
+        if not self.total:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, self.total * p / 100.0, side='left'))
+        return min(self._value(index), float(self.max_us))
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_us / self.total / 1000, 3) if self.total else 0.0,
+            "p50_ms": round(self.percentile(50) / 1000, 3),
+            "p95_ms": round(self.percentile(95) / 1000, 3),
+            "p99_ms": round(self.percentile(99) / 1000, 3),
+            "max_ms": round(self.max_us / 1000, 3),
+        }
+
+
+class PipelineProfiler:
+    """
+    Per-lane, per-stage latency histograms for the processing loop.
+    Callers check `enabled` once per tick and only then take timestamps, so
+    a disabled profiler costs one attribute read per tick. Stages recorded
+    outside a lane (the whole tick, the batched forward pass) use lane None.
+    """
+    FPS_WINDOW = 10.0   # Seconds of frame timestamps behind the FPS figure
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}   # (lane, stage) -> LatencyHistogram
+        self.frame_times = {}  # lane -> deque of processed-frame timestamps
+        self.since = time.time()
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.frame_times = {}
+            self.since = time.time()
+
+    def record(self, lane, stage, seconds):
+        with self.lock:
+            hist = self.histograms.get((lane, stage))
+            if hist is None:
+                hist = self.histograms[(lane, stage)] = LatencyHistogram()
+            hist.record(seconds)
+
+    def lap(self, lane, stage, start):
+        """Record the perf_counter time since start; returns now, the start of the next stage."""
+        now = time.perf_counter()
+        self.record(lane, stage, now - start)
+        return now
+
+    def frame_done(self, lane, now):
+        with self.lock:
+            times = self.frame_times.get(lane)
+            if times is None:
+                times = self.frame_times[lane] = deque()
+            times.append(now)
+            while times[0] < now - self.FPS_WINDOW:
+                times.popleft()
+
+    def _fps(self, times, now):
+        if len(times) < 2 or times[-1] < now - self.FPS_WINDOW:
+            return 0.0
+        return round((len(times) - 1) / max(times[-1] - times[0], 1e-6), 2)
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            lanes = {}
+            for (lane, stage), hist in self.histograms.items():
+                key = "pipeline" if lane is None else lane
+                lanes.setdefault(key, {"stages": {}})["stages"][stage] = hist.summary()
+            for lane, times in self.frame_times.items():
+                lanes.setdefault(lane, {"stages": {}})["fps"] = self._fps(times, now)
+            return {"enabled": self.enabled, "since": self.since, "lanes": lanes}
@@ -0,0 +1,306 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from backend.config import load_system_settings
+from backend.database import partitions
+from backend.database.database import SessionLocal, engine
+from backend.database.models import (
+    AuditLog, LaneStats, VehicleLog, LaneStatsRollup, VehicleRollup, LaneHourProfile, VehicleTotal
+)
+from backend.utils.rollups import bucket_start, upsert
+
+# Raw tables and the minute rollups are deleted by age; the order is the order of a purge
+AGED_TABLES = (
+    (LaneStats, LaneStats.timestamp),
+    (VehicleLog, VehicleLog.timestamp),
+    (LaneStatsRollup, LaneStatsRollup.bucket),
+    (VehicleRollup, VehicleRollup.bucket),
+)
+
+
+def retention_cutoff(setting, now=None):
+    """Oldest timestamp kept for a data_retention value ("7_days", "30_days", "forever"), on an hour boundary."""
+    if not setting or setting == "forever":
+        return None
+    try:
+        days = int(str(setting).split("_")[0])
+    except ValueError:
+        print(f"Unknown data_retention value: {setting}")
+        return None
+    return bucket_start((now or datetime.utcnow()) - timedelta(days=days), "hour")
+
+
+class DataRetention:
+    """
+    Background lifecycle of lane_stats / vehicle_logs and their rollups.
+    A thread enforces the data_retention setting every RETENTION_CHECK_INTERVAL
+    (pre-creating partitions, dropping expired ones, then deleting leftover
+    expired rows); purges requested through the API run on their own thread.
+    Both delete in chunks of PURGE_CHUNK_ROWS, one short transaction each, and
+    report progress via status(). The telemetry writer is paused for the
+    length of a pass, so rows it still holds cannot reappear behind a purge.
+    """
+    def __init__(self, config, telemetry=None):
+        self.config = config
+        self.telemetry = telemetry   # TelemetryWriter to pause while deleting, optional
+        self.lock = threading.Lock()       # Guards job
+        self.work_lock = threading.Lock()  # One purge / retention pass at a time
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.job = None        # Progress of the current or last purge / retention pass
+        self.job_counter = 0
+        self.last_check = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def wake(self):
+        """Enforce retention now (e.g. after data_retention was changed)."""
+        self.wake_event.set()
+
+    def status(self):
+        with self.lock:
+            job = dict(self.job) if self.job else None
+            if job:
+                job["tables"] = {name: dict(t) for name, t in job["tables"].items()}
+        return {"job": job, "last_retention_check": self.last_check}
+
+    def start_purge(self, before=None, user_id=None):
+        """
+        Start a background purge of everything older than before (all data when None).
+        Returns the new job, or None while another purge or retention pass is running.
+        """
+        if not self.work_lock.acquire(blocking=False):
+            return None
+        job = self._new_job("purge", before)
+        threading.Thread(target=self._purge_job, args=(job, user_id), daemon=True).start()
+        return job
+
+    def _new_job(self, kind, before):
+        with self.lock:
+            self.job_counter += 1
+            self.job = {
+                "id": self.job_counter, "kind": kind, "state": "pending",
+                "before": before.isoformat() if before else None,
+                "started_at": datetime.utcnow().isoformat(), "finished_at": None,
+                "partitions_dropped": [], "tables": {}, "deleted": 0, "total": 0,
+                "progress": 0.0, "error": None,
+            }
+            return self.job
+
+    def _update(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+            if job["total"]:
+                job["progress"] = round(min(job["deleted"] / job["total"], 1.0), 4)
+
+    def _purge_job(self, job, user_id):
+        """Runs holding work_lock, taken by start_purge."""
+        try:
+            self._execute(job, _parse_before(job["before"]))
+        finally:
+            self.work_lock.release()
+        if job["state"] == "done":
+            before = f" older than {job['before']}" if job["before"] else ""
+            details = ", ".join(f"{t['deleted']} {name}" for name, t in job["tables"].items() if t["deleted"])
+            self._audit("data_purge", f"Purged{before}: {details or 'nothing'}", user_id)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.enforce()
+            self.wake_event.wait(self.config.RETENTION_CHECK_INTERVAL)
+            self.wake_event.clear()
+
+    def enforce(self):
+        """One retention pass; skipped while a purge is running."""
+        self.last_check = datetime.utcnow().isoformat()
+        try:
+            now = datetime.utcnow()
+            partitions.ensure_partitions(engine, now, now + timedelta(days=self.config.PARTITION_PREMAKE_DAYS),
+                                         self.config)
+        except Exception as e:
+            print(f"Partition error: {e}")
+        cutoff = retention_cutoff(load_system_settings().get("data_retention"))
+        if cutoff is None or not self.work_lock.acquire(blocking=False):
+            return
+        try:
+            job = self._new_job("retention", cutoff)
+            self._execute(job, cutoff)
+        finally:
+            self.work_lock.release()
+        if job["state"] == "done" and (job["deleted"] or job["partitions_dropped"]):
+            self._audit("data_retention", f"Removed data older than {cutoff.isoformat()}: "
+                        f"{len(job['partitions_dropped'])} partitions dropped, {job['deleted']} rows deleted")
+
+    def _execute(self, job, before):
+        if self.telemetry is None:
+            self._delete_all(job, before)
+            return
+        # A full purge removes everything up to now, pending telemetry rows included
+        with self.telemetry.paused(before or datetime.utcnow()):
+            self._delete_all(job, before)
+
+    def _delete_all(self, job, before):
+        self._update(job, state="running")
+        try:
+            if before is not None:
+                self._update(job, partitions_dropped=partitions.drop_expired(engine, before, self.config))
+            self._count(job, before)
+            for model, column in AGED_TABLES:
+                self._delete_rows(job, model, column, before)
+                if self.stop_event.is_set():
+                    self._update(job, state="cancelled", finished_at=datetime.utcnow().isoformat())
+                    return
+            self._expire_hour_rollups(job, before)
+            self._update(job, state="done", finished_at=datetime.utcnow().isoformat())
+        except Exception as e:
+            print(f"Purge error: {e}")
+            self._update(job, state="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+
+    def _count(self, job, before):
+        tables = {}
+        db = SessionLocal()
+        try:
+            for model, column in AGED_TABLES:
+                query = db.query(func.count(model.id))
+                if model in (LaneStatsRollup, VehicleRollup):
+                    query = query.filter(model.resolution != "hour")  # Counted below
+                if before is not None:
+                    query = query.filter(column < _aligned(model, before))
+                tables[model.__tablename__] = {"total": int(query.scalar() or 0), "deleted": 0}
+            for model in (LaneStatsRollup, VehicleRollup):
+                query = db.query(func.count(model.id)).filter(model.resolution == "hour")
+                if before is not None:
+                    query = query.filter(model.bucket < bucket_start(before, "hour"))
+                tables[f"{model.__tablename__}_hour"] = {"total": int(query.scalar() or 0), "deleted": 0}
+        finally:
+            db.close()
+        self._update(job, tables=tables, total=sum(t["total"] for t in tables.values()))
+
+    def _progress(self, job, name, deleted):
+        with self.lock:
+            job["tables"][name]["deleted"] += deleted
+            job["deleted"] += deleted
+            if job["total"]:
+                job["progress"] = round(min(job["deleted"] / job["total"], 1.0), 4)
+
+    def _delete_rows(self, job, model, column, before):
+        """Delete rows older than before in bounded transactions (hour rollups are left to _expire_hour_rollups)."""
+        condition = [column < _aligned(model, before)] if before is not None else []
+        if model in (LaneStatsRollup, VehicleRollup):
+            condition.append(model.resolution != "hour")
+        while not self.stop_event.is_set():
+            ids = select(model.id).where(*condition).limit(self.config.PURGE_CHUNK_ROWS)
+            db = SessionLocal()
+            try:
+                deleted = db.execute(delete(model).where(model.id.in_(ids), *condition)
+                                     .execution_options(synchronize_session=False)).rowcount
+                db.commit()
+            finally:
+                db.close()
+            self._progress(job, model.__tablename__, deleted)
+            if deleted < self.config.PURGE_CHUNK_ROWS:
+                return
+            time.sleep(self.config.PURGE_CHUNK_PAUSE)
+
+    def _expire_hour_rollups(self, job, before):
+        """
+        Remove hour rollups that end before `before` (rounded down to the hour:
+        a partly purged hour is kept whole), taking their counts back out of
+        the all-time profile and totals in the same transaction so those keep
+        describing only the data still stored. A full purge just clears them.
+        """
+        for model, profile in ((LaneStatsRollup, LaneHourProfile), (VehicleRollup, VehicleTotal)):
+            name = f"{model.__tablename__}_hour"
+            condition = [model.resolution == "hour"]
+            if before is not None:
+                condition.append(model.bucket < bucket_start(before, "hour"))
+            while not self.stop_event.is_set():
+                db = SessionLocal()
+                try:
+                    rows = db.query(model).filter(*condition).limit(self.config.PURGE_CHUNK_ROWS).all()
+                    if rows and before is not None:
+                        upsert(db, profile, _negated(model, rows))
+                    if rows:
+                        db.execute(delete(model).where(model.id.in_([r.id for r in rows]))
+                                   .execution_options(synchronize_session=False))
+                    db.commit()
+                finally:
+                    db.close()
+                self._progress(job, name, len(rows))
+                if len(rows) < self.config.PURGE_CHUNK_ROWS:
+                    break
+                time.sleep(self.config.PURGE_CHUNK_PAUSE)
+
+        db = SessionLocal()
+        try:
+            if before is None:
+                db.query(LaneHourProfile).delete()
+                db.query(VehicleTotal).delete()
+            else:
+                db.query(LaneHourProfile).filter(LaneHourProfile.samples <= 0).delete()
+                db.query(VehicleTotal).filter(VehicleTotal.count <= 0).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def _audit(self, action, details, user_id=None):
+        db = SessionLocal()
+        try:
+            db.add(AuditLog(action=action, details=details, user_id=user_id))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Audit log error: {e}")
+        finally:
+            db.close()
+
+
+def _negated(model, rows):
+    """Hour rollup rows as negative deltas for the hour-of-day profile / vehicle totals."""
+    deltas = {}
+    for r in rows:
+        if model is LaneStatsRollup:
+            key = (r.intersection_id, r.lane_id, r.bucket.hour)
+            d = deltas.setdefault(key, [0, 0])
+            d[0] -= r.samples or 0
+            d[1] -= r.count_sum or 0
+        else:
+            key = (r.intersection_id, r.lane_id, r.vehicle_type)
+            d = deltas.setdefault(key, [0])
+            d[0] -= r.count or 0
+    if model is LaneStatsRollup:
+        return [{"intersection_id": iid, "lane_id": lane_id, "hour": hour, "samples": n, "count_sum": c}
+                for (iid, lane_id, hour), (n, c) in deltas.items()]
+    return [{"intersection_id": iid, "lane_id": lane_id, "vehicle_type": v_type, "count": n}
+            for (iid, lane_id, v_type), (n,) in deltas.items()]
+
+
+def _aligned(model, before):
+    """
+    Cutoff for a table's rows: raw rows are cut exactly, minute rollups only
+    once their whole minute is older than before (hour rollups: see
+    _expire_hour_rollups).
+    """
+    if model in (LaneStatsRollup, VehicleRollup):
+        return bucket_start(before, "minute")
+    return before
+
+
+def _parse_before(value):
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,171 @@
+"""
+Minute / hour rollups of lane_stats and vehicle_logs, plus the all-time
+hour-of-day profile and per-type vehicle totals the analytics endpoints read.
+
+Every writer of raw rows calls apply_rollups() in the same transaction, so
+rollups never drift from the raw tables. Existing data is rolled up with:
+
+    python -m backend.utils.rollups                 # rebuild everything
+    python -m backend.utils.rollups --chunk-hours 6 # less raw history in memory at once
+
+Rebuild while video processing is stopped: it replaces the rollup tables in
+one transaction.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from sqlalchemy import case, func
+
+from backend.database.models import (
+    LaneStats, VehicleLog, LaneStatsRollup, VehicleRollup, LaneHourProfile, VehicleTotal
+)
+
+RESOLUTIONS = ("minute", "hour")
+ROLLUP_MODELS = (LaneStatsRollup, VehicleRollup, LaneHourProfile, VehicleTotal)
+
+
+def bucket_start(ts, resolution):
+    if resolution == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate(stats_rows, vehicle_rows):
+    """
+    Fold raw rows (dicts with LaneStats / VehicleLog columns) into per-table
+    rollup rows: {model: [row dict, ...]}. Counts are deltas to add.
+    """
+    lanes, profile, vehicles, totals = {}, {}, {}, {}
+    for r in stats_rows:
+        ts = r["timestamp"]
+        if ts is None:
+            continue
+        iid, lane_id, count = r["intersection_id"] or 1, r["lane_id"], r["vehicle_count"] or 0
+        for resolution in RESOLUTIONS:
+            agg = lanes.setdefault((resolution, iid, lane_id, bucket_start(ts, resolution)), [0, 0, 0])
+            agg[0] += 1
+            agg[1] += count
+            agg[2] = max(agg[2], count)
+        agg = profile.setdefault((iid, lane_id, ts.hour), [0, 0])
+        agg[0] += 1
+        agg[1] += count
+    for r in vehicle_rows:
+        ts = r["timestamp"]
+        if ts is None:
+            continue
+        iid, lane_id, v_type, count = r["intersection_id"] or 1, r["lane_id"], r["vehicle_type"], r["count"] or 0
+        for resolution in RESOLUTIONS:
+            key = (resolution, iid, lane_id, bucket_start(ts, resolution), v_type)
+            vehicles[key] = vehicles.get(key, 0) + count
+        totals[(iid, lane_id, v_type)] = totals.get((iid, lane_id, v_type), 0) + count
+
+    return {
+        LaneStatsRollup: [{"resolution": res, "intersection_id": iid, "lane_id": lane_id, "bucket": bucket,
+                           "samples": n, "count_sum": total, "count_max": peak}
+                          for (res, iid, lane_id, bucket), (n, total, peak) in lanes.items()],
+        VehicleRollup: [{"resolution": res, "intersection_id": iid, "lane_id": lane_id, "bucket": bucket,
+                         "vehicle_type": v_type, "count": n}
+                        for (res, iid, lane_id, bucket, v_type), n in vehicles.items()],
+        LaneHourProfile: [{"intersection_id": iid, "lane_id": lane_id, "hour": hour, "samples": n, "count_sum": total}
+                          for (iid, lane_id, hour), (n, total) in profile.items()],
+        VehicleTotal: [{"intersection_id": iid, "lane_id": lane_id, "vehicle_type": v_type, "count": n}
+                       for (iid, lane_id, v_type), n in totals.items()],
+    }
+
+
+# Unique key, summed columns and max-ed columns of each rollup table
+UPSERT_SPEC = {
+    LaneStatsRollup: (("resolution", "intersection_id", "lane_id", "bucket"), ("samples", "count_sum"), ("count_max",)),
+    VehicleRollup: (("resolution", "intersection_id", "lane_id", "bucket", "vehicle_type"), ("count",), ()),
+    LaneHourProfile: (("intersection_id", "lane_id", "hour"), ("samples", "count_sum"), ()),
+    VehicleTotal: (("intersection_id", "lane_id", "vehicle_type"), ("count",), ()),
+}
+
+
+def upsert(db, model, rows):
+    """Add rows (deltas, may be negative) to a rollup table by its unique key."""
+    keys, summed, maxed = UPSERT_SPEC[model]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = model.__table__
+        stmt = insert(model)
+        set_ = {c: table.c[c] + stmt.excluded[c] for c in summed}
+        set_.update({c: case((stmt.excluded[c] > table.c[c], stmt.excluded[c]), else_=table.c[c]) for c in maxed})
+        db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_), rows)
+        return
+    # Other databases: read-modify-write, rows locked until the caller commits
+    for row in rows:
+        existing = db.query(model).filter_by(**{k: row[k] for k in keys}).with_for_update().first()
+        if existing is None:
+            db.add(model(**row))
+            continue
+        for c in summed:
+            setattr(existing, c, (getattr(existing, c) or 0) + row[c])
+        for c in maxed:
+            setattr(existing, c, max(getattr(existing, c) or 0, row[c]))
+    db.flush()
+
+
+def apply_rollups(db, stats_rows, vehicle_rows):
+    """Add raw lane_stats / vehicle_logs rows (dicts) to every rollup; call inside the inserting transaction."""
+    for model, rows in aggregate(stats_rows, vehicle_rows).items():
+        if rows:
+            upsert(db, model, rows)
+
+
+def backfill(db, chunk=timedelta(days=1)):
+    """Rebuild all rollups from the raw tables, one chunk of history in memory at a time. Commits."""
+    for model in ROLLUP_MODELS:
+        db.query(model).delete()
+
+    bounds = [db.query(func.min(m.timestamp), func.max(m.timestamp)).one() for m in (LaneStats, VehicleLog)]
+    starts = [lo for lo, _ in bounds if lo is not None]
+    ends = [hi for _, hi in bounds if hi is not None]
+    stats_count = vehicle_count = 0
+    if starts:
+        start, last = bucket_start(min(starts), "hour"), max(ends)
+        while start <= last:
+            end = start + chunk
+            stats = [{"intersection_id": iid, "lane_id": lane_id, "vehicle_count": count, "timestamp": ts}
+                     for iid, lane_id, count, ts in db.query(
+                         LaneStats.intersection_id, LaneStats.lane_id, LaneStats.vehicle_count, LaneStats.timestamp
+                     ).filter(LaneStats.timestamp >= start, LaneStats.timestamp < end).yield_per(10000)]
+            vehicles = [{"intersection_id": iid, "lane_id": lane_id, "vehicle_type": v_type, "count": count, "timestamp": ts}
+                        for iid, lane_id, v_type, count, ts in db.query(
+                            VehicleLog.intersection_id, VehicleLog.lane_id, VehicleLog.vehicle_type,
+                            VehicleLog.count, VehicleLog.timestamp
+                        ).filter(VehicleLog.timestamp >= start, VehicleLog.timestamp < end).yield_per(10000)]
+            apply_rollups(db, stats, vehicles)
+            stats_count += len(stats)
+            vehicle_count += len(vehicles)
+            start = end
+    db.commit()
+    return {"lane_stats": stats_count, "vehicle_logs": vehicle_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild analytics rollups from lane_stats and vehicle_logs")
+    parser.add_argument("--chunk-hours", type=float, default=24.0, help="Hours of raw rows aggregated at a time")
+    args = parser.parse_args()
+
+    from backend.database.database import SessionLocal, engine
+    from backend.database.models import Base
+    Base.metadata.create_all(bind=engine)
+
+    start = time.time()
+    db = SessionLocal()
+    try:
+        done = backfill(db, timedelta(hours=args.chunk_hours))
+    finally:
+        db.close()
+    print(f"Rolled up {done['lane_stats']} lane_stats and {done['vehicle_logs']} vehicle_logs rows "
+          f"in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
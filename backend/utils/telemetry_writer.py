@@ -0,0 +1,244 @@
+import csv
+import io
+import queue
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from backend.database.database import SessionLocal
+from backend.database.models import LaneStats, VehicleLog
+from backend.utils.rollups import apply_rollups
+
+STATS_COLUMNS = ("intersection_id", "lane_id", "vehicle_count", "density", "timestamp")
+VEHICLE_COLUMNS = ("intersection_id", "lane_id", "vehicle_type", "count", "timestamp")
+
+
+class TelemetryWriter:
+    """
+    Write-behind writer for lane_stats / vehicle_logs.
+    The frame loop submits per-lane samples into a bounded queue and never
+    touches the database; a background thread folds them into one LaneStats
+    row (mean count over the window) and one VehicleLog row per vehicle type
+    per lane, and inserts each window in a single transaction (COPY on
+    PostgreSQL, executemany elsewhere) together with its rollups. A full queue drops samples and a
+    failing database keeps rows for retry up to max_pending_rows; both are
+    counted in get_stats(). Purges pause inserts through paused().
+    """
+    def __init__(self, density_fn, window=5.0, queue_size=10000, max_pending_rows=50000):
+        self.density_fn = density_fn    # vehicle count -> density label
+        self.window = window
+        self.max_pending_rows = max_pending_rows
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Held by paused(): no inserts meanwhile
+        self.purged_before = None           # Pending rows older than this were purged
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.lanes = {}          # (intersection_id, lane_id) -> [samples, count_sum, Counter of new vehicles]
+        self.pending = deque()   # (LaneStats rows, VehicleLog rows) per closed window, oldest first
+        self.pending_rows = 0
+
+        # Metrics
+        self.submitted = 0
+        self.dropped_samples = 0
+        self.dropped_rows = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.last_error = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Write out everything received so far (partial window included) and stop the thread."""
+        if not self.thread:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout=timeout)
+        self.thread = None
+
+    @contextmanager
+    def paused(self, before):
+        """
+        Hold off inserts while a purge deletes rows older than before; an
+        insert already running finishes first. Samples keep queueing, and
+        pending rows older than before are dropped once the purge is over
+        instead of reappearing behind it.
+        """
+        with self.flush_lock:
+            yield
+            with self.lock:
+                self.purged_before = before if self.purged_before is None else max(self.purged_before, before)
+
+    def submit(self, intersection_id, lane_id, vehicle_count, new_vehicles=None):
+        """
+        Queue one lane sample; never blocks. lane_id is 1-based like LaneStats.
+        new_vehicles: {vehicle_type: unique vehicles first counted since the previous sample}
+        """
+        try:
+            self.queue.put_nowait((intersection_id, lane_id, vehicle_count, new_vehicles))
+            self.submitted += 1
+        except queue.Full:
+            self.dropped_samples += 1
+
+    def _add(self, sample):
+        intersection_id, lane_id, vehicle_count, new_vehicles = sample
+        agg = self.lanes.get((intersection_id, lane_id))
+        if agg is None:
+            agg = self.lanes[(intersection_id, lane_id)] = [0, 0, Counter()]
+        agg[0] += 1
+        agg[1] += vehicle_count
+        if new_vehicles:
+            agg[2].update(new_vehicles)
+
+    def _drain(self, timeout):
+        try:
+            self._add(self.queue.get(timeout=timeout))
+            while True:
+                self._add(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+
+    def _close_window(self):
+        if not self.lanes:
+            return
+        now = datetime.utcnow()
+        stats_rows, vehicle_rows = [], []
+        for (iid, lane_id), (samples, count_sum, vehicles) in self.lanes.items():
+            count = int(round(count_sum / samples))
+            stats_rows.append({"intersection_id": iid, "lane_id": lane_id, "vehicle_count": count,
+                               "density": self.density_fn(count), "timestamp": now})
+            for v_type, n in vehicles.items():
+                if n > 0:
+                    vehicle_rows.append({"intersection_id": iid, "lane_id": lane_id, "vehicle_type": v_type,
+                                         "count": n, "timestamp": now})
+        self.lanes = {}
+        self.pending.append((stats_rows, vehicle_rows))
+        self.pending_rows += len(stats_rows) + len(vehicle_rows)
+        # Database down for a long time: keep the newest windows only
+        while self.pending_rows > self.max_pending_rows and len(self.pending) > 1:
+            old_stats, old_vehicles = self.pending.popleft()
+            lost = len(old_stats) + len(old_vehicles)
+            self.pending_rows -= lost
+            self.dropped_rows += lost
+
+    def _drop_purged(self):
+        with self.lock:
+            before, self.purged_before = self.purged_before, None
+        if before is None:
+            return
+        kept = deque()
+        for stats, vehicles in self.pending:
+            stats = [r for r in stats if r["timestamp"] >= before]
+            vehicles = [r for r in vehicles if r["timestamp"] >= before]
+            if stats or vehicles:
+                kept.append((stats, vehicles))
+        self.pending = kept
+        self.pending_rows = sum(len(stats) + len(vehicles) for stats, vehicles in kept)
+
+    def _flush(self, wait=False):
+        """Insert the pending windows. While a purge holds the writer paused they stay pending (wait: block until it is over)."""
+        if not self.pending:
+            return
+        if not self.flush_lock.acquire(blocking=wait):
+            return
+        try:
+            self._drop_purged()
+            self._insert_pending()
+        finally:
+            self.flush_lock.release()
+
+    def _insert_pending(self):
+        if not self.pending:
+            return
+        stats_rows = [r for stats, _ in self.pending for r in stats]
+        vehicle_rows = [r for _, vehicles in self.pending for r in vehicles]
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            conn = db.connection()
+            if conn.dialect.name == "postgresql" and conn.dialect.driver in ("psycopg2", "psycopg"):
+                cursor = conn.connection.cursor()
+                try:
+                    _copy_rows(cursor, LaneStats.__tablename__, STATS_COLUMNS, stats_rows)
+                    _copy_rows(cursor, VehicleLog.__tablename__, VEHICLE_COLUMNS, vehicle_rows)
+                finally:
+                    cursor.close()
+            else:
+                if stats_rows:
+                    db.execute(insert(LaneStats), stats_rows)
+                if vehicle_rows:
+                    db.execute(insert(VehicleLog), vehicle_rows)
+            apply_rollups(db, stats_rows, vehicle_rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.failed_flushes += 1
+            self.last_error = str(e)
+            print(f"DB Log Error: {e}")
+            return
+        finally:
+            db.close()
+        with self.lock:
+            self.rows_written += self.pending_rows
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.pending.clear()
+        self.pending_rows = 0
+
+    def _run(self):
+        next_flush = time.monotonic() + self.window
+        while not self.stop_event.is_set():
+            self._drain(min(max(next_flush - time.monotonic(), 0.0), 0.5))
+            if time.monotonic() >= next_flush:
+                self._close_window()
+                self._flush()
+                # A slow flush skips windows rather than bunching them up
+                next_flush = max(next_flush + self.window, time.monotonic())
+        self._drain(0)
+        self._close_window()
+        self._flush(wait=True)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "window_s": self.window,
+                "queued": self.queue.qsize(),
+                "submitted": self.submitted,
+                "dropped_samples": self.dropped_samples,
+                "pending_rows": self.pending_rows,
+                "dropped_rows": self.dropped_rows,
+                "rows_written": self.rows_written,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "last_error": self.last_error,
+            }
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """Bulk load rows with PostgreSQL COPY (psycopg2 or psycopg 3 cursor, caller's transaction)."""
+    if not rows:
+        return
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    values = ([r[c].isoformat() if c == "timestamp" else r[c] for c in columns] for r in rows)
+    if hasattr(cursor, "copy_expert"):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(values)
+        buf.seek(0)
+        cursor.copy_expert(sql, buf)
+    else:
+        with cursor.copy(sql) as copy:
+            for row in values:
+                copy.write_row(row)
@@ -1,164 +1,688 @@
 import cv2
+import json
+import os
 import threading
 import time
-from backend.cv.vehicle_detector import VehicleDetector
+from collections import defaultdict
+import numpy as np
+from backend.cv.vehicle_detector import CLASS_NAMES, VehicleDetector, count_detections, detection_label
 from backend.cv.ambulance_detector import AmbulanceDetector
 from backend.cv.traffic_logic import TrafficLogic
-from backend.database.models import LaneStats, VehicleLog, AmbulanceEvent
+from backend.cv.tracker import LaneTracker
+from backend.cv.motion_gate import MotionGate
+from backend.cv.detection_scheduler import DetectionScheduler
+from backend.cv.lane_roi import LaneROI
+from backend.utils.capture import CaptureWorker
+from backend.utils.inference_pool import InferencePool
+from backend.utils.frame_hub import FrameHub
+from backend.utils.profiler import PipelineProfiler
+from backend.utils.detection_log import FLAG_AMBULANCE, CachedLane, DetectionCache, DetectionLogWriter
+from backend.utils.telemetry_writer import TelemetryWriter
+from backend.database.models import LaneRegion, AmbulanceEvent
 from backend.database.database import SessionLocal
+from backend.config import load_system_settings
+
+FRAME_WIDTH, FRAME_HEIGHT = 480, 270
 
 class VideoProcessor:
-    def __init__(self, config, signal_controller=None):
+    def __init__(self, config, registry=None):
+        """
+        registry: IntersectionRegistry; maps each lane slot to (intersection, lane)
+                  and provides the per-intersection signal controllers.
+        """
         self.config = config
-        self.signal_controller = signal_controller
+        self.registry = registry
         
-        self.vehicle_detector = VehicleDetector(config.MODEL_VEHICLE_PATH)
-        self.ambulance_detector = AmbulanceDetector(config.MODEL_AMBULANCE_PATH)
+        # Models are loaded lazily (see load_models) so the API starts instantly
+        self.model_name = None
+        self.vehicle_detector = None
+        self.ambulance_detector = AmbulanceDetector(
+            config.MODEL_AMBULANCE_PATH, ocr_enabled=config.AMBULANCE_OCR_ENABLED,
+            ocr_workers=config.OCR_WORKERS, ocr_queue_size=config.OCR_QUEUE_SIZE,
+            ocr_cache_ttl=config.OCR_CACHE_TTL, ocr_frame_budget_ms=config.OCR_FRAME_BUDGET_MS)
+        self._model_lock = threading.Lock()
         self.traffic_logic = TrafficLogic(config)
         
         # Store latest processing results
-        self.frame_data = {} # {0: frame, 1: frame, ...}
-        self.lane_data = {i: {'count': 0, 'density': 'Low', 'details': {}} for i in range(4)}
-        self.ambulance_active = [False] * 4 # Track ambulance state per lane
-        
-        self.caps = [None] * 4
-        self.sources = [None] * 4 # Paths to video files
+        self.frame_hub = FrameHub() # Encoded JPEGs, published once per frame to all viewers
+        self.metadata_hub = FrameHub() # JSON detection metadata per frame, for client-side overlays
+        # Per-lane state, one entry per lane slot across all intersections (see _configure_lanes)
+        self.num_lanes = 0
+        self.lane_map = [] # slot -> (intersection_id, lane_index)
+        self._configure_lanes(registry.lane_map if registry else [(1, i) for i in range(4)])
+
+        # Source changes requested while running; applied by the processing loop between ticks
+        self._pending_lock = threading.Lock()
+        self._pending_sources = {} # slot -> new source (None = detach)
+        self._pending_lane_map = None # Longer lane map to grow into
         
+        self.inference_pool = None # Optional multi-process detection (config.INFERENCE_WORKERS)
+
+        # Per-stage latency histograms, switchable at runtime (/api/profiler)
+        self.profiler = PipelineProfiler(config.PROFILER_ENABLED)
+        self.ambulance_detector.ocr_verifier.latency_hook = self._record_ocr_latency
+
+        # Optional append-only log of every detection, and the per-file detection cache
+        self.detection_log = None
+        self.detection_cache = (DetectionCache(os.path.join(config.DETECTION_LOG_DIR, 'cache'),
+                                               config.DETECTION_CACHE_MAX_BYTES)
+                                if config.DETECTION_CACHE_ENABLED else None)
+
+        # lane_stats / vehicle_logs rows, aggregated and bulk-inserted off the frame loop
+        self.telemetry = TelemetryWriter(self.traffic_logic.get_density_label, config.TELEMETRY_WINDOW,
+                                         config.TELEMETRY_QUEUE_SIZE, config.TELEMETRY_MAX_PENDING_ROWS)
+
         self.running = False
         self.thread = None
-        self.last_db_log = 0  # Timestamp of last DB write
 
-    def start_streams(self, video_paths):
+    def _configure_lanes(self, lane_map):
+        self.lane_map = list(lane_map)
+        self.num_lanes = n = len(self.lane_map)
+        self.lane_data = {i: self._new_lane_data() for i in range(n)}
+        self.ambulance_active = [False] * n # Track ambulance state per lane
+        self.trackers = [LaneTracker() for _ in range(n)] # Propagates boxes between detection ticks
+        self.motion_gates = [self._new_motion_gate() for _ in range(n)]
+        self.scheduler = self._new_scheduler() # Shares the detection budget across lanes
+        self.lane_rois = [None] * n # Optional LaneROI per lane (see set_lane_region)
+
+        self.captures = [None] * n # One CaptureWorker per lane
+        self.frame_buffers = [self._new_frame_buffer() for _ in range(n)] # Working-size frame per lane, resized into every tick
+        self.sources = [None] * n # Paths to video files
+        self.cached_lanes = [None] * n # (CachedLane, roi, key) for files replaying cached detections
+        self.cache_recorders = [None] * n # (DetectionLogWriter, roi, key) for files being analyzed
+
+    def start_streams(self, video_paths, lane_map=None):
         """
         Initialize video captures
-        video_paths: list of 4 file paths or stream URLs
+        video_paths: one file path, stream URL or device index (or None) per lane slot
+        lane_map: (intersection_id, lane_index) per slot; defaults to the registry's,
+                  or a single intersection
         """
         if self.running or (self.thread and self.thread.is_alive()):
             self.stop()
             time.sleep(0.5)
 
-        self.sources = video_paths
+        if lane_map is None:
+            if self.registry and len(self.registry.lane_map) == len(video_paths):
+                lane_map = self.registry.lane_map
+            else:
+                lane_map = [(1, i) for i in range(len(video_paths))]
+
+        # Workers hold their own model and one ring per lane; restart them
+        # after a yolo_model or lane count change
+        model_name = load_system_settings().get("yolo_model")
+        if self.inference_pool and (self.inference_pool.model_name != model_name
+                                    or self.inference_pool.num_lanes != len(lane_map)):
+            self.inference_pool.close()
+            self.inference_pool = None
+
+        self.frame_hub.clear()
+        self.metadata_hub.clear()
+        with self._pending_lock:
+            self._pending_sources = {}
+            self._pending_lane_map = None
+        self._configure_lanes(lane_map)
+        self.sources = list(video_paths)
+        self.ambulance_detector.flash_analyzers = {}
+        # New trackers restart ids at 1; verdicts keyed (lane, track_id) would be inherited
+        self.ambulance_detector.ocr_verifier.forget()
+        self._load_lane_regions()
+        if self.config.DETECTION_LOG_ENABLED and self.detection_log is None:
+            self.detection_log = DetectionLogWriter(os.path.join(self.config.DETECTION_LOG_DIR, 'live'),
+                                                    info={'frame_size': [FRAME_WIDTH, FRAME_HEIGHT]})
         for i, src in enumerate(video_paths):
-            if src:
-                self.caps[i] = cv2.VideoCapture(src)
+            if src is not None and src != "":
+                self._start_capture(i, src)
+
+        if self.config.INFERENCE_WORKERS > 0 and self.inference_pool is None:
+            self.inference_pool = InferencePool(self.config, self.num_lanes, (FRAME_HEIGHT, FRAME_WIDTH, 3), model_name)
         
+        self.telemetry.start()
         self.running = True
         self.thread = threading.Thread(target=self._process_loop)
         self.thread.daemon = True
         self.thread.start()
 
+    def load_models(self):
+        """
+        Load the shared vehicle detector (or reload it after a yolo_model change).
+        Blocking: runs on the processing thread or a startup warmup thread, never
+        at import time. OCR is not loaded here; its worker loads it on first use.
+        """
+        with self._model_lock:
+            model_name = load_system_settings().get("yolo_model")
+            # With worker processes the detector lives in the workers only
+            if not self.config.INFERENCE_WORKERS and (self.vehicle_detector is None or model_name != self.model_name):
+                self.vehicle_detector = VehicleDetector(self.config.MODEL_VEHICLE_PATH, model_name=model_name)
+                self.vehicle_detector.warmup((FRAME_HEIGHT, FRAME_WIDTH, 3))
+                self.ambulance_detector.vehicle_detector = self.vehicle_detector
+            self.model_name = model_name
+
     def _process_loop(self):
         """
         Main processing loop.
         Reads frames from all active sources, runs detection, updates stats.
         """
-        DETECT_INTERVAL = 4 
-        frame_count = 0
-        
-        cached_boxes = {i: {'vehicles': [], 'ambulance': []} for i in range(4)}
+        try:
+            self.load_models()
+        except Exception as e:
+            print(f"Model load error: {e}")
+            self.running = False
+            return
+
+        AMBULANCE_EVENT_INTERVAL = 0.2 # Signal controller cooldown assumes ~5 updates/sec
+        last_ambulance_event = 0
+
+        cached_boxes = defaultdict(lambda: {'vehicles': [], 'ambulance': []})
         
+        clock = time.perf_counter
         while self.running:
             start_time = time.time()
-            
-            for i in range(4):
+            # Checked once per tick; when off no timestamps are taken
+            prof = self.profiler if self.profiler.enabled else None
+            tick_start = clock() if prof else 0.0
+
+            # 0. Camera attach / detach / replace requested since the last tick
+            for i in self._apply_pending_sources():
+                cached_boxes.pop(i, None)
+
+            # 1. Grab the newest frame from every lane
+            frames = {}
+            raw_frames = {} # Full-resolution frames, kept for ROI crops
+            frame_seqs = {}
+            frame_pts = {}
+            for i in range(self.num_lanes):
                 try:
-                    if self.caps[i] and self.caps[i].isOpened():
-                        ret, raw_frame = self.caps[i].read()
-                        if not ret:
-                            print(f"Lane {i}: Stream ended or disconnected.")
-                            self.caps[i].release()
-                            self.caps[i] = None
+                    worker = self.captures[i]
+                    if worker:
+                        # Pull whatever is newest; skip the lane if its camera has nothing new
+                        raw_frame, frame_seqs[i] = worker.read_latest()
+                        if raw_frame is None:
+                            if worker.finished:
+                                # Played to the end, so the recorded detections cover the whole file
+                                self._close_detection_cache(i, complete=True)
+                                worker.stop()
+                                self.captures[i] = None
+                                self.sources[i] = None # Submitting the file again replays it
                             continue
-                            
-                        frame = cv2.resize(raw_frame, (480, 270))
-                        
-                        if (frame_count + i) % DETECT_INTERVAL == 0:
-                            _, counts, total, veh_data_list = self.vehicle_detector.detect(frame, draw=False)
-                            raw_boxes = [v['coords'] for v in veh_data_list]
-                            has_ambu, _, ambu_boxes = self.ambulance_detector.check_boxes(frame, raw_boxes)
-                            
-                            self.ambulance_active[i] = has_ambu
-                            cached_boxes[i]['ambulance'] = ambu_boxes
-                            cached_boxes[i]['vehicles'] = veh_data_list
-
-                            self.lane_data[i]['count'] = total
-                            self.lane_data[i]['details'] = counts 
-                            density_label = self.traffic_logic.get_density_label(total)
-                            self.lane_data[i]['density'] = density_label
-                            
-                            current_time = time.time()
-                            if self.last_db_log + 5 < current_time:
-                                db = SessionLocal()
-                                try:
-                                    stats = LaneStats(lane_id=i+1, vehicle_count=total, density=density_label)
-                                    db.add(stats)
-                                    
-                                    for v_type, v_count in counts.items():
-                                        if v_count > 0:
-                                            v_log = VehicleLog(lane_id=i+1, vehicle_type=v_type, count=v_count)
-                                            db.add(v_log)
-                                            
-                                    db.commit()
-                                    self.last_db_log = current_time
-                                except Exception as e:
-                                    db.rollback()
-                                    print(f"DB Log Error: {e}")
-                                finally:
-                                    db.close()
-
-                        for (ax1, ay1, ax2, ay2) in cached_boxes[i]['ambulance']:
-                            cv2.rectangle(frame, (ax1, ay1), (ax2, ay2), (0, 0, 255), 3)
-                            cv2.putText(frame, "AMBULANCE", (ax1, ay1 - 10), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                        
-                        for box_data in cached_boxes[i]['vehicles']:
-                            (vx1, vy1, vx2, vy2) = box_data['coords']
-                            
-                            is_ambu = False
-                            for (ax1, ay1, ax2, ay2) in cached_boxes[i]['ambulance']:
-                                if vx1 == ax1 and vy1 == ay1:
-                                    is_ambu = True
-                                    break
-                            if is_ambu: continue
-
-                            label = box_data['label']
-                            color = box_data['color']
-                            cv2.rectangle(frame, (vx1, vy1), (vx2, vy2), color, 2)
-                            cv2.putText(frame, label, (vx1, vy1 - 10), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-                        
-                        _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
-                        self.frame_data[i] = buffer.tobytes()
+
+                        raw_frames[i] = raw_frame
+                        frame_pts[i] = worker.consumed_pts
+                        if prof:
+                            prof.record(i, 'decode', worker.consumed_read_time)
+                            t = clock()
+                        frames[i] = cv2.resize(raw_frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=self.frame_buffers[i])
+                        if prof:
+                            prof.record(i, 'resize', clock() - t)
                 except Exception as e:
                     print(f"Error in lane {i}: {e}")
+
+            # 2. Files analyzed before replay their cached detections; pick the
+            # other lanes worth a detection this tick and run them all in one
+            # batched forward pass.
+            replayed = {}
+            for i in frames:
+                if self._cache_valid(i) and self.cached_lanes[i]:
+                    cached = self.cached_lanes[i][0].due(frame_pts[i])
+                    if cached is not None:
+                        replayed[i] = cached
+
+            candidates = {}
+            for i, frame in frames.items():
+                if self.cached_lanes[i]:
                     continue
+                # A lane still waiting on a worker can't take a detection; leave its budget alone
+                if self.inference_pool and self.inference_pool.busy(i):
+                    continue
+                gate = self.motion_gates[i]
+                # Static scenes keep their last results instead of re-running YOLO
+                t = clock() if prof else 0.0
+                changed = gate.check(frame) if self.config.MOTION_GATE_ENABLED else gate.bypass()
+                if prof:
+                    prof.record(i, 'motion_gate', clock() - t)
+                candidates[i] = {
+                    'changed': changed, 'change': gate.change,
+                    'count': self.lane_data[i]['count'],
+                    'ambulance': self.ambulance_active[i],
+                }
+            due_lanes = self.scheduler.select(candidates, start_time)
+            for i in due_lanes:
+                self.motion_gates[i].mark_detected()
+            for i in candidates:
+                self.lane_data[i]['skip_ratio'] = self.motion_gates[i].skip_ratio()
 
-            ambulance_lane = -1
-            for lid, active in enumerate(self.ambulance_active):
-                if active:
-                    ambulance_lane = lid
-                    break
-            
-            if self.signal_controller and (frame_count % DETECT_INTERVAL == 0):
-                self.signal_controller.set_ambulance_event(ambulance_lane, ambulance_lane != -1)
-            
-            frame_count += 1
+            # detections: {lane: (frame_detected_on, counts, total, detection array, frame seq, pts)}
+            detections = {}
+            try:
+                # Lanes with a region of interest are detected on its crop instead
+                inputs = {}
+                for i in due_lanes:
+                    if self.lane_rois[i]:
+                        t = clock() if prof else 0.0
+                        inputs[i] = self.lane_rois[i].crop(raw_frames[i])
+                        if prof:
+                            prof.record(i, 'roi_crop', clock() - t)
+                    else:
+                        inputs[i] = frames[i]
+                t = clock() if prof else 0.0
+                if self.inference_pool:
+                    # Results arrive asynchronously, possibly a tick or two later, tagged
+                    # with the seq / pts of the frame they actually ran on
+                    self.inference_pool.submit({i: (inp, frame_seqs[i], frame_pts[i]) for i, inp in inputs.items()})
+                    detections = self.inference_pool.collect()
+                    if prof:
+                        prof.record(None, 'inference_pool_io', clock() - t)
+                elif due_lanes:
+                    batch = self.vehicle_detector.detect_batch([inputs[i] for i in due_lanes])
+                    detections = {i: (inputs[i],) + tuple(res[1:]) + (frame_seqs[i], frame_pts[i])
+                                  for i, res in zip(due_lanes, batch)}
+                    if prof:
+                        # One forward pass serves all due lanes; each is charged its share
+                        elapsed = clock() - t
+                        prof.record(None, 'detect_batch', elapsed)
+                        for i in due_lanes:
+                            prof.record(i, 'detect', elapsed / len(due_lanes))
+            except Exception as e:
+                print(f"Detection error: {e}")
+
+            # 3. Per-lane ambulance check, stats, drawing and encoding.
+            # One OCR budget covers the whole tick, however many lanes it has.
+            self.ambulance_detector.ocr_verifier.begin_frame()
+            for i, (det_frame, counts, total, veh_data_list, seq, pts) in detections.items():
+                try:
+                    self._update_lane(i, det_frame, counts, total, veh_data_list, cached_boxes, seq, pts)
+                except Exception as e:
+                    print(f"Error in lane {i}: {e}")
+            for i, veh_data_list in replayed.items():
+                try:
+                    self._update_lane(i, frames[i], count_detections(veh_data_list), len(veh_data_list),
+                                      veh_data_list, cached_boxes, frame_seqs[i], frame_pts[i], mapped=True)
+                except Exception as e:
+                    print(f"Error in lane {i}: {e}")
+
+            for i, frame in frames.items():
+                try:
+                    t = clock() if prof else 0.0
+                    tracker = self.trackers[i]
+                    if i not in detections and i not in replayed:
+                        tracker.predict()
+                    cached_boxes[i]['vehicles'] = tracker.get_tracks()
+                    if prof:
+                        t = prof.lap(i, 'track', t)
+                    # Beacon intensity is sampled every frame so flashing can be timed
+                    self.ambulance_detector.sample_lights(i, frame, cached_boxes[i]['vehicles'], start_time)
+                    if prof:
+                        t = prof.lap(i, 'lights', t)
+                    self.lane_data[i]['flow_per_min'] = tracker.flow_per_minute()
+                    self.lane_data[i]['queue_length'] = tracker.queue_length()
+
+                    if self.metadata_hub.wants_frame(i):
+                        self.metadata_hub.publish(i, self._lane_metadata(i, frame_seqs[i], start_time, cached_boxes[i]))
+                        if prof:
+                            t = prof.lap(i, 'metadata', t)
+
+                    # Headless, or nobody watching and no snapshot pending: skip drawing and encoding
+                    if self.config.STREAM_MODE == "none" or not self.frame_hub.wants_frame(i):
+                        continue
+
+                    if self.config.STREAM_MODE == "annotated":
+                        if self.lane_rois[i]:
+                            self.lane_rois[i].draw(frame)
+                        self._draw_boxes(frame, cached_boxes[i])
+                        if prof:
+                            t = prof.lap(i, 'draw', t)
+
+                    _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
+                    # One copy per encoded frame, shared by every viewer; older Starlette
+                    # releases (allowed by requirements.txt) reject memoryview bodies
+                    self.frame_hub.publish(i, buffer.tobytes())
+                    if prof:
+                        prof.lap(i, 'encode', t)
+                except Exception as e:
+                    print(f"Error in lane {i}: {e}")
+                    continue
+                finally:
+                    if prof:
+                        prof.frame_done(i, start_time)
+
+            if start_time - last_ambulance_event >= AMBULANCE_EVENT_INTERVAL:
+                self._send_ambulance_events()
+                last_ambulance_event = start_time
             
+            if prof:
+                prof.record(None, 'tick', clock() - tick_start)
             elapsed = time.time() - start_time
             if elapsed < 0.033:
                 time.sleep(0.033 - elapsed)
 
+    def update_sources(self, video_paths, lane_map):
+        """
+        Reconfigure to these sources, touching only the lanes whose source changed;
+        every other lane keeps capturing, detecting and feeding its signal controller.
+        New lanes appended to the lane map are added in place. Falls back to a full
+        restart when the pipeline is stopped, existing lanes were renumbered, or the
+        inference pool would need more rings.
+        Returns the slots that changed.
+        """
+        lane_map = list(lane_map)
+        n = self.num_lanes
+        if (not self.running or lane_map[:n] != self.lane_map or len(lane_map) < n
+                or (self.inference_pool and len(lane_map) != n)):
+            self.start_streams(video_paths, lane_map)
+            return list(range(len(lane_map)))
+
+        with self._pending_lock:
+            if len(lane_map) > n:
+                self._pending_lane_map = lane_map
+        return [slot for slot, src in enumerate(video_paths) if self.set_source(slot, src)]
+
+    def set_source(self, slot, source):
+        """
+        Attach, replace or (source None) detach one lane's camera while the
+        others keep running. No-op, returning False, if the source is unchanged.
+        """
+        if source == "":
+            source = None
+        with self._pending_lock:
+            if slot in self._pending_sources:
+                current = self._pending_sources[slot]
+            else:
+                current = self.sources[slot] if slot < len(self.sources) else None
+            if current == source:
+                return False
+            self._pending_sources[slot] = source
+        return True
+
+    def _apply_pending_sources(self):
+        """Runs on the processing thread. Returns the slots that were reset."""
+        with self._pending_lock:
+            lane_map, self._pending_lane_map = self._pending_lane_map, None
+            changes, self._pending_sources = self._pending_sources, {}
+        if lane_map and len(lane_map) > self.num_lanes:
+            self._add_lanes(lane_map[self.num_lanes:])
+
+        for slot, source in changes.items():
+            if slot >= self.num_lanes:
+                continue
+            old = self.captures[slot]
+            if old:
+                # Joining the capture thread can take a while; don't stall the other lanes
+                threading.Thread(target=old.stop, daemon=True).start()
+            self.captures[slot] = None
+            self.sources[slot] = source
+            self._close_detection_cache(slot)
+
+            # The old camera's tracks, history and counts do not carry over
+            self.trackers[slot] = LaneTracker()
+            self.motion_gates[slot] = self._new_motion_gate()
+            self.scheduler.last_run.pop(slot, None)
+            self.ambulance_detector.flash_analyzers.pop(slot, None)
+            self.ambulance_detector.ocr_verifier.forget(slot)
+            self.ambulance_active[slot] = False
+            self.lane_data[slot] = self._new_lane_data()
+            if self.inference_pool:
+                self.inference_pool.discard(slot)
+
+            if source is not None:
+                self._start_capture(slot, source)
+        return list(changes)
+
+    def _start_capture(self, slot, source):
+        self.captures[slot] = CaptureWorker(slot, source)
+        self.captures[slot].start()
+        self._open_detection_cache(slot, source)
+
+    def _open_detection_cache(self, slot, source):
+        """Replay a video file's cached detections if it was analyzed before, else record them."""
+        if not self.detection_cache or self.captures[slot].is_live or not os.path.isfile(str(source)):
+            return
+        roi = self.lane_rois[slot]
+        fingerprint = {'model': load_system_settings().get("yolo_model"), 'frame_size': [FRAME_WIDTH, FRAME_HEIGHT],
+                       'roi': roi.polygon.tolist() if roi else None}
+        try:
+            key = self.detection_cache.key(source, fingerprint)
+            reader = self.detection_cache.lookup(key)
+            if reader:
+                self.cached_lanes[slot] = (CachedLane(reader), roi, key)
+            else:
+                recorder = self.detection_cache.recorder(key, info=dict(fingerprint, source=str(source)))
+                self.cache_recorders[slot] = (recorder, roi, key)
+        except OSError as e:
+            print(f"Detection cache error: {e}")
+
+    def _close_detection_cache(self, slot, complete=False):
+        recorder, cached = self.cache_recorders[slot], self.cached_lanes[slot]
+        self.cache_recorders[slot] = None
+        self.cached_lanes[slot] = None
+        if recorder:
+            recorder[0].close(complete)
+        for state in (recorder, cached):
+            if state:
+                self.detection_cache.release(state[2])
+
+    def _cache_valid(self, slot):
+        """A lane region change mid-file invalidates its cached or recording detections."""
+        state = self.cached_lanes[slot] or self.cache_recorders[slot]
+        if state and state[1] is not self.lane_rois[slot]:
+            self._close_detection_cache(slot)
+            return False
+        return True
+
+    def _add_lanes(self, new_lanes):
+        """Grow per-lane state for lanes appended to the lane map (processing thread only)."""
+        regions = self._lane_region_polygons()
+        for key in new_lanes:
+            slot = len(self.lane_map)
+            self.lane_data[slot] = self._new_lane_data()
+            self.ambulance_active.append(False)
+            self.trackers.append(LaneTracker())
+            self.motion_gates.append(self._new_motion_gate())
+            self.lane_rois.append(None)
+            self.captures.append(None)
+            self.frame_buffers.append(self._new_frame_buffer())
+            self.sources.append(None)
+            self.cached_lanes.append(None)
+            self.cache_recorders.append(None)
+            self.lane_map.append(key)
+            self.set_lane_region(slot, regions.get(key))
+        self.num_lanes = len(self.lane_map)
+        self.scheduler.max_tokens = float(self.num_lanes)
+
+    @staticmethod
+    def _new_frame_buffer():
+        return np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), np.uint8)
+
+    @staticmethod
+    def _new_lane_data():
+        return {'count': 0, 'density': 'Low', 'details': {}, 'flow_per_min': 0, 'queue_length': 0, 'skip_ratio': 0.0}
+
+    def _new_motion_gate(self):
+        return MotionGate(self.config.MOTION_CHANGED_FRACTION)
+
+    def _new_scheduler(self):
+        return DetectionScheduler(self.config.DETECTION_BUDGET, self.config.DETECTION_MIN_REFRESH,
+                                  max(self.num_lanes, 1), self.config.DENSITY_HIGH)
+
+    def _send_ambulance_events(self):
+        """Tell each intersection's controller which of its lanes (first found, or -1) has an ambulance."""
+        if not self.registry:
+            return
+        ambulance_lanes = {}
+        for slot, (iid, lane) in enumerate(self.lane_map):
+            if ambulance_lanes.get(iid, -1) == -1:
+                ambulance_lanes[iid] = lane if self.ambulance_active[slot] else -1
+        for iid, lane in ambulance_lanes.items():
+            controller = self.registry.controllers.get(iid)
+            if controller:
+                controller.set_ambulance_event(lane, lane != -1)
+
+    def _update_lane(self, i, frame, counts, total, veh_data_list, cached_boxes, seq=None, pts=None, mapped=False):
+        """
+        frame / veh_data_list: the image detection ran on (an ROI crop for ROI lanes) and its detections.
+        seq / pts: capture frame the detection ran on; unknown (None) results are not logged.
+        mapped: detections are already in working-frame coordinates and inside the lane (cache replay).
+        """
+        prof = self.profiler if self.profiler.enabled else None
+        t = time.perf_counter() if prof else 0.0
+        tracker = self.trackers[i]
+        frame_dets = veh_data_list
+        roi = self.lane_rois[i]
+        if roi and not mapped:
+            # Back to full-frame coordinates, keeping only vehicles standing in the lane
+            frame_dets = roi.to_frame(veh_data_list)
+            inside = roi.contains(frame_dets)
+            veh_data_list, frame_dets = veh_data_list[inside], frame_dets[inside]
+            counts, total = count_detections(frame_dets), len(frame_dets)
+        track_ids = tracker.update(frame_dets)
+        if prof:
+            t = prof.lap(i, 'track_update', t)
+
+        raw_boxes = [tuple(box) for box in veh_data_list['box'].tolist()]
+        # Track ids key the OCR verdict cache, so each vehicle is read at most once per TTL
+        has_ambu, _, ambu_idx = self.ambulance_detector.check_boxes(
+            frame, raw_boxes, keys=[(i, tid) for tid in track_ids], lane=i)
+
+        self.ambulance_active[i] = has_ambu
+        if prof:
+            t = prof.lap(i, 'ambulance_check', t)
+
+        cached_boxes[i]['ambulance'] = [tuple(frame_dets['box'][k].tolist()) for k in ambu_idx]
+        if ambu_idx:
+            tracker.set_flag([track_ids[k] for k in ambu_idx], 'ambulance')
+        self._log_detections(i, frame_dets, track_ids, ambu_idx, seq, pts)
+        if prof:
+            t = prof.lap(i, 'detection_log', t)
+
+        self.lane_data[i]['count'] = total
+        self.lane_data[i]['details'] = counts
+        density_label = self.traffic_logic.get_density_label(total)
+        self.lane_data[i]['density'] = density_label
+
+        # Write-behind: the telemetry thread aggregates and inserts, the loop never waits on the DB
+        iid, lane = self.lane_map[i]
+        new_vehicles = self.trackers[i].pop_counts()
+        self.telemetry.submit(iid, lane + 1, total,
+                              {CLASS_NAMES[c]: n for c, n in new_vehicles.items()} if new_vehicles else None)
+        if prof:
+            prof.lap(i, 'db_write', t)
+
+    def _record_ocr_latency(self, key, seconds):
+        """OCR runs on background workers; its latency is filed under the candidate's lane."""
+        if self.profiler.enabled:
+            self.profiler.record(key[0] if isinstance(key, tuple) else None, 'ocr', seconds)
+
+    def _log_detections(self, i, detections, track_ids, ambulance_idx, seq, pts):
+        if seq is None or pts is None:
+            return  # Not tied to a known frame; a made-up seq/pts would corrupt replay
+        recorder = self._cache_valid(i) and self.cache_recorders[i]
+        if self.detection_log is None and not recorder:
+            return
+        flags = np.zeros(len(detections), np.uint8)
+        flags[ambulance_idx] = FLAG_AMBULANCE
+        now = time.time()
+        try:
+            if self.detection_log:
+                self.detection_log.append(i, seq, now, detections, track_ids, flags, pts)
+            if recorder:
+                recorder[0].append(0, seq, now, detections, track_ids, flags, pts)
+        except (OSError, ValueError) as e:
+            print(f"Detection log error: {e}")
+
+    def _lane_region_polygons(self):
+        """{(intersection_id, lane_index): polygon} from the DB."""
+        db = SessionLocal()
+        try:
+            return {(r.intersection_id, r.lane_id): json.loads(r.polygon) for r in db.query(LaneRegion).all()}
+        except Exception as e:
+            print(f"Lane region load error: {e}")
+            return {}
+        finally:
+            db.close()
+
+    def _load_lane_regions(self):
+        regions = self._lane_region_polygons()
+        for i, key in enumerate(self.lane_map):
+            self.set_lane_region(i, regions.get(key))
+
+    def set_lane_region(self, lane_id, polygon):
+        """Apply (or with None / [] clear) a lane slot's ROI polygon; takes effect on the next detection."""
+        self.lane_rois[lane_id] = LaneROI(polygon, (FRAME_WIDTH, FRAME_HEIGHT)) if polygon else None
+
+    def _lane_metadata(self, i, frame_seq, timestamp, cached):
+        """Compact JSON description of one frame's detections."""
+        return json.dumps({
+            'lane': i,
+            'seq': frame_seq,
+            'ts': round(timestamp, 3),
+            'size': [FRAME_WIDTH, FRAME_HEIGHT],
+            'count': self.lane_data[i]['count'],
+            'ambulance': self.ambulance_active[i],
+            'vehicles': [{
+                'box': list(v['coords']),
+                'type': CLASS_NAMES[v['cls']],
+                'conf': v['conf'],
+                'track_id': v.get('track_id'),
+                'ambulance': bool(v.get('ambulance')),
+            } for v in cached['vehicles']],
+        }, separators=(',', ':')).encode()
+
+    def _draw_boxes(self, frame, cached):
+        for box_data in cached['vehicles']:
+            (vx1, vy1, vx2, vy2) = box_data['coords']
+
+            if box_data.get('ambulance'):
+                cv2.rectangle(frame, (vx1, vy1), (vx2, vy2), (0, 0, 255), 3)
+                cv2.putText(frame, "AMBULANCE", (vx1, vy1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                continue
+
+            label = f"#{box_data['track_id']} {detection_label(box_data['cls'], box_data['conf'])}"
+            color = (0, 255, 0)
+            cv2.rectangle(frame, (vx1, vy1), (vx2, vy2), color, 2)
+            cv2.putText(frame, label, (vx1, vy1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
     def get_frame(self, lane_id):
-        return self.frame_data.get(lane_id)
+        return self.frame_hub.latest(lane_id)[1]
         
     def get_lane_count(self, lane_id):
-        return self.lane_data[lane_id]['count']
+        lane = self.lane_data.get(lane_id)
+        return lane['count'] if lane else 0
+
+    def get_intersection_counts(self, intersection_id):
+        """{lane_index: vehicle count} for one intersection's lanes."""
+        return {lane: self.get_lane_count(slot)
+                for slot, (iid, lane) in enumerate(self.lane_map) if iid == intersection_id}
+
+    def get_intersection_lanes(self, intersection_id):
+        """{lane_index: lane_data} for one intersection's lanes."""
+        return {lane: self.lane_data.get(slot, {})
+                for slot, (iid, lane) in enumerate(self.lane_map) if iid == intersection_id}
+
+    def get_ocr_stats(self):
+        return self.ambulance_detector.ocr_verifier.get_stats()
+
+    def get_telemetry_stats(self):
+        return self.telemetry.get_stats()
+
+    def get_capture_stats(self):
+        """Per-lane dropped-frame and capture-latency counters."""
+        return {i: (worker.get_stats() if worker else None) for i, worker in enumerate(self.captures)}
 
     def stop(self):
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
-        for cap in self.caps:
-            if cap:
-                cap.release()
-        self.caps = [None] * 4
+        for worker in self.captures:
+            if worker:
+                worker.stop()
+        self.captures = [None] * self.num_lanes
+        for i in range(self.num_lanes):
+            self._close_detection_cache(i)
+        if self.detection_log:
+            self.detection_log.close()
+            self.detection_log = None
+        if self.inference_pool:
+            self.inference_pool.close()
+            self.inference_pool = None
+        self.telemetry.stop()
@@ -24,6 +24,16 @@ export default function Reports() {
 
     const changePage = (p) => { setPage(p); load(p); };
 
+    // Export follows the lane / date filters
+    const exportParams = new URLSearchParams();
+    if (filters.lane) exportParams.set('lane', filters.lane);
+    if (filters.date) {
+        const next = new Date(`${filters.date}T00:00:00Z`);
+        next.setUTCDate(next.getUTCDate() + 1);
+        exportParams.set('start', `${filters.date}T00:00:00`);
+        exportParams.set('end', next.toISOString().slice(0, 19));
+    }
+
     return (
         <div style={{ display: 'flex', flexDirection: 'column', gap: '20px' }}>
             <header style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
@@ -32,7 +42,7 @@ export default function Reports() {
                     <p style={{ color: '#94a3b8', fontSize: '14px', margin: 0 }}>View, filter, and export historical traffic data.</p>
                 </div>
                 <div style={{ display: 'flex', gap: '8px' }}>
-                    <a href={`${API_BASE}/export_stats`} target="_blank" style={{ ...btn, background: '#10b981', color: 'white', textDecoration: 'none' }}>Export CSV</a>
+                    <a href={`${API_BASE}/export_stats?${exportParams}`} target="_blank" style={{ ...btn, background: '#10b981', color: 'white', textDecoration: 'none' }}>Export CSV</a>
                     <a href={`${API_BASE}/generate_pdf`} target="_blank" style={{ ...btn, background: '#3b82f6', color: 'white', textDecoration: 'none' }}>Generate PDF</a>
                 </div>
             </header>
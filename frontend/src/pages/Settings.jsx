@@ -29,8 +29,25 @@ export default function Settings() {
         if (!confirm('Are you sure? This will permanently delete all traffic history data.')) return;
         try {
             const r = await api.post('/purge_data');
-            setPurgeMsg(`Purged ${r.data.purged.lane_stats} lane stats and ${r.data.purged.vehicle_logs} vehicle logs.`);
-        } catch (e) { setPurgeMsg('Purge failed'); }
+            const id = r.data.job.id;
+            setPurgeMsg('Purging...');
+            // The purge runs in the background in small chunks; poll its progress
+            const poll = setInterval(async () => {
+                try {
+                    const { job } = (await api.get('/purge_data')).data;
+                    if (!job || job.id !== id) { clearInterval(poll); return; }
+                    if (job.state === 'running' || job.state === 'pending') {
+                        setPurgeMsg(`Purging... ${Math.round(job.progress * 100)}%`);
+                        return;
+                    }
+                    clearInterval(poll);
+                    const t = job.tables;
+                    setPurgeMsg(job.state === 'done'
+                        ? `Purged ${t.lane_stats?.deleted || 0} lane stats and ${t.vehicle_logs?.deleted || 0} vehicle logs.`
+                        : `Purge ${job.state}${job.error ? ': ' + job.error : ''}`);
+                } catch (e) { clearInterval(poll); setPurgeMsg('Purge status unavailable'); }
+            }, 1000);
+        } catch (e) { setPurgeMsg(e.response?.status === 409 ? 'A purge is already running' : 'Purge failed'); }
     };
 
     if (!s) return <p style={{ color: '#64748b' }}>Loading settings...</p>;